@@ -1,8 +1,21 @@
+import argparse
 import asyncio
+import contextlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import signal
+import time
 from modules.formulite import formulite
 from modules.formuliteutils import utils as f_utils
-from modules.mySoup import seed
-import requests
+from modules.mySoup import seed, Schema, Field, Group, post
+from modules.fetcher import Fetcher
+from modules.cache import AsyncCache
+from modules.leasing import RangeLeaser
+from modules.changes import ChangeTracker
+from modules.discovery import IdMap, Discovery
+from modules.archive import PageArchive, ArchiveFetcher
+from modules.metrics import Metrics
+from modules.scheduler import RefreshScheduler
 import re
 
 async def initialize(manager):
@@ -21,6 +34,9 @@ async def initialize(manager):
 
     manager.set_entity("Meta", metakey="INT", range_start="INT", range_end="INT")
     manager.set_primary_key("Meta", "metakey")
+    RangeLeaser.set_entity(manager) # id blocks leased out of Meta.range_end
+    ChangeTracker.set_entity(manager) # validators and hashes of the product pages, for re-crawls
+    RefreshScheduler.set_entity(manager) # when each product is due to be scraped again
 
     await manager.create_tables()
 
@@ -29,90 +45,555 @@ async def init_meta(manager):
     meta_dict = {}
 
     meta_dict["metakey"] = 1
-    meta_dict["range_start"] = 161000
+    meta_dict["range_start"] = FIRST_ID
     meta_dict["range_end"] = meta_dict["range_start"] + 1
 
     await manager.build_and_insert("Meta", **meta_dict)
 
-async def scrap(manager, pid):
+BASE_URL = "https://www.boadica.com.br"
+FIRST_ID = 161000 # where the id walk starts
+STORE_TTL = 6 * 60 * 60 # seconds before a cached store page is downloaded again
+STORE_RETRY = 60 # the same, for a store page that came without the store info
+STORE_CACHE_SIZE = 4096 # stores kept in memory
+LEASE_TIME = 10 * 60 # seconds an id block stays with a run that stopped checkpointing, before another run takes it over
+ID_MAP = "ids.bin" # live / dead ids found so far, next to the database
+ARCHIVE = "paginas" # folder of the page archive, next to the database
+METRICS_JSON = "execucao.json" # summary of the last run, next to the database
+METRICS_PROM = "execucao.prom" # the same in the Prometheus text format
 
-    prod_dict = {}
-    anun_dict = {}
-    loja_dict = {}
+# What scrap() reads from each page, the keys are the column names in the database
+produto_schema = Schema(
+    prod_name=Field(".nome", post=[post.strip()]),
+    prod_spec=Field(".especificacao", post=[post.strip()]),
+    time_catch=Field(".row.painel .data-hora", post=[post.strip()]),
+    lojas=Group(".row.painel .tab-content .row",
+        prod_price=Field(".col-md-3.preco-loja", post=[post.strip(), post.replace("\n\r                                                        \n")]),
+        l_nick=Field("a", attr="href", post=[post.regex(r"[^/]*$")]),
+        l_name=Field("a", post=[post.strip()]),
+        l_credit=Field(".fa.fa-credit-card", exists=True),
+        l_delivery=Field(".fa.fa-motorcycle", exists=True),
+    ),
+)
+loja_schema = Schema(
+    l_address=Field(".col-md-12 span", nth=5, post=[post.strip(), post.replace("Endereço:\n\n\r                \n")]),
+)
 
-    prod_dict["prod_id"] = pid
-    link = "https://www.boadica.com.br/produtos/p" + str(prod_dict["prod_id"])
-    pagina = requests.get(link)
-    tree_list = seed.build(string=pagina.text, below_class="col-md-8")
+def parse_product(pagina, timings=None, stats=None):
+    # product page -> produto_schema record (plain dict), None if the page has no product. Runs in the parser processes
+    # timings (a dict) gets the seconds spent building the tree and extracting from it, stats (a dict) the field matches
+    # and misses (see Schema.extract()), they go to produto_schema.stats without it
+    start = time.perf_counter()
+    tree_list = seed.build(string=pagina, below_class="col-md-8", max_trees=1, scoped=True, lazy_text=True)
+    built = time.perf_counter()
+    if timings is not None:
+        timings["build"] = built - start
     if not tree_list:
-        return
-    resultado = tree_list[0]
-    none_check = resultado.find_class("nome")
-    if not none_check:
-        return
-    prod_dict["prod_name"] = resultado.find_class("nome").get("text").strip()
-    prod_dict["prod_spec"] = resultado.find_class("especificacao").get("text").strip()
-    
-    anun_dict["prod_id"] = prod_dict["prod_id"]
-    advance = resultado.find_class("row painel")
-    anun_dict["time_catch"] = advance.find_class("data-hora").get("text").strip()
-    advance = advance.find_class("tab-content")
-
-    lojas = advance.find_all_class("row")
+        return None
+    produto = produto_schema.extract(tree_list[0], stats)
+    if timings is not None:
+        timings["extract"] = time.perf_counter() - built
+    if produto["prod_name"] is None:
+        return None
+    return produto
+
+def parse_loja(pagina_loja, timings=None, stats=None):
+    # what the store page adds to a Loja row, None if the page has no store info. Runs in the parser processes
+    start = time.perf_counter()
+    tree_list = seed.build(string=pagina_loja, below_class="container", max_trees=1, scoped=True, lazy_text=True)
+    built = time.perf_counter()
+    if timings is not None:
+        timings["build_loja"] = built - start
+    if not tree_list:
+        return None
+    info = loja_schema.extract(tree_list[0], stats)
+    if timings is not None:
+        timings["extract_loja"] = time.perf_counter() - built
+    if info["l_address"] is None: # the page changed, or came broken
+        return None
+    return info
+
+def timed(function, pagina):
+    # (function(pagina), the timings it took, the field stats), what the parser processes send back when the run is measured
+    timings, stats = {}, {}
+    return function(pagina, timings, stats), timings, stats
+
+def merge_stats(function, stats):
+    # adds the field stats of a timed() call to the schema of the parse function, so the parent's report() has them all
+    {parse_product: produto_schema, parse_loja: loja_schema}[function].merge(stats)
+
+async def parse_here(function, pagina):
+    # parse runs in the event loop itself, when there's no parser pool
+    return function(pagina)
+
+class StoreUnavailable(Exception):
+    # a store page that couldn't be downloaded (no answer, a 429 or a 5xx after the retries): unlike a broken page
+    # this says nothing about the store, so it's not cached, and the product is tried again later (see scrap_some())
+    pass
+
+async def loja_info(fetcher, l_nick, parse=parse_here, metrics=None):
+    try:
+        start = time.perf_counter()
+        fetched = await fetcher.fetch(BASE_URL + "/loja/" + l_nick)
+        if metrics is not None:
+            metrics.observe("fetch_loja", time.perf_counter() - start)
+    except Fetcher.errors as error:
+        raise StoreUnavailable(l_nick) from error
+    if fetched.status == 429 or fetched.status >= 500:
+        raise StoreUnavailable(f"{l_nick}: {fetched.status}")
+    return await parse(parse_loja, fetched.text)
+
+def new_store_cache(manager):
+    # Stores already in the Loja table don't need their page (the insert would be skipped anyway), they are cached as {}
+    async def stored(l_nick):
+        return {} if await manager.exists("Loja", l_nick=l_nick) else None
+    return AsyncCache(ttl=STORE_TTL, max_size=STORE_CACHE_SIZE, check=stored, negative_ttl=STORE_RETRY)
+
+async def product_record(pid, pagina, fetcher, store_cache=None, parse=parse_here, metrics=None):
+    # Everything scrap() writes for one product, as plain dicts: {"Loja": [...], "Anuncio": [...], "Produto": [...], "complete": bool}
+    # complete is False when a broken store page left part of the product out. Without a store_cache every store page is downloaded
+    produto = await parse(parse_product, pagina)
+    if produto is None:
+        return None
+
+    lojas = produto["lojas"]
+    if produto["time_catch"] is None or any(loja["prod_price"] is None or not loja["l_nick"] for loja in lojas):
+        # a broken page, what's missing can't go in as NULL: the product is left incomplete, like for a broken store page
+        return {"Loja": [], "Anuncio": [], "Produto": [], "complete": False}
+    start = time.perf_counter()
+    if store_cache is None:
+        infos = await asyncio.gather(*[loja_info(fetcher, loja["l_nick"], parse, metrics) for loja in lojas])
+    else:
+        infos = await asyncio.gather(*[store_cache.get(loja["l_nick"], lambda nick=loja["l_nick"]: loja_info(fetcher, nick, parse, metrics)) for loja in lojas])
+    if metrics is not None:
+        metrics.observe("lojas", time.perf_counter() - start)
+
+    record = {"Loja": [], "Anuncio": [], "Produto": [], "complete": False}
+    for loja, info in zip(lojas, infos):
+        if info is None: # a broken store page leaves the rest of the product out
+            return record
+        if info: # {} means the store is already in the database
+            record["Loja"].append({"l_nick": loja["l_nick"], "l_name": loja["l_name"], "l_credit": loja["l_credit"], "l_delivery": loja["l_delivery"], **info})
+        record["Anuncio"].append({"l_nick": loja["l_nick"], "prod_id": pid, "prod_price": loja["prod_price"], "time_catch": produto["time_catch"]})
     if len(lojas) > 0:
-        for loja in lojas:
-            anun_dict["prod_price"] = loja.find_class("col-md-3 preco-loja").get("text").strip().replace("\n\r                                                        \n", "")
-            loja_dict["l_nick"] = loja.find(tagname="a").get("href").split("/")[-1]
-            anun_dict["l_nick"] = loja_dict["l_nick"]
-            loja_dict["l_name"] = loja.find(tagname="a").get("text").strip()
-            loja_dict["l_credit"] = len(loja.find_all_class("fa fa-credit-card")) > 0
-            loja_dict["l_delivery"] = len(loja.find_all_class("fa fa-motorcycle")) > 0
-            pagina_loja = requests.get("https://www.boadica.com.br/loja/" + loja_dict["l_nick"])
-            tree_list_2 = seed.build(string=pagina_loja.text, below_class="container")
-            if not tree_list_2:
-                return
-            res = tree_list_2[0]
-            linfo = res.find_class("col-md-12")
-            spam = linfo.find_all(tagname="span")
-            info_string = []
-            for span in spam:
-                info_string.append(span.get("text"))
-            loja_dict["l_address"] = info_string[5].strip().replace("Endereço:\n\n\r                \n", "")
-            await manager.build_and_insert("Loja", **loja_dict)
-            await manager.build_and_insert("Anuncio", **anun_dict)
-        await manager.build_and_insert("Produto", **prod_dict)
-
-async def scrap_some(manager, amount):
+        record["Produto"].append({"prod_id": pid, "prod_name": produto["prod_name"], "prod_spec": produto["prod_spec"]})
+    record["complete"] = True
+    return record
+
+async def write_records(manager, records):
+    # table by table for the whole batch, stores before the ads that point to them, ads before their products,
+    # an executemany per table and a single commit for all of it (rows already in the database are skipped)
+    await manager.insert_rows({table: [manager.row_values(table, row) for record in records for row in record[table]]
+                               for table in ("Loja", "Anuncio", "Produto")})
+
+async def scrap(manager, pid, fetcher, write_lock=None, store_cache=None, metrics=None):
+    # scraps a single product, its rows go in a single transaction. write_lock, if given, is held while writing
+    # (not needed to keep concurrent scraps apart, manager.transaction() already does)
+    # metrics (a Metrics, see modules/metrics.py) gets the time of each step and the outcome
+    # A store page that can't be downloaded raises StoreUnavailable, nothing of the product is written
+
+    metrics = metrics or Metrics()
+
+    async def parse(function, pagina):
+        result, timings, stats = timed(function, pagina)
+        for stage, seconds in timings.items():
+            metrics.observe(stage, seconds)
+        merge_stats(function, stats)
+        return result
+
+    link = BASE_URL + "/produtos/p" + str(pid)
+    with metrics.time("fetch"):
+        pagina = await fetcher.get(link)
+    record = await product_record(pid, pagina, fetcher, store_cache, parse, metrics)
+    metrics.count("empty" if record is None else "new")
+    if record is not None:
+        async with write_lock or contextlib.nullcontext(): # nothing to hold without a lock
+            with metrics.time("write"):
+                await write_records(manager, [record])
+
+async def scrap_some(manager, amount, concurrency=16, store_cache=None, parse_workers=0, queue_size=64, batch_size=32, lease_size=50, ids=None, outcomes=None,
+                     adaptive=True, limiters=None, discovery=None, archive=None, fetcher=None, detect_changes=True, metrics=None, progress=None,
+                     seen=None, stop=None):
+    # Scraps the next amount products as a pipeline, each stage feeds the next through a bounded queue (queue_size):
+    # concurrency fetchers download product pages -> concurrency parsers hand them (and the store pages they need)
+    # to a pool of parse_workers processes -> a single writer inserts the records, up to batch_size products at a time
+    # parse_workers=0 (the default) parses in the event loop: with the pool the pages and records pickled both ways
+    # cost more than the parse itself (31.6 against 49.6 products/s measured on one core), more cores aren't measured yet
+    # Ids are leased in blocks of up to lease_size (see modules/leasing.py), and checkpointed in the same commit as each written batch,
+    # so other processes can scrap the same database at the same time, and a crashed run is continued by the next one
+    # ids scraps those ids instead (re-crawls of products scraped before), nothing is leased for them
+    # Product pages are requested conditionally (see modules/changes.py): one that didn't change since the last time
+    # is neither parsed nor written. outcomes (a Counter) gets the count of each kind of page (new, changed, unchanged, empty)
+    # and of the rows handed to the database
+    # With adaptive, the requests in flight go up to concurrency only while the site answers well (see modules/throttle.py),
+    # and the ones answered with errors are tried again after a backoff. A product page that still fails counts as failed
+    # and its id is left unfinished, for a later run (so does a product with a store page that failed)
+    # limiters (host -> AdaptiveLimiter) carries the learned limits between runs
+    # discovery (see new_discovery() and modules/discovery.py) skips the ids known dead, and strides over the sparse
+    # parts of the leased blocks, probing around the live ids it finds. The ids it skips are finished in the lease without
+    # a probe, and marked skipped in the id map, scrap_new() probes them later
+    # archive (a PageArchive) gets every page downloaded, fetcher replaces the site as the source of the pages
+    # (an ArchiveFetcher, see replay()), detect_changes=False parses and writes every page, changed or not
+    # metrics (a Metrics, see modules/metrics.py) gets the time of every stage, the page outcomes (parse_error for a product page
+    # the parser choked on: it's finished, but not remembered as seen), pages and bytes, and gauges for the store cache,
+    # the limiters and the queues. progress prints its line every progress seconds while the run goes
+    # seen(pid, outcome) is called for every product page once its outcome is written (see modules/scheduler.py)
+    # Once stop (an asyncio.Event) is set no more ids are handed out, the pages in flight go through and get checkpointed
+    # Returns the store cache used, pass it again to keep it between runs
 
     meta_rows = await manager.select_all_from("Meta")
     if not meta_rows:
         return
-    meta_object = meta_rows[0]
+    if store_cache is None:
+        store_cache = new_store_cache(manager)
+
+    if outcomes is None:
+        outcomes = Counter()
+    if metrics is None:
+        metrics = Metrics()
 
-    for i in range(meta_object.range_end, meta_object.range_end + amount):
-        await scrap(manager, i)
+    # the writer, the leaser and the tracker share the connection, manager.transaction() keeps their transactions apart
+    leaser = RangeLeaser(manager, block_size=lease_size, lease_time=LEASE_TIME)
+    await leaser.setup()
+    tracker = ChangeTracker(manager, below_class="col-md-8")
+    await tracker.setup()
+    handed_out = 0
+    current = [None, iter(())] # lease the fetchers are taking ids from, and its ids
+    ids_lock = asyncio.Lock()
+    given = None if ids is None else iter(ids)
 
-    meta_object.range_end += amount
+    async def next_id():
+        # (lease, pid) for the next product to scrap, None once amount ids were handed out
+        # (and, with discovery, once no probe that may lead to more ids is still out)
+        nonlocal handed_out
+        if stop is not None and stop.is_set():
+            return None
+        if given is not None:
+            for pid in given:
+                if discovery is None or not discovery.ids.dead(pid):
+                    return None, pid
+            return None
+        while True:
+            async with ids_lock:
+                if discovery is not None:
+                    pid = discovery.dense()
+                    if pid is not None: # around a live hit, outside of the lease
+                        return None, pid
+                while handed_out < amount:
+                    pid = next(current[1], None)
+                    if pid is None:
+                        lease = await leaser.acquire(min(lease_size, amount - handed_out))
+                        current[:] = [lease, iter(lease.ids())]
+                        continue
+                    handed_out += 1
+                    if discovery is None or discovery.plan(pid):
+                        return current[0], pid
+                    leaser.finish(current[0], pid)
+            if discovery is None or not discovery.waiting():
+                return None
+            await asyncio.sleep(0.05)
 
-    await manager.update(meta_object)
+    pages = asyncio.Queue(queue_size) # (lease, pid, product page, change)
+    records = asyncio.Queue(queue_size) # (lease, pid, product record or None, change), None once the parsers are done
+    # change is (outcome, url, fetched, digest), outcome being "new", "changed", "unchanged", "failed" or "parse_error"
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(parse_workers) if parse_workers > 0 else None
+
+    async def parse(function, pagina):
+        if pool is None:
+            result, timings, stats = timed(function, pagina)
+        else:
+            result, timings, stats = await loop.run_in_executor(pool, timed, function, pagina)
+        for stage, seconds in timings.items():
+            metrics.observe(stage, seconds)
+        merge_stats(function, stats) # counted in the worker, they'd get lost there
+        return result
+
+    if adaptive and limiters is None:
+        limiters = {}
+    metrics.watch("lojas", lambda: {"lookups": store_cache.lookups, "hits": store_cache.hits + store_cache.coalesced,
+                                    "in_database": store_cache.checked, "downloads": store_cache.loads})
+    metrics.watch("limiter", lambda: {"limit": sum(limiter.limit for limiter in (limiters or {}).values()),
+                                      "in_flight": sum(limiter.in_flight for limiter in (limiters or {}).values()),
+                                      "rate": sum(limiter.rate() for limiter in (limiters or {}).values())})
+    metrics.watch("queues", lambda: {"pages": pages.qsize(), "records": records.qsize()})
+
+    source = fetcher or Fetcher(concurrency=concurrency, limiters=limiters if adaptive else None, archive=archive, metrics=metrics)
+    async with source as fetcher:
+        async def fetch_stage():
+            while True:
+                item = await next_id()
+                if item is None:
+                    return
+                lease, pid = item
+                url = BASE_URL + "/produtos/p" + str(pid)
+                known = await tracker.get(url) if detect_changes else None
+                try:
+                    with metrics.time("fetch"):
+                        fetched = await fetcher.fetch(url, tracker.headers(known))
+                except Fetcher.errors:
+                    fetched = None
+                if fetched is None or fetched.status == 429 or fetched.status >= 500:
+                    await records.put((lease, pid, None, ("failed", url, fetched, None)))
+                    continue
+                digest = None if fetched.status == 304 or not detect_changes else tracker.digest(fetched.text)
+                if detect_changes and tracker.unchanged(known, fetched, digest): # straight to the writer, only to be counted and checkpointed
+                    await records.put((lease, pid, None, ("unchanged", url, fetched, digest)))
+                else:
+                    await pages.put((lease, pid, fetched.text, ("new" if known is None else "changed", url, fetched, digest)))
+
+        async def parse_stage():
+            while True:
+                item = await pages.get()
+                if item is None:
+                    return
+                lease, pid, pagina, change = item
+                try:
+                    record = await product_record(pid, pagina, fetcher, store_cache, parse, metrics)
+                except StoreUnavailable: # the same as a product page that failed, its id goes back with the lease
+                    record = None
+                    change = ("failed",) + change[1:]
+                except Exception: # a page the parser can't handle must not take the whole run down
+                    record = None
+                    change = ("parse_error",) + change[1:]
+                await records.put((lease, pid, record, change))
+
+        async def write_stage():
+            finished = False
+            while not finished:
+                batch = [await records.get()]
+                while len(batch) < batch_size and not records.empty():
+                    batch.append(records.get_nowait())
+                finished = batch[-1] is None
+                batch = [item for item in batch if item is not None]
+                written = [record for lease, pid, record, change in batch if record is not None]
+                if archive is not None: # the pages of the ids about to be checkpointed must not get lost
+                    archive.flush()
+                # the records, the validators of their pages and the checkpoints past them go in a single commit
+                with metrics.time("write"):
+                    async with manager.transaction(immediate=True):
+                        await write_records(manager, written)
+                        rows = sum(len(record[table]) for record in written for table in ("Loja", "Anuncio", "Produto"))
+                        outcomes["rows"] += rows
+                        metrics.count("rows", rows)
+                        for lease, pid, record, (outcome, url, fetched, digest) in batch:
+                            if record is None and outcome in ("new", "changed"):
+                                outcome = "empty"
+                            outcomes[outcome] += 1
+                            metrics.count(outcome)
+                            if discovery is not None:
+                                discovery.record(pid, {"new": True, "changed": True, "empty": False}.get(outcome))
+                            if seen is not None:
+                                seen(pid, outcome)
+                            if outcome == "failed": # not finished, the lease goes back with it for another run, until it failed too often
+                                if lease is not None and leaser.fail(lease, pid):
+                                    outcomes["given_up"] += 1
+                                    metrics.count("given_up")
+                                continue
+                            if detect_changes and outcome != "parse_error" and (record is None or record["complete"]): # an incomplete product has to be fetched in full again next time
+                                tracker.remember(url, fetched, digest)
+                            if lease is not None:
+                                leaser.finish(lease, pid)
+                        with metrics.time("checkpoint"):
+                            await tracker.flush()
+                            await leaser.flush()
+
+        async def fetch_then_stop():
+            await asyncio.gather(*[fetch_stage() for _ in range(concurrency)])
+            for _ in range(concurrency):
+                await pages.put(None)
+
+        async def parse_then_stop():
+            await asyncio.gather(*[parse_stage() for _ in range(concurrency)])
+            await records.put(None)
+
+        shown = asyncio.create_task(metrics.progress(progress)) if progress else None
+        try:
+            async with asyncio.TaskGroup() as stages: # if a stage fails, the others are cancelled
+                stages.create_task(fetch_then_stop())
+                stages.create_task(parse_then_stop())
+                stages.create_task(write_stage())
+        except BaseException:
+            with contextlib.suppress(Exception): # hand back what's left, so nobody has to wait for the leases to expire
+                await leaser.release()
+            raise
+        finally:
+            if shown is not None:
+                shown.cancel()
+                await asyncio.gather(shown, return_exceptions=True)
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if discovery is not None:
+                discovery.ids.save()
+
+    await leaser.release()
+    return store_cache
+
+async def replay(manager, archive, concurrency=16, store_cache=None, parse_workers=0, outcomes=None, at=None, metrics=None, progress=None):
+    # Rebuilds the products from the archive instead of the site: the last archived page of every product
+    # (as it was at time at, if given) goes through the same pipeline as a crawl, stores included
+    pids = []
+    prefix = BASE_URL + "/produtos/p"
+    for entry in archive.latest(): # in the order they are on disk
+        if entry.url.startswith(prefix) and entry.url[len(prefix):].isdigit():
+            pids.append(int(entry.url[len(prefix):]))
+    return await scrap_some(manager, len(pids), concurrency=concurrency, store_cache=store_cache, parse_workers=parse_workers,
+                            ids=pids, outcomes=outcomes, fetcher=ArchiveFetcher(archive, at, metrics), detect_changes=False,
+                            metrics=metrics, progress=progress)
+
+async def scrap_new(manager, amount, discovery=None, sweep_share=0.2, **options):
+    # Scraps amount ids not scraped before: with discovery, up to sweep_share of them are ids its stride skipped
+    # (the lowest first, see Discovery.sweep()), so the live ids between two probes get found too, the rest are past the range
+    # options go to scrap_some()
+    swept = discovery.sweep(int(amount * sweep_share)) if discovery is not None else []
+    if swept:
+        options["store_cache"] = await scrap_some(manager, len(swept), ids=swept, discovery=discovery, **options)
+    stop = options.get("stop")
+    if amount > len(swept) and (stop is None or not stop.is_set()):
+        options["store_cache"] = await scrap_some(manager, amount - len(swept), discovery=discovery, **options)
+    return options.get("store_cache")
+
+def new_discovery(manager, **options):
+    # Discovery over the id map kept next to the database (a new one if there's none yet), options go to Discovery
+    return Discovery(IdMap.load(manager.file_path + ID_MAP, base=FIRST_ID), **options)
+
+def report_metrics(manager, metrics):
+    # time taken by each stage of the run, and the metrics files next to the database
+    for stage, histogram in metrics.stages.items():
+        print(f"  {stage:>12}: {histogram.count:6} vezes, {histogram.sum:7.2f}s no total, "
+              f"p50 {histogram.quantile(0.5) * 1000:7.1f}ms, p95 {histogram.quantile(0.95) * 1000:7.1f}ms")
+    metrics.write_json(manager.file_path + METRICS_JSON)
+    metrics.write_prometheus(manager.file_path + METRICS_PROM)
+
+async def daemon(manager, budget=500, period=10 * 60, refresh_share=0.7, concurrency=16, stop=None, rounds=None,
+                 scheduler=None, discovery=None, archive=None, limiters=None, store_cache=None, parse_workers=0, log=print):
+    # Scraps without asking anything, a round every period seconds until stop (an asyncio.Event) is set, or after rounds rounds
+    # Each round requests up to budget product pages: up to refresh_share of them go to the products due again (the most overdue
+    # first, see modules/scheduler.py, along with the ones due before the next round), the rest (and what the refresh didn't need)
+    # to new ids (see scrap_new(): with discovery, some of them are the ids its stride skipped before, and its probes
+    # around the live ids it finds can take a few pages more)
+    # Setting stop lets the pages in flight go through and checkpoints everything, a round is never left halfway
+    # parse_workers goes to scrap_some() (0, parsing in the event loop, until a multi-core machine shows the pool pays off)
+    stop = stop or asyncio.Event()
+    if scheduler is None:
+        scheduler = RefreshScheduler(manager)
+    await scheduler.setup()
+    await scheduler.load()
+    if store_cache is None:
+        store_cache = new_store_cache(manager)
+    if limiters is None:
+        limiters = {}
+    done = 0
+    while not stop.is_set() and (rounds is None or done < rounds):
+        started = time.time()
+        outcomes = Counter()
+        metrics = Metrics()
+        metrics.watch("refresco", lambda: {"products": len(scheduler.products), "due": scheduler.count_due()})
+        options = dict(concurrency=concurrency, store_cache=store_cache, outcomes=outcomes, limiters=limiters, archive=archive,
+                       metrics=metrics, seen=scheduler.record, stop=stop, parse_workers=parse_workers)
+        due = scheduler.due(int(budget * refresh_share), ahead=period)
+        try:
+            if due:
+                await scrap_some(manager, len(due), ids=due, **options)
+            if budget > len(due) and not stop.is_set():
+                await scrap_new(manager, budget - len(due), discovery=discovery, **options)
+        finally:
+            scheduler.release()
+            await scheduler.flush()
+        done += 1
+        log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} rodada {done}: {len(due)} produtos atualizados, {budget - len(due)} ids novos, "
+            f"{outcomes['new']} novos, {outcomes['changed']} alterados, {outcomes['unchanged']} sem alteração, {outcomes['empty']} sem produto, "
+            f"{outcomes['failed']} com erro ({outcomes['given_up']} desistidos) em {time.time() - started:.1f}s | {scheduler.summary()}")
+        metrics.write_json(manager.file_path + METRICS_JSON)
+        metrics.write_prometheus(manager.file_path + METRICS_PROM)
+        if rounds is not None and done >= rounds:
+            break
+        with contextlib.suppress(TimeoutError): # sleeps until the next round, or until stop
+            await asyncio.wait_for(stop.wait(), max(0.0, period - (time.time() - started)))
+    return scheduler
+
+async def run_daemon(args):
+    # daemon() as the command line asked for it. SIGINT / SIGTERM stop it after the pages in flight, a second one right away
+    manager = await formulite.manager(dbpath=args.dbpath)
+    if not manager.loaded():
+        await initialize(manager)
+        await init_meta(manager)
+    archive = None if args.no_archive else PageArchive(manager.file_path + ARCHIVE)
+    discovery = None if args.no_discovery else new_discovery(manager)
+    scheduler = RefreshScheduler(manager, min_interval=args.min_interval * 3600, max_interval=args.max_interval * 3600)
+    stop = asyncio.Event()
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+
+    def interrupted():
+        if stop.is_set():
+            task.cancel() # the leases still go back, see scrap_some()
+        else:
+            print("Terminando a rodada atual, interrompa de novo para sair já...", flush=True)
+            stop.set()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, interrupted)
+    try:
+        await daemon(manager, budget=args.budget, period=args.period, refresh_share=args.refresh_share, concurrency=args.concurrency,
+                     stop=stop, rounds=args.rounds, scheduler=scheduler, discovery=discovery, archive=archive, parse_workers=args.parse_workers,
+                     log=lambda line: print(line, flush=True))
+    except asyncio.CancelledError:
+        pass
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signum)
+        with contextlib.suppress(Exception):
+            await scheduler.flush()
+        if discovery is not None:
+            discovery.ids.save()
+        if archive is not None:
+            archive.close()
+        await manager.close()
+
+def arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper do boadica. Sem argumentos, abre o menu interativo.")
+    parser.add_argument("--discovery", action="store_true", help="no menu interativo, pula os trechos de ids sem produtos (e volta a eles depois)")
+    parser.add_argument("--no-archive", action="store_true", help="no menu interativo, não arquiva as páginas baixadas")
+    parser.add_argument("--parse-workers", type=int, default=0, help="no menu interativo, processos que leem as páginas (0: lê no próprio processo)")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("daemon", help="pesquisa sem parar, dividindo as páginas entre ids novos e produtos a atualizar")
+    run.add_argument("--budget", type=int, default=500, help="páginas de produto por rodada")
+    run.add_argument("--period", type=float, default=600, help="segundos entre o início de cada rodada")
+    run.add_argument("--refresh-share", type=float, default=0.7, help="fração das páginas para atualizar produtos já pesquisados")
+    run.add_argument("--min-interval", type=float, default=1, help="horas até um produto que sempre muda ser atualizado")
+    run.add_argument("--max-interval", type=float, default=7 * 24, help="horas até um produto que nunca muda ser atualizado")
+    run.add_argument("--concurrency", type=int, default=16, help="páginas baixadas ao mesmo tempo, no máximo")
+    run.add_argument("--parse-workers", type=int, default=0, help="processos que leem as páginas (0: lê no próprio processo)")
+    run.add_argument("--rounds", type=int, default=None, help="rodadas antes de sair (sem fim por padrão)")
+    run.add_argument("--dbpath", default="resources/", help="pasta do banco de dados")
+    run.add_argument("--no-archive", action="store_true", help="não arquiva as páginas baixadas")
+    run.add_argument("--no-discovery", action="store_true", help="percorre todos os ids, sem pular os trechos vazios")
+    return parser.parse_args(argv)
 
 def get_price(anuncio_obj):
+    if anuncio_obj.prod_price is None: # left out by a broken page, in databases from before the check in product_record()
+        return None
     encontro = re.search("R\$ (\d+,\d+)", anuncio_obj.prod_price)
     if encontro:
         return float( encontro.group(1).replace(",", ".") )
     else:
         return None
 
-async def main():
-
+async def main(discover=False, keep_pages=True, parse_workers=0):
+    # discover turns on the id discovery (see new_discovery()), off unless asked for on the command line
+    # keep_pages archives every page downloaded (see modules/archive.py), --no-archive turns it off
+    # parse_workers is the size of the parser pool (see scrap_some()), --parse-workers on the command line
     manager = await formulite.manager()
+    store_cache = new_store_cache(manager)
+    limiters = {} # request limits learned for each host, kept between runs
+    discovery = new_discovery(manager) if discover else None
+    archive = PageArchive(manager.file_path + ARCHIVE) if keep_pages else None
 
     if not manager.loaded():
         await initialize(manager)
         await init_meta(manager)
 
     while True:
-        opcao = int( input("Insira um número:\n1 - Pesquisar itens da web\n2 - Acessar BD\n3 - Sair\n") )
+        opcao = int( input("Insira um número:\n1 - Pesquisar itens da web\n2 - Acessar BD\n3 - Sair\n4 - Refazer o BD a partir das páginas arquivadas\n") )
         if opcao == 3:
             print("Até mais")
             break
@@ -120,9 +601,36 @@ async def main():
             n = int( input("Quantos elementos deseja pesquisar: ") )
             print("Aguarde um momento...")
             before = await manager.count("Produto")
-            await scrap_some(manager, n)
+            lookups, loads = store_cache.lookups, store_cache.loads
+            outcomes = Counter()
+            metrics = Metrics()
+            await scrap_new(manager, n, store_cache=store_cache, outcomes=outcomes, limiters=limiters, discovery=discovery, archive=archive,
+                            metrics=metrics, progress=1.0, parse_workers=parse_workers)
             after = await manager.count("Produto")
             print(f"{n} itens pesquisados, {after - before} novos itens foram encontrados.")
+            print(f"Páginas: {outcomes['new']} novas, {outcomes['changed']} alteradas, {outcomes['unchanged']} sem alteração, {outcomes['empty']} sem produto, {outcomes['failed']} com erro ({outcomes['given_up']} desistidos), {outcomes['parse_error']} com erro de leitura")
+            for host, limiter in limiters.items():
+                print(f"{host}: {limiter.summary()}")
+            if discovery is not None:
+                print(f"Ids: {discovery.summary()}")
+                for line in discovery.ids.report():
+                    print(line)
+            print("Campos encontrados:")
+            for schema in (produto_schema, loja_schema):
+                for line in schema.report().splitlines():
+                    print(f"  {line}")
+            print(f"Lojas: {store_cache.lookups - lookups} consultas, {store_cache.loads - loads} páginas baixadas ({store_cache.summary()})")
+            report_metrics(manager, metrics)
+        if opcao == 4:
+            print("Aguarde um momento...")
+            outcomes = Counter()
+            metrics = Metrics()
+            source = archive or PageArchive(manager.file_path + ARCHIVE) # what earlier runs archived, even with archiving off now
+            await replay(manager, source, parse_workers=parse_workers, outcomes=outcomes, metrics=metrics, progress=1.0)
+            print(f"{outcomes['new']} produtos refeitos a partir de {len(source)} páginas arquivadas.")
+            if source is not archive:
+                source.close()
+            report_metrics(manager, metrics)
         if opcao == 2:
             info = int( input("Selecione a informação desejada:\n1 - Quantidade de elementos no banco\n2 - Produto mais barato\n3 - Lojas localizadas no Ed. Central\n4 - Lojas que realizam delivery\n") )
             if info == 1:
@@ -131,31 +639,37 @@ async def main():
                 num_anuncios = await manager.count("Anuncio")
                 print(f"{num_produtos} produtos, {num_lojas} lojas e {num_anuncios} anúncios")
             if info == 2:
-                anuncios = await manager.select_all_from("Anuncio")
-                if not anuncios:
+                # the ads come in batches, the table is never whole in memory
+                least, least_price = None, None
+                async for anuncio in manager.iter_select_from("Anuncio", kind="view"):
+                    price = get_price(anuncio)
+                    if least is None or (price and (not least_price or price < least_price)):
+                        least, least_price = anuncio, price
+                if least is None:
                     print("O banco está vazio!")
                 else:
-                    least = anuncios[0]
-                    for anuncio in anuncios:
-                        if get_price(anuncio) and get_price(least):
-                            if get_price(anuncio) < get_price(least):
-                                least = anuncio
                     prod = await manager.select_all_from("Produto", f_utils.where(prod_id=least.prod_id))
                     store = await manager.select_all_from("Loja", f_utils.where(l_nick=least.l_nick))
                     print(f"O produto produto mais barato é o(a) {prod[0].prod_name} vendido a {least.prod_price} pela loja {store[0].l_name}.")
             if info == 3:
-                lojas = await manager.select_all_from("Loja")
-                l_central = []
-                for l in lojas:
-                    verif = re.search("Av[\.]?(enida)? Rio Branco[\,]? 156", l.l_address)
-                    if verif:
-                        l_central.append(verif)
-                print(f"De {len(lojas)} lojas, {len(l_central)} estão localizadas no Edifício Central.")
+                lojas, l_central = 0, 0
+                async for l_address, in manager.iter_select_from("Loja", "l_address", kind="tuple"):
+                    lojas += 1
+                    if l_address and re.search("Av[\.]?(enida)? Rio Branco[\,]? 156", l_address):
+                        l_central += 1
+                print(f"De {lojas} lojas, {l_central} estão localizadas no Edifício Central.")
             if info == 4:
-                lojas_total = await manager.select_all_from("Loja")
-                lojas_delivery = await manager.select_all_from("Loja", f_utils.where(l_delivery=1))
-                print(f"De {len(lojas_total)} lojas, {len(lojas_delivery)} fazem delivery.")
+                lojas_total = await manager.count("Loja")
+                lojas_delivery = await manager.count("Loja", f_utils.where(l_delivery=1))
+                print(f"De {lojas_total} lojas, {lojas_delivery} fazem delivery.")
 
+    if archive is not None:
+        archive.close()
     await manager.close()
 
-asyncio.run(main())
+if __name__ == "__main__":
+    args = arguments()
+    if args.command == "daemon":
+        asyncio.run(run_daemon(args))
+    else:
+        asyncio.run(main(discover=args.discovery, keep_pages=not args.no_archive, parse_workers=args.parse_workers))
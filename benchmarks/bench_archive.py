@@ -0,0 +1,114 @@
+'''
+Archive benchmark: a crawl of --products ids against the stub server with the page archive on, then application.replay()
+of the archive into a fresh database, with no server at all. Checks that the replay wrote the same rows as the crawl,
+and reports the time of both, the archive size against the pages it holds, and the time of a random read from the archive.
+Also checks that an archive whose index was cut short by a crash opens, takes new pages and opens again with all of them.
+The stores' l_credit / l_delivery come from the first product row that mentions them, which depends on the order the products
+are written in, so they are left out of the comparison.
+
+Run from the repository root:
+python -m benchmarks.bench_archive --products 300 --latency 0.05
+'''
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+import application
+from modules.archive import PageArchive
+from .bench_fetch import fresh_manager
+from .stub_server import StubServer
+
+async def rows(manager):
+    '''Every row of the scraped tables, to compare two databases'''
+    found = {}
+    for table, columns in (("Produto", "*"), ("Loja", "l_nick, l_name, l_address"), ("Anuncio", "*")):
+        cursor = await manager.conn.execute(f"SELECT {columns} FROM {table}")
+        found[table] = sorted(map(tuple, await cursor.fetchall()), key=repr)
+    return found
+
+async def crawl(folder, archive, amount):
+    manager = await fresh_manager(folder)
+    start = time.perf_counter()
+    await application.scrap_some(manager, amount, concurrency=16, parse_workers=0, archive=archive)
+    elapsed = time.perf_counter() - start
+    found = await rows(manager)
+    await manager.close()
+    return elapsed, found
+
+async def rebuild(folder, archive):
+    manager = await fresh_manager(folder)
+    outcomes = Counter()
+    start = time.perf_counter()
+    await application.replay(manager, archive, parse_workers=0, outcomes=outcomes)
+    elapsed = time.perf_counter() - start
+    found = await rows(manager)
+    await manager.close()
+    return elapsed, found, outcomes
+
+def survives_cut_index(folder):
+    '''3 pages, the index cut in the middle of the last entry (a crash), 3 more pages: every complete one must read back'''
+    archive = PageArchive(folder)
+    for i in range(3):
+        archive.append(f"/p{i}", f"page {i}")
+    archive.close()
+    os.truncate(archive.index_path, os.path.getsize(archive.index_path) - 5)
+    archive = PageArchive(folder)
+    for i in range(3, 6):
+        archive.append(f"/p{i}", f"page {i}")
+    archive.close()
+    archive = PageArchive(folder)
+    found = {entry.url: text for entry, text in archive.scan()}
+    archive.close()
+    return found == {f"/p{i}": f"page {i}" for i in (0, 1, 3, 4, 5)}
+
+def main():
+    parser = argparse.ArgumentParser(description="page archive benchmark")
+    parser.add_argument("--products", type=int, default=300, help="product ids crawled")
+    parser.add_argument("--rows", type=int, default=10, help="store rows on each product page")
+    parser.add_argument("--stores", type=int, default=200, help="distinct stores the rows link to")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the server waits before each response")
+    parser.add_argument("--reads", type=int, default=2000, help="random reads timed")
+    args = parser.parse_args()
+
+    server = StubServer(rows=args.rows, stores=args.stores, latency=args.latency).start()
+    server.warm(range(161001, 161001 + args.products))
+    application.BASE_URL = server.url
+    with tempfile.TemporaryDirectory() as folder:
+        os.makedirs(os.path.join(folder, "crawl"))
+        os.makedirs(os.path.join(folder, "replay"))
+        archive = PageArchive(os.path.join(folder, "paginas"), segment_size=4 * 1024 * 1024)
+        try:
+            crawled, crawl_rows = asyncio.run(crawl(os.path.join(folder, "crawl"), archive, args.products))
+        finally:
+            server.stop()
+        archive.close()
+        raw_bytes = archive.raw_bytes
+        segments = sorted(name for name in os.listdir(archive.folder) if name.startswith("pages-"))
+        on_disk = sum(os.path.getsize(os.path.join(archive.folder, name)) for name in os.listdir(archive.folder))
+
+        archive = PageArchive(archive.folder) # as a later run would find it, the index read back from disk
+        replayed, replay_rows, outcomes = asyncio.run(rebuild(os.path.join(folder, "replay"), archive))
+
+        entries = random.Random(0).choices(archive.entries, k=args.reads)
+        start = time.perf_counter()
+        for entry in entries:
+            archive.get(entry.url)
+        read = (time.perf_counter() - start) / args.reads
+        archive.close()
+        survives = survives_cut_index(os.path.join(folder, "cut"))
+
+    print(f"{args.products} products, {args.rows} rows each, {args.latency * 1000:.0f} ms latency")
+    print(f"archive: {len(archive)} pages, {raw_bytes / 2 ** 20:.1f} MiB of pages in {on_disk / 2 ** 20:.2f} MiB on disk "
+          f"({raw_bytes / on_disk:.0f}x), {len(segments)} segments")
+    print(f"crawl:  {crawled:7.2f} s, {args.products / crawled:8.1f} products/s, {sum(map(len, crawl_rows.values()))} rows")
+    print(f"replay: {replayed:7.2f} s, {args.products / replayed:8.1f} products/s, {sum(map(len, replay_rows.values()))} rows, "
+          f"{outcomes['new']} products rebuilt ({crawled / replayed:.1f}x faster)")
+    print(f"same rows as the crawl: {replay_rows == crawl_rows}")
+    print(f"random read: {read * 1e6:.0f} us per page")
+    print(f"an index cut short by a crash is repaired: {survives}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+'''
+Discovery benchmark: a stub server where only a few clusters of ids have products, like the real id space.
+Compares walking every id of the span (what scrap_some() does by default) with discovery (strides over the dead stretches
+and probes around the live hits), followed by a sweep of the ids the stride skipped (Discovery.sweep()), a pass over every id
+(which should find nothing new by then) and a re-crawl of the span, with and without the map of dead ids.
+Reports the product pages requested, the products found and the time, plus the id density report of the discovery run.
+
+Run from the repository root:
+python -m benchmarks.bench_discovery --span 3000 --clusters 10 --cluster-size 15 --max-stride 4 8 16
+'''
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import Counter
+import application
+from .bench_fetch import fresh_manager
+from .stub_server import StubServer
+
+def clustered(first, span, clusters, size, seed=0):
+    '''Set of live ids: clusters runs of size ids each, at random places of [first, first + span)'''
+    rnd = random.Random(seed)
+    live = set()
+    for _ in range(clusters):
+        start = rnd.randrange(first, first + span - size)
+        live.update(range(start, start + size))
+    return live
+
+async def run(server, span, max_stride, bucket):
+    first = application.FIRST_ID + 1
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        manager = await fresh_manager(folder)
+        discovery = application.new_discovery(manager, max_stride=max_stride) if max_stride else None
+        everything = lambda: {"ids": range(first, first + span)}
+        sweep = lambda: {"ids": discovery.sweep() if discovery else []}
+        for name, kwargs in (("first pass", dict), ("sweep", sweep), ("every id", everything), ("re-crawl", everything)):
+            requests = server.hits["produto"]
+            outcomes = Counter()
+            kwargs = kwargs()
+            start = time.perf_counter()
+            await application.scrap_some(manager, len(kwargs.get("ids", range(span))), concurrency=16, parse_workers=0, outcomes=outcomes,
+                                         discovery=discovery, **kwargs)
+            results.append((name, time.perf_counter() - start, server.hits["produto"] - requests, await manager.count("Produto"), outcomes))
+        report = discovery.ids.report(bucket=bucket) if max_stride else []
+        summary = discovery.summary() if max_stride else ""
+        await manager.close()
+    return results, report, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="sparse id discovery benchmark")
+    parser.add_argument("--span", type=int, default=3000, help="ids walked")
+    parser.add_argument("--clusters", type=int, default=10, help="runs of live ids in the span")
+    parser.add_argument("--cluster-size", type=int, default=15, help="live ids in each run")
+    parser.add_argument("--rows", type=int, default=3, help="store rows on each product page")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the server waits before each response")
+    parser.add_argument("--max-stride", type=int, nargs="+", default=[4, 8, 16], help="Discovery max_stride for each discovery run")
+    parser.add_argument("--bucket", type=int, default=500, help="ids in each line of the density report")
+    args = parser.parse_args()
+
+    live = clustered(application.FIRST_ID + 1, args.span, args.clusters, args.cluster_size)
+    print(f"{args.span} ids, {len(live)} live ({len(live) / args.span:.1%}) in {args.clusters} clusters")
+    print(f"{'mode':>13} {'pass':>11} {'seconds':>8} {'requests':>9} {'products':>9}  outcomes")
+    for max_stride in [0] + args.max_stride:
+        server = StubServer(rows=args.rows, stores=50, latency=args.latency, live=live.__contains__).start()
+        application.BASE_URL = server.url
+        try:
+            results, report, summary = asyncio.run(run(server, args.span, max_stride, args.bucket))
+        finally:
+            server.stop()
+        mode = f"stride {max_stride}" if max_stride else "walk"
+        for name, seconds, requests, products, outcomes in results:
+            kinds = ", ".join(f"{outcomes[kind]} {kind}" for kind in ("new", "unchanged", "empty", "failed"))
+            print(f"{mode:>13} {name:>11} {seconds:8.2f} {requests:9} {products:9}  {kinds}")
+        if max_stride:
+            print(f"{'':>13} {summary}")
+        if max_stride == args.max_stride[-1]:
+            for line in report:
+                print(f"{'':>15}{line}")
+
+if __name__ == "__main__":
+    main()
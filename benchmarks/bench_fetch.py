@@ -0,0 +1,97 @@
+'''
+Fetch benchmark: application.scrap_some() against the local stub server (benchmarks.stub_server), on a fresh database every run.
+The baseline is the old flow, a blocking requests.get for each page, one product after the other.
+Reports products/s, the pages downloaded (store pages apart) and the store cache hit rate for every concurrency level.
+
+Run from the repository root:
+python -m benchmarks.bench_fetch --products 50 --latency 0.02 --concurrency 1 4 16 64 --parse-workers 0 8
+'''
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import aiosqlite
+import requests
+import application
+from modules.databasemanager import DatabaseManager
+from modules.fetcher import Fetched
+from .stub_server import StubServer
+
+class BlockingFetcher:
+    '''What scrap() did before: requests.get for every page, which blocks the event loop until the download is over'''
+    async def get(self, url):
+        return requests.get(url).text
+
+    async def fetch(self, url, headers=None):
+        response = requests.get(url, headers=headers)
+        return Fetched(response.status_code, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+async def fresh_manager(folder):
+    connection = await aiosqlite.connect(os.path.join(folder, "database.db"))
+    manager = DatabaseManager(connection, folder + os.sep)
+    await application.initialize(manager)
+    await application.init_meta(manager)
+    return manager
+
+async def scrap_blocking(manager, amount):
+    meta = (await manager.select_all_from("Meta"))[0]
+    fetcher = BlockingFetcher()
+    for i in range(meta.range_end, meta.range_end + amount):
+        await application.scrap(manager, i, fetcher)
+
+async def run_once(server, amount, concurrency, parse_workers=0):
+    '''One scrap_some() run, concurrency None is the blocking baseline (no store cache either)'''
+    pages_before = sum(server.hits.values())
+    stores_before = server.hits["loja"]
+    cache = None
+    with tempfile.TemporaryDirectory() as folder:
+        manager = await fresh_manager(folder)
+        try: # closed whatever happens, its thread would keep the process alive
+            start = time.perf_counter()
+            if concurrency is None:
+                await scrap_blocking(manager, amount)
+            else:
+                cache = await application.scrap_some(manager, amount, concurrency=concurrency, parse_workers=parse_workers)
+            elapsed = time.perf_counter() - start
+            rows = {table: await manager.count(table) for table in ("Produto", "Loja", "Anuncio")}
+        finally:
+            await manager.close()
+    pages = sum(server.hits.values()) - pages_before
+    return {"concurrency": concurrency, "seconds": elapsed, "pages": pages, "store_pages": server.hits["loja"] - stores_before,
+            "cache_hit_rate": None if cache is None else cache.hit_rate(), "rows": rows,
+            "products_per_s": amount / elapsed, "pages_per_s": pages / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description="scrap_some() fetch benchmark")
+    parser.add_argument("--products", type=int, default=50, help="product ids scraped in each run")
+    parser.add_argument("--rows", type=int, default=10, help="store rows on each product page")
+    parser.add_argument("--stores", type=int, default=200, help="distinct stores the rows link to")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the server waits before each response")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--parse-workers", type=int, nargs="+", default=[0, os.cpu_count() or 1], help="parser processes (0 parses in the event loop)")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the blocking requests.get run")
+    args = parser.parse_args()
+
+    server = StubServer(rows=args.rows, stores=args.stores, latency=args.latency).start()
+    server.warm(range(161001, 161001 + args.products))
+    application.BASE_URL = server.url
+    levels = [] if args.no_baseline else [(None, 0)]
+    levels += [(concurrency, workers) for workers in args.parse_workers for concurrency in args.concurrency]
+    baseline = None
+    print(f"{args.products} products, {args.rows} rows each, {args.latency * 1000:.0f} ms latency, {os.cpu_count()} cores")
+    print(f"{'mode':>24} {'seconds':>8} {'pages':>6} {'lojas':>6} {'cache':>6} {'products/s':>11} {'speedup':>8}  rows")
+    try:
+        for concurrency, workers in levels:
+            result = asyncio.run(run_once(server, args.products, concurrency, workers))
+            if baseline is None:
+                baseline = result
+            mode = "requests.get" if concurrency is None else f"concurrency {concurrency}, {workers} parsers"
+            hit_rate = "-" if result["cache_hit_rate"] is None else f"{result['cache_hit_rate']:.0%}"
+            print(f"{mode:>24} {result['seconds']:8.2f} {result['pages']:6} {result['store_pages']:6} {hit_rate:>6} "
+                  f"{result['products_per_s']:11.1f} {result['products_per_s'] / baseline['products_per_s']:7.1f}x  {result['rows']}")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''
+Hydration benchmark: select_all_from("Anuncio") over --rows rows, turning each row into an object of the generated class.
+  reload: what select_from() used to do, importing the class file again (f_utils.load_module) for every row
+  cached: select_all_from(), the class imported once and kept by the manager (entity_class())
+The SELECT itself is timed apart, the rest is the hydration.
+
+Run from the repository root:
+python -m benchmarks.bench_hydrate --rows 100000
+'''
+import argparse
+import asyncio
+import tempfile
+import time
+from modules.entity import Entity
+from modules.formuliteutils import utils as f_utils
+from .bench_fetch import fresh_manager
+
+def reloaded(manager, tablename, rows):
+    '''The objects as the old select_from() built them'''
+    result = []
+    for row in rows:
+        arg_dict = dict(zip(manager.entities[tablename].args_dict.keys(), row))
+        e_class = f_utils.load_module(tablename.lower(), manager.file_path + Entity.get_filename(tablename), tablename)
+        result.append(e_class(**arg_dict))
+    return result
+
+async def run(folder, args):
+    manager = await fresh_manager(folder)
+    await manager.insert_rows({"Anuncio": [(f"loja{i % 300}", 161001 + i, 10.0 + i % 997, "18/10/2026 10:00") for i in range(args.rows)]})
+    timings = {}
+    start = time.perf_counter()
+    rows = await manager.select("Anuncio")
+    timings["select"] = time.perf_counter() - start
+    reload_rows = rows[:args.reload_rows]
+    start = time.perf_counter()
+    old = reloaded(manager, "Anuncio", reload_rows)
+    timings["reload"] = (time.perf_counter() - start) / len(reload_rows) * len(rows)
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        new = await manager.select_all_from("Anuncio")
+        best = min(best, time.perf_counter() - start)
+    timings["cached"] = best - timings["select"]
+    same = [vars(obj) for obj in old] == [vars(obj) for obj in new[:len(old)]]
+    await manager.close()
+    return timings, len(rows), same
+
+def main():
+    parser = argparse.ArgumentParser(description="row hydration benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="Anuncio rows in the table")
+    parser.add_argument("--reload-rows", type=int, default=5000, help="rows hydrated the old way (it's slow), scaled up to --rows")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of select_all_from(), the best one counts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        timings, rows, same = asyncio.run(run(folder, args))
+    print(f"{rows} rows, SELECT alone {timings['select']:.2f} s")
+    for name in ("reload", "cached"):
+        print(f"{name:>7}: {timings[name]:8.2f} s hydrating, {rows / timings[name]:10.0f} rows/s, "
+              f"{rows / (timings[name] + timings['select']):10.0f} rows/s with the SELECT")
+    print(f"cached hydrates {timings['reload'] / timings['cached']:.0f}x faster, same objects: {same}")
+
+if __name__ == "__main__":
+    main()
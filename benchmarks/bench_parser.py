@@ -0,0 +1,137 @@
+'''
+Parser benchmark: seed.build() and the find / select queries scrap() runs, on the synthetic pages from benchmarks.fixtures.
+For every page size it reports parse throughput (MB/s), nodes per second, peak memory (tracemalloc)
+and query latency, for both _build_from_string and _build_from_file.
+
+Run from the repository root:
+python -m benchmarks.bench_parser --output results.json
+python -m benchmarks.bench_parser --compare results.json      (flags anything more than --tolerance slower, 10% by default)
+'''
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from modules.mySoup import seed
+from . import fixtures
+
+def count_nodes(trees):
+    return sum(len(tree.find_all(tagname=seed.anything())) for tree in trees)
+
+def product_queries(tree):
+    '''The lookups scrap() makes on a product page'''
+    tree.select_one(".nome").get("text")
+    tree.select_one(".especificacao").get("text")
+    tree.select_one(".row.painel .data-hora").get("text")
+    for row in tree.select(".row.painel .tab-content .row"):
+        row.select_one(".col-md-3.preco-loja").get("text")
+        row.select_one("a").get("href")
+        row.select_one(".fa.fa-credit-card")
+        row.select_one(".fa.fa-motorcycle")
+
+def store_queries(tree):
+    '''The lookups scrap() makes on a store page'''
+    tree.select(".col-md-12 span")[5].get("text")
+
+def timed(function, min_time):
+    '''Runs function until min_time seconds have passed, returns seconds per call'''
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+def peak_memory(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def bench_page(name, page, below_class, queries, folder, min_time):
+    path = os.path.join(folder, name + ".html")
+    with open(path, "w") as f:
+        f.write(page)
+    size = len(page.encode())
+
+    result = {"page": name, "bytes": size}
+    trees = seed.build(string=page, below_class=below_class)
+    nodes = count_nodes(trees)
+    result["nodes"] = nodes
+    builders = {
+        "string": lambda: seed._build_from_string(page, below_class=below_class),
+        "file": lambda: seed._build_from_file(path, below_class=below_class),
+    }
+    for mode, build in builders.items():
+        seconds = timed(build, min_time)
+        result[mode] = {
+            "ms": seconds * 1000,
+            "mb_per_s": size / seconds / 1e6,
+            "nodes_per_s": nodes / seconds,
+            "peak_kib": peak_memory(build) / 1024,
+        }
+    result["query_ms"] = timed(lambda: queries(trees[0]), min_time) * 1000
+    return result
+
+def run(min_time=0.5):
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in fixtures.ROW_COUNTS:
+            results.append(bench_page(f"produto_{rows}", fixtures.product_page(rows), "col-md-8", product_queries, folder, min_time))
+        results.append(bench_page("loja", fixtures.store_page(), "container", store_queries, folder, min_time))
+    return {"python": platform.python_version(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+
+def show(report, baseline=None, tolerance=0.10):
+    '''Prints a table, with the change against a previous report when one is given'''
+    previous = {}
+    if baseline:
+        previous = {r["page"]: r for r in baseline["results"]}
+    header = f"{'page':14} {'KiB':>7} {'nodes':>6} {'str ms':>8} {'MB/s':>6} {'file ms':>8} {'MB/s':>6} {'knodes/s':>9} {'peak KiB':>9} {'query ms':>9}"
+    print(header)
+    regressions = []
+    for r in report["results"]:
+        line = (f"{r['page']:14} {r['bytes'] / 1024:7.1f} {r['nodes']:6} {r['string']['ms']:8.2f} {r['string']['mb_per_s']:6.1f} "
+                f"{r['file']['ms']:8.2f} {r['file']['mb_per_s']:6.1f} {r['string']['nodes_per_s'] / 1000:9.1f} "
+                f"{r['string']['peak_kib']:9.1f} {r['query_ms']:9.3f}")
+        old = previous.get(r["page"])
+        if old:
+            changes = []
+            for label, new_value, old_value in (("str", r["string"]["ms"], old["string"]["ms"]),
+                                                ("file", r["file"]["ms"], old["file"]["ms"]),
+                                                ("query", r["query_ms"], old["query_ms"])):
+                ratio = new_value / old_value
+                changes.append(f"{label} x{ratio:.2f}")
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{r['page']} {label}: {old_value:.3f} -> {new_value:.3f} ms")
+            line += "   " + ", ".join(changes)
+        print(line)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="mySoup parser benchmark")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="slowdown ratio reported as a regression (0.10 = 10%%)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent on each measurement")
+    args = parser.parse_args()
+
+    report = run(args.min_time)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = show(report, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+'''
+Query benchmark: the statements formulite used to write with the values in the SQL text against the ones with placeholders.
+  insert: insert() of --rows Anuncio rows, inside a transaction. Interpolated is what insert() used to run: a
+          SELECT count(*) ... WHERE with the key in the text, then an INSERT with the values in the text
+  lookup: exists() for --lookups random store nicks. Interpolated is what it used to run: SELECT count(*) ... WHERE l_nick='...'
+Both through the manager (aiosqlite, what the application sees) and straight on a sqlite3 connection, where the time
+SQLite spends parsing and planning each new statement text is not hidden by the trips to aiosqlite's thread.
+The values have no quotes, or the interpolated statements would break on them.
+
+Run from the repository root:
+python -m benchmarks.bench_queries --rows 5000 --lookups 5000
+'''
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from .bench_fetch import fresh_manager
+
+def anuncios(amount, stores, seed=0):
+    rnd = random.Random(seed)
+    return [{"l_nick": f"loja{rnd.randrange(stores)}", "prod_id": 161001 + i, "prod_price": f"R$ {rnd.randrange(10, 5000)},{rnd.randrange(100):02d}",
+             "time_catch": "18/10/2026 10:00"} for i in range(amount)]
+
+def interpolated_insert(table, keys, pk, row):
+    '''The two statements insert() used to run for a row'''
+    def text(value):
+        return f'"{value}"' if isinstance(value, str) else str(value)
+    cond = " AND ".join(f"{key}={text(row[key])}" for key in pk)
+    return (f"SELECT count(*) FROM {table} WHERE {cond}",
+            f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({', '.join(text(row[key]) for key in keys)})")
+
+async def through_manager(folder, rows, nicks, interpolated):
+    manager = await fresh_manager(folder)
+    keys = list(manager.entities["Anuncio"].args_dict)
+    pk = manager.entities["Anuncio"].primary_key
+    start = time.perf_counter()
+    async with manager.transaction():
+        if interpolated:
+            for row in rows:
+                exists, insert = interpolated_insert("Anuncio", keys, pk, row)
+                if (await manager.conn.execute_fetchall(exists))[0][0] == 0:
+                    await manager.conn.execute(insert)
+        else:
+            for obj in manager.build_many("Anuncio", rows):
+                await manager.insert(obj)
+    inserted = time.perf_counter() - start
+    await manager.insert_rows({"Loja": [(f"loja{i}", f"Loja {i}", 1, 0, "Rua") for i in range(0, 600, 2)]})
+    start = time.perf_counter()
+    found = 0
+    for nick in nicks:
+        if interpolated:
+            found += (await manager.conn.execute_fetchall(f"SELECT count(*) FROM Loja WHERE l_nick='{nick}'"))[0][0] > 0
+        else:
+            found += await manager.exists("Loja", l_nick=nick)
+    looked = time.perf_counter() - start
+    await manager.close()
+    return inserted, looked, found
+
+def through_sqlite(path, rows, nicks, interpolated):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE Anuncio (l_nick TEXT, prod_id INT, prod_price FLOAT, time_catch TEXT, PRIMARY KEY(l_nick, prod_id, prod_price))")
+    conn.execute("CREATE TABLE Loja (l_nick TEXT, l_name TEXT, l_credit BOOL, l_delivery BOOL, l_address TEXT, PRIMARY KEY(l_nick))")
+    conn.executemany("INSERT INTO Loja VALUES (?, ?, 1, 0, 'Rua')", [(f"loja{i}", f"Loja {i}") for i in range(0, 600, 2)])
+    conn.commit()
+    keys = ["l_nick", "prod_id", "prod_price", "time_catch"]
+    start = time.perf_counter()
+    for row in rows:
+        if interpolated:
+            exists, insert = interpolated_insert("Anuncio", keys, keys[:3], row)
+            if conn.execute(exists).fetchone()[0] == 0:
+                conn.execute(insert)
+        else:
+            conn.execute("INSERT OR IGNORE INTO Anuncio (l_nick, prod_id, prod_price, time_catch) VALUES (?, ?, ?, ?)", [row[key] for key in keys])
+    conn.commit()
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    found = 0
+    for nick in nicks:
+        if interpolated:
+            found += conn.execute(f"SELECT count(*) FROM Loja WHERE l_nick='{nick}'").fetchone()[0] > 0
+        else:
+            found += conn.execute("SELECT 1 FROM Loja WHERE l_nick=? LIMIT 1", (nick,)).fetchone() is not None
+    looked = time.perf_counter() - start
+    conn.close()
+    return inserted, looked, found
+
+def main():
+    parser = argparse.ArgumentParser(description="parameterized query benchmark")
+    parser.add_argument("--rows", type=int, default=5000, help="rows inserted")
+    parser.add_argument("--lookups", type=int, default=5000, help="exists() calls")
+    parser.add_argument("--stores", type=int, default=600, help="distinct store nicks (half of them in the database)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each, the best one counts")
+    args = parser.parse_args()
+
+    rows = anuncios(args.rows, args.stores)
+    nicks = [f"loja{n}" for n in random.Random(1).choices(range(args.stores), k=args.lookups)]
+    print(f"{args.rows} inserts, {args.lookups} lookups")
+    print(f"{'':>8} {'statements':>13} {'inserts/s':>10} {'lookups/s':>10} {'found':>6}")
+    for where in ("manager", "sqlite3"):
+        results = {True: (float("inf"), float("inf"), 0), False: (float("inf"), float("inf"), 0)}
+        for _ in range(args.repeat): # taking turns, so both see the same state of the machine
+            for interpolated in (True, False):
+                with tempfile.TemporaryDirectory() as folder:
+                    if where == "manager":
+                        took = asyncio.run(through_manager(folder, rows, nicks, interpolated))
+                    else:
+                        took = through_sqlite(os.path.join(folder, "database.db"), rows, nicks, interpolated)
+                best = results[interpolated]
+                results[interpolated] = (min(best[0], took[0]), min(best[1], took[1]), took[2])
+        for interpolated in (True, False):
+            inserted, looked, found = results[interpolated]
+            name = "interpolated" if interpolated else "placeholders"
+            print(f"{where:>8} {name:>13} {args.rows / inserted:10.0f} {args.lookups / looked:10.0f} {found:6}")
+        print(f"{'':>8} {'speedup':>13} {results[True][0] / results[False][0]:9.1f}x {results[True][1] / results[False][1]:9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''
+Rate control benchmark: scrap_some() against a stub server that can only take --capacity requests at a time
+(it answers 429 past that), slows down with load and fails --error-rate of the requests with a 503.
+Compares a fixed concurrency (no limiter, no retries) with the adaptive limiter going up to the same concurrency,
+and samples the limiter (limit, requests in flight, rate) while the adaptive run goes.
+
+Run from the repository root:
+python -m benchmarks.bench_rate --products 200 --concurrency 32 --capacity 8
+'''
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import Counter
+import application
+from .bench_fetch import fresh_manager
+from .stub_server import StubServer
+
+async def run_once(server, amount, concurrency, adaptive, sample_every):
+    errors_before = Counter(server.errors)
+    outcomes = Counter()
+    limiters = {}
+    samples = []
+
+    async def sample():
+        start = time.perf_counter()
+        while True:
+            await asyncio.sleep(sample_every)
+            for limiter in limiters.values():
+                samples.append((time.perf_counter() - start, limiter.limit, limiter.in_flight, limiter.rate()))
+
+    with tempfile.TemporaryDirectory() as folder:
+        manager = await fresh_manager(folder)
+        sampler = asyncio.create_task(sample())
+        start = time.perf_counter()
+        await application.scrap_some(manager, amount, concurrency=concurrency, parse_workers=0, outcomes=outcomes,
+                                     adaptive=adaptive, limiters=limiters)
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+        products = await manager.count("Produto")
+        await manager.close()
+    return {"seconds": elapsed, "outcomes": outcomes, "products": products, "errors": Counter(server.errors) - errors_before,
+            "limiters": limiters, "samples": samples}
+
+def main():
+    parser = argparse.ArgumentParser(description="adaptive rate control benchmark")
+    parser.add_argument("--products", type=int, default=200, help="product ids scraped in each run")
+    parser.add_argument("--rows", type=int, default=5, help="store rows on each product page")
+    parser.add_argument("--stores", type=int, default=100, help="distinct stores the rows link to")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the server waits before each response")
+    parser.add_argument("--slowdown", type=float, default=0.002, help="seconds added to the latency for each request in flight")
+    parser.add_argument("--capacity", type=int, default=8, help="requests the server takes at a time, 429 past that")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of the requests answered with a 503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of the 429 answers")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sample-every", type=float, default=0.25, help="seconds between samples of the limiter")
+    args = parser.parse_args()
+
+    print(f"{args.products} products, server capacity {args.capacity}, {args.latency * 1000:.0f} ms latency "
+          f"+ {args.slowdown * 1000:.0f} ms per request in flight, {args.error_rate:.0%} 503s")
+    print(f"{'mode':>22} {'seconds':>8} {'products':>9} {'failed':>7} {'429s':>5} {'503s':>5} {'products/s':>11}")
+    for adaptive in (False, True):
+        server = StubServer(rows=args.rows, stores=args.stores, latency=args.latency, slowdown=args.slowdown, capacity=args.capacity,
+                            retry_after=args.retry_after, error_rate=args.error_rate).start()
+        server.warm(range(161001, 161001 + args.products))
+        application.BASE_URL = server.url
+        try:
+            result = asyncio.run(run_once(server, args.products, args.concurrency, adaptive, args.sample_every))
+        finally:
+            server.stop()
+        mode = f"{'adaptive' if adaptive else 'fixed'} {args.concurrency}"
+        print(f"{mode:>22} {result['seconds']:8.2f} {result['products']:9} {result['outcomes']['failed']:7} "
+              f"{result['errors'][429]:5} {result['errors'][503]:5} {result['products'] / result['seconds']:11.1f}")
+        for host, limiter in result["limiters"].items():
+            print(f"{'':>22} {host}: {limiter.summary()}")
+        if result["samples"]:
+            print(f"{'':>22} limit / in flight / req/s over time:")
+            for at, limit, in_flight, rate in result["samples"][::max(1, len(result["samples"]) // 12)]:
+                print(f"{'':>24}{at:6.2f}s {limit:6.1f} {in_flight:4} {rate:7.1f}")
+
+if __name__ == "__main__":
+    main()
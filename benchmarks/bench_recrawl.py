@@ -0,0 +1,65 @@
+'''
+Re-crawl benchmark: a first crawl of --products ids, then --changed of the products get new pages and the same ids are scraped again.
+The re-crawl of a scraper without change detection costs what the first crawl did (every page downloaded, parsed and written again),
+so the first crawl is the baseline. Reports the bytes the server sent, the 304 answers, the rows handed to the database and the page outcomes,
+with the server sending validators (conditional requests) and without them (only the content hash helps).
+
+Run from the repository root:
+python -m benchmarks.bench_recrawl --products 200 --changed 0.1
+'''
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import Counter
+import application
+from .bench_fetch import fresh_manager
+from .stub_server import StubServer
+
+async def crawl(server, manager, ids, concurrency):
+    sent, not_modified = server.sent, server.not_modified
+    outcomes = Counter()
+    start = time.perf_counter()
+    await application.scrap_some(manager, len(ids), concurrency=concurrency, parse_workers=0, ids=ids, outcomes=outcomes)
+    return {"seconds": time.perf_counter() - start, "bytes": server.sent - sent, "304": server.not_modified - not_modified, "outcomes": outcomes}
+
+async def run(server, ids, changed, concurrency):
+    with tempfile.TemporaryDirectory() as folder:
+        manager = await fresh_manager(folder)
+        first = await crawl(server, manager, ids, concurrency)
+        server.change(changed)
+        again = await crawl(server, manager, ids, concurrency)
+        await manager.close()
+    return first, again
+
+def main():
+    parser = argparse.ArgumentParser(description="scrap_some() re-crawl benchmark")
+    parser.add_argument("--products", type=int, default=200, help="product ids crawled")
+    parser.add_argument("--changed", type=float, default=0.1, help="share of the products that change between the crawls")
+    parser.add_argument("--rows", type=int, default=10, help="store rows on each product page")
+    parser.add_argument("--stores", type=int, default=200, help="distinct stores the rows link to")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the server waits before each response")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    ids = list(range(161001, 161001 + args.products))
+    changed = random.Random(0).sample(ids, int(len(ids) * args.changed))
+    print(f"{args.products} products, {len(changed)} changed between the crawls, {args.rows} rows each, {args.latency * 1000:.0f} ms latency")
+    print(f"{'server':>12} {'crawl':>8} {'seconds':>8} {'KiB sent':>9} {'304':>5} {'rows':>6}  outcomes")
+    for validators in (True, False):
+        server = StubServer(rows=args.rows, stores=args.stores, latency=args.latency, validators=validators).start()
+        application.BASE_URL = server.url
+        try:
+            first, again = asyncio.run(run(server, ids, changed, args.concurrency))
+        finally:
+            server.stop()
+        for name, result in (("first", first), ("re-crawl", again)):
+            outcomes = result["outcomes"]
+            kinds = ", ".join(f"{outcomes[kind]} {kind}" for kind in ("new", "changed", "unchanged", "empty"))
+            print(f"{'validators' if validators else 'no validators':>12} {name:>8} {result['seconds']:8.2f} {result['bytes'] / 1024:9.0f} "
+                  f"{result['304']:5} {outcomes['rows']:6}  {kinds}")
+        print(f"{'':>12} re-crawl: {again['bytes'] / first['bytes']:.0%} of the bytes, {again['outcomes']['rows'] / first['outcomes']['rows']:.0%} of the rows")
+
+if __name__ == "__main__":
+    main()
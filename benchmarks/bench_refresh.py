@@ -0,0 +1,111 @@
+'''
+Refresh benchmark: --products products already scraped, of which --volatile change every hour and the rest now and then
+(--churn of them each hour), and a budget of --budget product pages an hour to keep them fresh, well short of all of them.
+Runs application.daemon() for --hours rounds of an (simulated) hour each, with the staleness and volatility priority
+of modules/scheduler.py (--oldest-share of each round going to the products seen longest ago), and with a plain round robin (every product due after the same interval, the oldest first).
+Reports how many products the database has out of date after each round (the site changed them since they were scraped),
+the volatile ones and the others, over the whole run and over its last day, and how many of the pages went to refreshing
+products (what the schedule doesn't need goes to new ids, past the products, which the benchmark's site doesn't have).
+
+Run from the repository root:
+python -m benchmarks.bench_refresh --products 300 --volatile 30 --budget 40 --hours 96
+'''
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+import application
+from modules.scheduler import RefreshScheduler
+from .bench_fetch import fresh_manager
+from .stub_server import StubServer
+
+class Watched(RefreshScheduler):
+    '''RefreshScheduler that also notes which version of each product page the database got'''
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.server = server
+        self.versions = {} # pid -> version of the page last scraped
+        self.handed = 0 # products handed out by due()
+
+    def record(self, pid, outcome):
+        if outcome in ("new", "changed", "unchanged"):
+            self.versions[pid] = self.server._versions.get(pid, (0, None))[0]
+        super().record(pid, outcome)
+
+    def due(self, *args, **kwargs):
+        pids = super().due(*args, **kwargs)
+        self.handed += len(pids)
+        return pids
+
+    def stale(self, pids):
+        return sum(1 for pid in pids if self.versions.get(pid) != self.server._versions.get(pid, (0, None))[0])
+
+async def run(server, pids, volatile, args, round_robin):
+    hour = 60 * 60
+    now = [0.0]
+    if round_robin: # every product every len(pids) / budget hours
+        interval = len(pids) / args.budget * hour
+        limits = {"min_interval": interval, "max_interval": interval, "oldest_share": 0}
+    else:
+        limits = {"min_interval": hour, "max_interval": args.max_interval * hour, "oldest_share": args.oldest_share}
+    rnd = random.Random(1)
+    others = sorted(set(pids) - set(volatile))
+    stale = [] # (volatile, others) out of date after each round
+    requested = 0
+    with tempfile.TemporaryDirectory() as folder:
+        manager = await fresh_manager(folder)
+        scheduler = Watched(server, manager, clock=lambda: now[0], **limits)
+        await scheduler.setup()
+        await scheduler.load()
+        await application.scrap_some(manager, len(pids), parse_workers=0, seen=scheduler.record)
+        await scheduler.flush()
+        store_cache = application.new_store_cache(manager)
+        for _ in range(args.hours):
+            now[0] += hour
+            server.change(volatile + rnd.sample(pids, args.churn))
+            before = server.hits["produto"]
+            await application.daemon(manager, budget=args.budget, period=hour, refresh_share=1.0, rounds=1, scheduler=scheduler,
+                                     store_cache=store_cache, log=lambda line: None)
+            requested += server.hits["produto"] - before
+            stale.append((scheduler.stale(volatile), scheduler.stale(others)))
+        await manager.close()
+    return stale, requested, scheduler.handed
+
+def main():
+    parser = argparse.ArgumentParser(description="refresh scheduling benchmark")
+    parser.add_argument("--products", type=int, default=300, help="products scraped before the rounds")
+    parser.add_argument("--volatile", type=int, default=30, help="products that change every hour")
+    parser.add_argument("--churn", type=int, default=3, help="other products that change each hour, picked at random")
+    parser.add_argument("--budget", type=int, default=40, help="product pages requested each hour")
+    parser.add_argument("--hours", type=int, default=96, help="rounds run")
+    parser.add_argument("--max-interval", type=float, default=7 * 24, help="hours until a product that never changes is due")
+    parser.add_argument("--oldest-share", type=float, default=0.5, help="share of each round kept for the products seen longest ago")
+    parser.add_argument("--rows", type=int, default=3, help="store rows on each product page")
+    args = parser.parse_args()
+
+    first = application.FIRST_ID + 1
+    pids = list(range(first, first + args.products))
+    volatile = random.Random(0).sample(pids, args.volatile)
+    print(f"{args.products} products, {args.volatile} changing every hour, {args.churn} others an hour, "
+          f"{args.budget} pages an hour, {args.hours} hours")
+    print(f"{'schedule':>12} {'out of date: volatile':>22} {'others':>7} {'all':>6} {'last 24h: volatile':>19} {'others':>7} {'all':>6} "
+          f"{'pages':>6} {'refresh':>8} {'seconds':>8}")
+    for round_robin in (True, False):
+        server = StubServer(rows=args.rows, stores=50, latency=0.002, live=set(pids).__contains__).start()
+        server.warm(pids)
+        application.BASE_URL = server.url
+        start = time.perf_counter()
+        try:
+            stale, requested, refreshed = asyncio.run(run(server, pids, volatile, args, round_robin))
+        finally:
+            server.stop()
+        elapsed = time.perf_counter() - start
+        means = []
+        for rounds in (stale, stale[-24:]):
+            means += [sum(v for v, o in rounds) / len(rounds), sum(o for v, o in rounds) / len(rounds), sum(v + o for v, o in rounds) / len(rounds)]
+        print(f"{'round robin' if round_robin else 'priority':>12} {means[0]:22.1f} {means[1]:7.1f} {means[2]:6.1f} {means[3]:19.1f} {means[4]:7.1f} "
+              f"{means[5]:6.1f} {requested:6} {refreshed:8} {elapsed:8.1f}")
+
+if __name__ == "__main__":
+    main()
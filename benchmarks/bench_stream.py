@@ -0,0 +1,96 @@
+'''
+Streaming benchmark: the cheapest ad ("Produto mais barato" in application.main()) found over an Anuncio table of each
+of the --rows sizes, reading it five ways:
+  list:          select_all_from(), every row an object, all of them in a list (what main() used to do)
+  iter object:   iter_select_from(), the same objects, built a batch at a time
+  iter view:     iter_select_from(kind="view"), named tuples
+  iter tuple:    iter_select_from(kind="tuple"), the rows as sqlite gives them
+  iter prices:   iter_select_from("Anuncio", "prod_price", kind="tuple"), only the column needed
+Reports the time of each and the peak of the memory allocated meanwhile (tracemalloc, in a second run so it doesn't
+slow the timed one), which should stay flat for the iterators however big the table is.
+
+Run from the repository root:
+python -m benchmarks.bench_stream --rows 20000 100000 300000
+'''
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+import application
+from .bench_fetch import fresh_manager
+
+def cheapest(prices):
+    least = None
+    for price in prices:
+        price = application.get_price(price)
+        if price and (least is None or price < least):
+            least = price
+    return least
+
+class Price:
+    # what get_price() reads, for the columns that come as plain strings
+    __slots__ = ("prod_price",)
+    def __init__(self, prod_price):
+        self.prod_price = prod_price
+
+async def through_list(manager, args):
+    return cheapest(await manager.select_all_from("Anuncio"))
+
+async def through_iter(manager, args, kind):
+    least = None
+    async for anuncio in manager.iter_select_from("Anuncio", kind=kind, batch_size=args.batch_size):
+        price = application.get_price(anuncio if kind != "tuple" else Price(anuncio[2]))
+        if price and (least is None or price < least):
+            least = price
+    return least
+
+async def through_prices(manager, args):
+    least = None
+    async for prod_price, in manager.iter_select_from("Anuncio", "prod_price", kind="tuple", batch_size=args.batch_size):
+        price = application.get_price(Price(prod_price))
+        if price and (least is None or price < least):
+            least = price
+    return least
+
+WAYS = {
+    "list": through_list,
+    "iter object": lambda manager, args: through_iter(manager, args, "object"),
+    "iter view": lambda manager, args: through_iter(manager, args, "view"),
+    "iter tuple": lambda manager, args: through_iter(manager, args, "tuple"),
+    "iter prices": through_prices,
+}
+
+async def run(folder, rows, args):
+    manager = await fresh_manager(folder)
+    await manager.insert_rows({"Anuncio": [(f"loja{i % 300}", 161001 + i, f"R$ {(i * 7919) % 100000 + 10},{i % 100:02d}", "18/10/2026 10:00")
+                                           for i in range(rows)]})
+    results = {}
+    for name, way in WAYS.items():
+        start = time.perf_counter()
+        least = await way(manager, args)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        await way(manager, args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (elapsed, peak, least)
+    await manager.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="streaming select benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 100000, 300000], help="sizes of the Anuncio table")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows of each fetchmany()")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'way':>12} {'seconds':>8} {'rows/s':>9} {'peak MiB':>9}  cheapest")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as folder:
+            results = asyncio.run(run(folder, rows, args))
+        for name, (elapsed, peak, least) in results.items():
+            print(f"{rows:8} {name:>12} {elapsed:8.2f} {rows / elapsed:9.0f} {peak / 2 ** 20:9.2f}  {least}")
+        print(f"{'':8} all found the same: {len({least for _, _, least in results.values()}) == 1}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''
+Micro-benchmark for the mySoup traversal engine.
+Compares the old recursive find_all (rebuilt here for reference) against Node.iter_find on big synthetic trees,
+measuring time and peak allocations with tracemalloc.
+
+Run from the repository root:
+python -m benchmarks.bench_traversal
+'''
+import sys
+import time
+import tracemalloc
+from modules.mySoup import seed
+
+def wide_page(rows):
+    '''A product-like page: many rows, each with a few nested children'''
+    row = '<div class="row"><div class="col-md-3 preco-loja">R$ 10,00</div><div class="col-md-6"><a href="/loja/x">Loja</a><i class="fa fa-credit-card"></i></div></div>'
+    return '<div class="tab-content">' + row * rows + '</div>'
+
+def deep_page(depth):
+    '''Nested divs, deeper than the default recursion limit'''
+    return '<div data-level="x">' * depth + '<a href="/loja/x">fundo</a>' + '</div>' * depth
+
+def recursive_find_all(node, search_args):
+    '''The find_all implementation mySoup used to have: recursion plus a new list per level'''
+    result = []
+    if node.matches(search_args):
+        result.append(node)
+    if node.subordinates:
+        for sub in node.subordinates:
+            result.extend(recursive_find_all(sub, search_args))
+    return result
+
+def measure(function, repeat):
+    '''Returns (ms per call, peak KiB allocated during one call)'''
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = (time.perf_counter() - start) / repeat
+    return elapsed * 1000, peak / 1024
+
+def run(rows=5000, depth=5000, repeat=20):
+    tree = seed.build(string=wide_page(rows))[0]
+    root = tree.root
+    walk = {"href": seed.anything()} # not indexed, so iter_find has to walk the tree
+    indexed = {"tagname": "a"}
+
+    cases = [
+        ("recursive find_all (walk)", lambda: recursive_find_all(root, walk)),
+        ("iter_find -> list (walk)", lambda: list(root.iter_find(**walk))),
+        ("iter_find limit=1 (walk)", lambda: list(root.iter_find(limit=1, **walk))),
+        ("iter_find bfs (walk)", lambda: list(root.iter_find(order="bfs", **walk))),
+        ("recursive find_all (tagname)", lambda: recursive_find_all(root, indexed)),
+        ("iter_find -> list (index)", lambda: list(root.iter_find(**indexed))),
+    ]
+    print(f"{len(tree.nodes)} nodes")
+    print(f"{'case':32} {'ms':>10} {'peak KiB':>10}")
+    for name, function in cases:
+        ms, peak = measure(function, repeat)
+        print(f"{name:32} {ms:10.3f} {peak:10.1f}")
+
+    # every node of a deep chain matches: the recursive version copies the results once per level
+    chain = seed.build(string=deep_page(900))[0].root
+    levels = {"data-level": seed.anything()}
+    for name, function in [("recursive find_all (900 deep)", lambda: recursive_find_all(chain, levels)),
+                           ("iter_find -> list (900 deep)", lambda: list(chain.iter_find(**levels)))]:
+        ms, peak = measure(function, repeat)
+        print(f"{name:32} {ms:10.3f} {peak:10.1f}")
+
+    deep = seed.build(string=deep_page(depth))[0].root
+    try:
+        recursive_find_all(deep, walk)
+        print(f"recursive find_all at depth {depth}: ok")
+    except RecursionError:
+        print(f"recursive find_all at depth {depth}: RecursionError (limit {sys.getrecursionlimit()})")
+    print(f"iter_find at depth {depth}: {len(list(deep.iter_find(**walk)))} result(s)")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,120 @@
+'''
+Synthetic BoaDica pages for the benchmarks.
+They are not copies of the real site, but follow the same structure scrap() relies on:
+product pages have col-md-8 > nome / especificacao / row painel (data-hora, tab-content with one row per store),
+store pages have a container with a col-md-12 full of spans (the address is the 6th one).
+Like the real pages, every tag sits on its own CRLF line with deep indentation, after a heavy head and navbar.
+
+Run from the repository root to write a set of pages to a folder:
+python -m benchmarks.fixtures fixtures/
+'''
+import os
+import random
+import re
+import sys
+
+ROW_COUNTS = [1, 10, 50, 100, 250, 500]
+
+def _indent(html, base=16, width=4):
+    '''Puts each tag / text on its own indented CRLF line, like the server templates do'''
+    out = []
+    depth = 0
+    for piece in re.findall(r'<[^>]*>|[^<]+', html):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if piece.startswith("</"):
+            depth = max(depth - 1, 0)
+        out.append("\r\n" + " " * (base + width * depth) + piece)
+        opening = piece.startswith("<") and not piece.startswith(("</", "<!")) and not piece.endswith("/>")
+        if opening and not re.match(r'<(br|img|input|meta|link)\b', piece):
+            depth += 1
+    return "".join(out)
+
+def _page(title, body, rnd):
+    '''Head, navbar and footer shared by every page'''
+    head = ['<!DOCTYPE html><html lang="pt-br"><head><meta charset="utf-8">',
+            '<meta name="viewport" content="width=device-width, initial-scale=1">',
+            f'<title>{title} - BoaDica</title>']
+    for i in range(8):
+        head.append(f'<link rel="stylesheet" href="https://www.boadica.com.br/Content/css/bundle{i}.css?v=20261018" type="text/css">')
+    head.append('<script type="text/javascript">')
+    head.append("".join(f'var cfg{i} = {{"url": "https://www.boadica.com.br/api/v{i}/itens?pagina={i}", "ttl": {rnd.randint(1, 999)}}};' for i in range(60)))
+    head.append('</script></head><body>')
+    nav = ['<nav class="navbar navbar-default navbar-fixed-top"><div class="container-fluid"><ul class="nav navbar-nav">']
+    for i in range(40):
+        nav.append(f'<li class="dropdown"><a href="/categoria/{i}" class="dropdown-toggle" data-toggle="dropdown" role="button" aria-haspopup="true" aria-expanded="false">Categoria {i}</a></li>')
+    nav.append('</ul></div></nav>')
+    foot = ['<footer class="footer"><div class="footer-links">']
+    for i in range(30):
+        foot.append(f'<a href="/institucional/{i}" title="Link institucional {i}">Link {i}</a>')
+    foot.append('</div></footer></body></html>')
+    return _indent("".join(head) + "".join(nav) + body + "".join(foot))
+
+def product_page(rows, seed=0, stores=None):
+    '''
+    A /produtos/p<id> page listing the given number of store rows
+    Row i links to store loja<i>, unless stores is given: then each row links to a random one of loja0 ... loja<stores - 1>
+    '''
+    rnd = random.Random(seed)
+    body = ['<div class="container"><div class="row"><div class="col-md-8">',
+            f'<h1 class="nome">Placa de Vídeo GTX {rnd.randint(100, 999)} {rnd.choice(["OC", "Gaming", "Mini"])}</h1>',
+            '<p class="especificacao">Memória 4GB<br/>GDDR5 <span class="destaque">128 bits</span> PCI-Express 3.0</p>',
+            '<div class="row painel">',
+            f'<span class="data-hora">18/10/2026 {rnd.randint(10, 23)}:{rnd.randint(10, 59)}</span>',
+            '<div class="tab-content">']
+    for i in range(rows):
+        store = i if stores is None else rnd.randrange(stores)
+        body.append('<div class="row">')
+        body.append(f'<div class="col-md-3 preco-loja">R$ {rnd.randint(10, 2999)},{rnd.randint(0, 99):02d}</div>')
+        body.append(f'<div class="col-md-6"><a href="/loja/loja{store}">Loja {store} Informática</a>')
+        if rnd.random() < .5:
+            body.append('<i class="fa fa-credit-card"></i>')
+        if rnd.random() < .5:
+            body.append('<i class="fa fa-motorcycle"></i>')
+        body.append('<img src="/img/selo.png" alt="selo" /></div>')
+        body.append(f'<div class="col-md-3"><span class="bairro">Centro</span><a href="/anuncio/{i}" class="btn btn-default">Ver</a></div>')
+        body.append('</div>')
+    body.append('</div></div></div>')
+    body.append('<div class="col-md-4"><input type="text" disabled name="busca"><br></div>')
+    body.append('</div></div>')
+    return _page("Produto", "".join(body), rnd)
+
+def store_page(seed=0):
+    '''A /loja/<nick> page'''
+    rnd = random.Random(seed)
+    body = ['<div class="container"><div class="row"><div class="col-md-12">',
+            '<span>Loja</span>',
+            f'<span>Loja {seed} Informática</span>',
+            f'<span>Telefone: (21) 2{rnd.randint(100, 999)}-{rnd.randint(1000, 9999)}</span>',
+            '<span>Horário: 9h às 18h</span>',
+            '<span>Pagamento: cartão</span>',
+            f'<span>Endereço:<br/>Av. Rio Branco, 156 loja {rnd.randint(1, 400)}</span>',
+            '</div></div></div>']
+    return _page("Loja", "".join(body), rnd)
+
+def missing_page(seed=0):
+    '''What a /produtos/p<id> page looks like when there is no product with that id'''
+    rnd = random.Random(seed)
+    body = ['<div class="container"><div class="row"><div class="col-md-12">',
+            '<div class="alert alert-warning">Produto não encontrado.</div>',
+            '</div></div></div>']
+    return _page("Produto não encontrado", "".join(body), rnd)
+
+def write_all(folder):
+    '''Writes every fixture page into the given folder, returns their paths'''
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    paths = []
+    for rows in ROW_COUNTS:
+        paths.append(os.path.join(folder, f"produto_{rows}.html"))
+        with open(paths[-1], "w") as f:
+            f.write(product_page(rows))
+    paths.append(os.path.join(folder, "loja.html"))
+    with open(paths[-1], "w") as f:
+        f.write(store_page())
+    return paths
+
+if __name__ == "__main__":
+    for path in write_all(sys.argv[1] if len(sys.argv) > 1 else "fixtures"):
+        print(path)
@@ -0,0 +1,174 @@
+'''
+Local stand-in for www.boadica.com.br, serving the synthetic pages from benchmarks.fixtures.
+It runs its own event loop in a background thread, so it can be used from blocking code (requests) and from asyncio code alike.
+Each response is delayed by latency seconds, to play the part of the network.
+Pages carry an ETag and a Last-Modified (unless validators=False) and conditional requests for a page that didn't change get a 304.
+Like the real site, every response also has a fresh timestamp outside of the scraped part, so the bytes differ on each download.
+change(ids) gives the products new content, as the stores updating their prices would.
+To play an overloaded site: past capacity requests at the same time it answers 429 (with a Retry-After of retry_after seconds),
+the latency grows with the requests in flight (slowdown seconds more for each one), and error_rate of the requests get a 503.
+live (a function of the product id) picks the ids that have a product, the others get the "not found" page.
+
+server = StubServer(rows=10, stores=200, latency=0.02)
+server.start()
+application.BASE_URL = server.url
+...
+server.stop()
+
+Run from the repository root to browse it: python -m benchmarks.stub_server
+'''
+import asyncio
+from collections import Counter
+from email.utils import formatdate, parsedate_to_datetime
+import random
+import threading
+import time
+from aiohttp import web
+from . import fixtures
+
+class StubServer:
+    def __init__(self, rows=10, stores=200, latency=0.02, validators=True, capacity=None, retry_after=1, slowdown=0.0, error_rate=0.0,
+                 live=None, host="127.0.0.1", port=0):
+        self.rows = rows
+        self.stores = stores
+        self.latency = latency
+        self.validators = validators
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.slowdown = slowdown
+        self.error_rate = error_rate
+        self.live = live
+        self.errors = Counter() # error responses sent, by status
+        self.active = 0 # requests in progress
+        self.peak = 0
+        self._random = random.Random(0)
+        self.host = host
+        self.port = port
+        self.url = None
+        self.hits = {"produto": 0, "loja": 0}
+        self.not_modified = 0 # 304 answers
+        self.sent = 0 # body bytes sent
+        self._pages = {} # generated pages, by path
+        self._versions = {} # product id -> (version, time it was changed), for the products changed since the start
+        self._started = int(time.time())
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def page(self, path):
+        '''The page served at path (generated on first use), None for unknown paths'''
+        if path not in self._pages:
+            if path.startswith("/produtos/p") and path[11:].isdigit():
+                pid = int(path[11:])
+                if self.live is not None and not self.live(pid):
+                    self._pages[path] = fixtures.missing_page(seed=pid)
+                    return self._pages[path]
+                version = self._versions.get(pid, (0, None))[0]
+                self._pages[path] = fixtures.product_page(self.rows, seed=pid * 1000 + version, stores=self.stores)
+            elif path.startswith("/loja/loja") and path[10:].isdigit():
+                self._pages[path] = fixtures.store_page(seed=int(path[10:]))
+            else:
+                return None
+        return self._pages[path]
+
+    def warm(self, ids):
+        '''Generates the pages for the given product ids and every store up front, so the server spends no time on it later'''
+        for pid in ids:
+            self.page(f"/produtos/p{pid}")
+        for store in range(self.stores):
+            self.page(f"/loja/loja{store}")
+
+    def change(self, ids):
+        '''Gives the given products new pages (the next request gets them, with new validators)'''
+        for pid in ids:
+            self._versions[pid] = (self._versions.get(pid, (0, None))[0] + 1, int(time.time()))
+            self._pages.pop(f"/produtos/p{pid}", None)
+
+    def _validators(self, path):
+        '''(ETag, Last-Modified) of the page at path'''
+        version, changed = 0, self._started
+        if path.startswith("/produtos/p"):
+            version, changed = self._versions.get(int(path[11:]), (0, self._started))
+        return f'"{path.rsplit("/", 1)[-1]}-{version}"', formatdate(changed, usegmt=True)
+
+    def _not_modified(self, request, etag, last_modified):
+        if "If-None-Match" in request.headers: # takes precedence over If-Modified-Since
+            return etag in [tag.strip() for tag in request.headers["If-None-Match"].split(",")]
+        if "If-Modified-Since" in request.headers:
+            try:
+                return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(request.headers["If-Modified-Since"])
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def _handle(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await self._respond(request)
+        finally:
+            self.active -= 1
+
+    async def _respond(self, request):
+        if self.capacity is not None and self.active > self.capacity:
+            self.errors[429] += 1
+            return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": str(self.retry_after)})
+        latency = self.latency + self.slowdown * (self.active - 1)
+        if latency:
+            await asyncio.sleep(latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors[503] += 1
+            return web.Response(status=503, text="<html><body>Serviço indisponível</body></html>", content_type="text/html")
+        page = self.page(request.path)
+        if page is None:
+            return web.Response(status=404, text="<html><body>Página não encontrada</body></html>", content_type="text/html")
+        self.hits["produto" if request.path.startswith("/produtos/") else "loja"] += 1
+        headers = {}
+        if self.validators:
+            etag, last_modified = self._validators(request.path)
+            headers = {"ETag": etag, "Last-Modified": last_modified}
+            if self._not_modified(request, etag, last_modified):
+                self.not_modified += 1
+                return web.Response(status=304, headers=headers)
+        page = page.replace("</body>", f"<!-- gerada em {time.time():.6f} --></body>", 1)
+        response = web.Response(text=page, content_type="text/html", charset="utf-8", headers=headers)
+        self.sent += len(response.body)
+        return response
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{self.port}"
+
+    def start(self):
+        '''Starts serving in a background thread, returns once self.url is ready'''
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+if __name__ == "__main__":
+    server = StubServer().start()
+    print(f"Serving at {server.url}/produtos/p161000 (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
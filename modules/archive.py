@@ -0,0 +1,198 @@
+'''
+Archive of the pages as they were downloaded, so the database can be rebuilt from them (after a change in what is
+scraped, or a bug that lost a field) without crawling the site again.
+Pages are zlib compressed and appended to segment files of up to segment_size bytes. An index file, appended along
+with them, says where each page is by url and download time. Reads go through a memory map of the segment.
+'''
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+from .fetcher import Fetched
+
+# Where a page is: fetched_at is a time.time(), length is the compressed size
+Entry = namedtuple("Entry", ["url", "fetched_at", "status", "segment", "offset", "length"])
+
+class PageArchive:
+    '''
+    Pages by url, in the given folder (created if needed):
+
+    archive = PageArchive(manager.file_path + "paginas")
+    archive.append(url, text)
+    text = archive.get(url) # the last one downloaded, or get(url, at=timestamp) for the last one before that
+    for entry, text in archive.scan(): # every page, in the order they were stored
+        ...
+    archive.close()
+
+    Everything appended is on disk after flush() (or close()), a crash before that loses the last pages only.
+    '''
+    _entry = struct.Struct("<dHIQIH") # fetched_at, status, segment, offset, length, url size, then the url
+
+    def __init__(self, folder, segment_size=64 * 1024 * 1024, level=3):
+        self.folder = folder
+        self.segment_size = segment_size
+        self.level = level
+        os.makedirs(folder, exist_ok=True)
+        self.index_path = os.path.join(folder, "index.bin")
+        self.urls = {} # url -> its entries, oldest first
+        self.entries = [] # every entry, in the order they were stored
+        self._maps = {} # segment -> mmap
+        complete = self._load()
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) > complete:
+            # an entry cut short by a crash, the ones appended from now on must not go after it
+            os.truncate(self.index_path, complete)
+        self._segment = max((entry.segment for entry in self.entries), default=0)
+        self._writer = open(self._segment_path(self._segment), "ab")
+        self._index = open(self.index_path, "ab")
+        # counters
+        self.appended = 0
+        self.raw_bytes = 0 # page bytes appended
+        self.stored_bytes = 0 # what they took compressed
+
+    def _segment_path(self, segment):
+        return os.path.join(self.folder, f"pages-{segment:06d}.z")
+
+    def _load(self):
+        '''Reads the index in, returns the size of its complete entries'''
+        if not os.path.exists(self.index_path):
+            return 0
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        position = complete = 0
+        sizes = {} # segment -> its size on disk
+        while position + self._entry.size <= len(data):
+            fetched_at, status, segment, offset, length, url_size = self._entry.unpack_from(data, position)
+            position += self._entry.size
+            if position + url_size > len(data): # cut short by a crash
+                break
+            url = data[position:position + url_size].decode("utf-8")
+            position += url_size
+            complete = position
+            if segment not in sizes:
+                path = self._segment_path(segment)
+                sizes[segment] = os.path.getsize(path) if os.path.exists(path) else 0
+            if offset + length <= sizes[segment]: # the index made it to disk before its page, after a crash
+                self._add(Entry(url, fetched_at, status, segment, offset, length))
+        return complete
+
+    def _add(self, entry):
+        self.entries.append(entry)
+        self.urls.setdefault(entry.url, []).append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def append(self, url, text, status=200, fetched_at=None):
+        '''Stores text as the page downloaded from url at fetched_at (now by default), returns its Entry'''
+        raw = text.encode("utf-8")
+        data = zlib.compress(raw, self.level)
+        offset = self._writer.tell()
+        if offset and offset + len(data) > self.segment_size:
+            self._writer.close()
+            self._segment += 1
+            self._writer = open(self._segment_path(self._segment), "ab")
+            offset = 0
+        self._writer.write(data)
+        entry = Entry(url, time.time() if fetched_at is None else fetched_at, status, self._segment, offset, len(data))
+        encoded = url.encode("utf-8")
+        self._index.write(self._entry.pack(entry.fetched_at, status, entry.segment, offset, len(data), len(encoded)) + encoded)
+        self._add(entry)
+        self.appended += 1
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(data)
+        return entry
+
+    def flush(self):
+        '''Segment first, so the index never points past what is written'''
+        self._writer.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        for page_map in self._maps.values():
+            page_map.close()
+        self._maps = {}
+        self._writer.close()
+        self._index.close()
+
+    def _map(self, segment, end):
+        '''Memory map of segment covering at least end bytes'''
+        page_map = self._maps.get(segment)
+        if page_map is None or len(page_map) < end:
+            if segment == self._segment:
+                self._writer.flush()
+            if page_map is not None: # the segment grew since it was mapped
+                page_map.close()
+            with open(self._segment_path(segment), "rb") as f:
+                page_map = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return page_map
+
+    def read(self, entry):
+        '''Text of the page at entry'''
+        page_map = self._map(entry.segment, entry.offset + entry.length)
+        return zlib.decompress(page_map[entry.offset:entry.offset + entry.length]).decode("utf-8")
+
+    def find(self, url, at=None):
+        '''Entry of the last page from url (downloaded at or before at, if given), None if there is none'''
+        entries = self.urls.get(url)
+        if not entries:
+            return None
+        if at is None:
+            return entries[-1]
+        for entry in reversed(entries):
+            if entry.fetched_at <= at:
+                return entry
+        return None
+
+    def get(self, url, at=None):
+        '''Text of the last page from url (see find()), None if there is none'''
+        entry = self.find(url, at)
+        return None if entry is None else self.read(entry)
+
+    def latest(self):
+        '''The last entry of each url, in the order they are in the segments (so reading them is sequential)'''
+        return sorted((entries[-1] for entries in self.urls.values()), key=lambda entry: (entry.segment, entry.offset))
+
+    def scan(self, entries=None):
+        '''(entry, text) for the given entries (every one by default), in the order given'''
+        for entry in self.entries if entries is None else entries:
+            yield entry, self.read(entry)
+
+class ArchiveFetcher:
+    '''
+    Stands in for the Fetcher (see modules/fetcher.py), serving the pages from an archive instead of the site:
+    the last page archived for each url, a 404 for the urls the archive doesn't have.
+    '''
+    def __init__(self, archive, at=None, metrics=None):
+        self.archive = archive
+        self.at = at # serve the pages as they were then
+        self.metrics = metrics # counts the pages and (compressed) bytes read, like the Fetcher does
+        self.requests = 0
+        self.bytes = 0
+        self.missing = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get(self, url):
+        return (await self.fetch(url)).text
+
+    async def fetch(self, url, headers=None):
+        self.requests += 1
+        entry = self.archive.find(url, self.at)
+        if entry is None:
+            self.missing += 1
+            return Fetched(404, "", None, None)
+        self.bytes += entry.length
+        if self.metrics is not None:
+            self.metrics.count("pages")
+            self.metrics.count("bytes", entry.length)
+        return Fetched(entry.status, self.archive.read(entry), None, None)
@@ -0,0 +1,110 @@
+'''
+Buffered inserts for continuous ingestion with formulite.
+Rows are kept in memory and written through DatabaseManager.insert_rows() (one executemany per table, in a single
+transaction) once flush_size of them are waiting, or flush_interval seconds after the last write, whichever comes first.
+'''
+import asyncio
+import time
+
+class BatchInserter:
+    '''
+    Use it through the manager, as an async context manager (the rows still waiting are written on the way out):
+
+    async with manager.batch_inserter(flush_size=500, flush_interval=1.0) as batch:
+        await batch.add("Loja", l_nick="...", l_name="...", ...)
+        await batch.add_many("Anuncio", rows)
+
+    Tables are written in the order they were first added to, so rows referenced by others can go in first.
+    flush_interval=None only writes when flush_size rows are waiting (and on flush() / the way out).
+    lock (an asyncio.Lock) must be held by anybody else writing through the same connection meanwhile.
+    A write that fails keeps its rows waiting, for the next flush. When it was the background one that failed,
+    the error is raised by the next add() / flush(), or on the way out (after a last try at writing everything).
+    '''
+    def __init__(self, manager, flush_size=500, flush_interval=1.0, lock=None, clock=time.monotonic):
+        self.manager = manager
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lock = lock or asyncio.Lock()
+        self.clock = clock
+        self._tables = {} # tablename -> values waiting
+        self._waiting = 0
+        self._flushed_at = clock()
+        self._ticker = None
+        self._failure = None # error of the last background flush, until somebody is told
+        # counters
+        self.rows = 0 # rows written
+        self.flushes = 0
+
+    async def __aenter__(self):
+        if self.flush_interval:
+            self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True) # it keeps its own failure in self._failure
+            self._ticker = None
+        failure, self._failure = self._failure, None
+        await self.flush()
+        if failure is not None: # the rows may be in by now, the failure must not go unnoticed still
+            raise failure
+
+    async def _tick(self):
+        # writes what is waiting once it waited flush_interval, even when nothing else is added
+        # it stops at the first failure, leaving it for the next add() / flush() to raise (which starts it again)
+        while True:
+            await asyncio.sleep(max(0.0, self._flushed_at + self.flush_interval - self.clock()))
+            if self.clock() - self._flushed_at >= self.flush_interval:
+                try:
+                    await self._write()
+                except Exception as error:
+                    self._failure = error
+                    return
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            if self._ticker is not None: # told now, the timed writes go on
+                self._ticker = asyncio.create_task(self._tick())
+            raise failure
+
+    def __len__(self):
+        return self._waiting
+
+    async def add(self, tablename, **row):
+        await self.add_many(tablename, [row])
+
+    async def add_many(self, tablename, rows):
+        '''rows as dicts of column -> value'''
+        self._raise_failure()
+        values = self._tables.setdefault(tablename, [])
+        for row in rows:
+            values.append(self.manager.row_values(tablename, row))
+        self._waiting += len(rows)
+        if self._waiting >= self.flush_size:
+            await self.flush()
+
+    async def flush(self):
+        '''Writes every row waiting, in a single transaction. If it fails, the rows are still waiting afterwards'''
+        self._raise_failure()
+        await self._write()
+
+    async def _write(self):
+        async with self.lock:
+            tables, waiting = self._tables, self._waiting
+            self._tables, self._waiting = {}, 0
+            self._flushed_at = self.clock()
+            if not waiting:
+                return
+            try:
+                await self.manager.insert_rows(tables)
+            except BaseException:
+                # back in front of the rows added meanwhile, in the same table order
+                for tablename, values in self._tables.items():
+                    tables.setdefault(tablename, []).extend(values)
+                self._tables = tables
+                self._waiting += waiting
+                raise
+            self.rows += waiting
+            self.flushes += 1
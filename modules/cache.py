@@ -0,0 +1,105 @@
+'''
+Small async cache with a time to live and LRU eviction.
+Concurrent get() calls for a key that is already being loaded wait for that load instead of starting their own.
+'''
+import asyncio
+import time
+from collections import OrderedDict
+
+class AsyncCache:
+    '''
+    Values by key, loaded on demand:
+
+    cache = AsyncCache(ttl=3600, max_size=1024)
+    info = await cache.get(nick, lambda: load_store(nick))
+
+    If check is given (an async function of the key), it is tried before load, and anything other than None it returns
+    is used as the value. That's the place for a cheaper source, like a database lookup.
+    A load that returns None (nothing found, a broken page) is only kept for negative_ttl seconds, not at all by default,
+    so the next get() tries again. A load that raises is never kept.
+    '''
+    def __init__(self, ttl=3600, max_size=1024, check=None, clock=time.monotonic, negative_ttl=0):
+        self.ttl = ttl # seconds an entry stays fresh, None keeps entries until they are evicted
+        self.negative_ttl = negative_ttl # the same, for None values
+        self.max_size = max_size
+        self._check = check
+        self._clock = clock
+        self._entries = OrderedDict() # key -> (value, time it was stored), least recently used first
+        self._in_flight = {} # key -> future of the load in progress
+        # counters
+        self.lookups = 0
+        self.hits = 0 # fresh entry found
+        self.coalesced = 0 # waited for a load somebody else started
+        self.checked = 0 # answered by check
+        self.loads = 0 # load had to run
+        self.stale = 0 # entries dropped for being older than ttl
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    async def get(self, key, load):
+        '''Returns the value for key, load is an async function with no arguments, only awaited when there's no fresh entry'''
+        self.lookups += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            ttl = self.negative_ttl if entry[0] is None else self.ttl
+            if ttl is None or self._clock() - entry[1] < ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._entries[key]
+            self.stale += 1
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending) # a cancelled waiter must not cancel the load for everybody else
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = None
+            if self._check is not None:
+                value = await self._check(key)
+            if value is not None:
+                self.checked += 1
+            else:
+                value = await load()
+                self.loads += 1
+        except BaseException as error:
+            future.set_exception(error)
+            future.exception() # the waiters (if any) get the error, nobody else has to retrieve it
+            raise
+        finally:
+            del self._in_flight[key]
+        self.put(key, value)
+        future.set_result(value)
+        return value
+
+    def put(self, key, value):
+        '''Stores value for key as a fresh entry (None only with a negative_ttl)'''
+        if value is None and not self.negative_ttl:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def hit_rate(self):
+        '''Share of the lookups that did not need a load'''
+        if not self.lookups:
+            return 0.0
+        return (self.hits + self.coalesced + self.checked) / self.lookups
+
+    def summary(self):
+        return (f"{self.lookups} lookups, {self.hit_rate():.1%} hit rate: {self.hits} cached, {self.coalesced} coalesced, "
+                f"{self.checked} checked, {self.loads} loaded ({self.stale} stale), {self.evictions} evicted")
@@ -0,0 +1,111 @@
+'''
+Change detection for pages that were scraped before.
+For each url the Pagina table keeps the validators the server sent (ETag / Last-Modified) and a hash of the part of the page
+that gets scraped, so a re-crawl can ask for the page conditionally (an unchanged page comes back as an empty 304),
+and when the server sends it anyway, tell from the hash that there's nothing new to parse or write.
+'''
+import hashlib
+from collections import namedtuple
+from .mySoup import seed
+
+# What is kept for each url
+Known = namedtuple("Known", ["etag", "modified", "digest"])
+
+class ChangeTracker:
+    '''
+    Validators and content hashes by url, call setup() once before using it:
+
+    tracker = ChangeTracker(manager)
+    await tracker.setup()
+    known = await tracker.get(url)
+    fetched = await fetcher.fetch(url, tracker.headers(known))
+    if tracker.unchanged(known, fetched):
+        ... # skip it
+    tracker.remember(url, fetched) # once the page is written
+    await tracker.flush()
+
+    remember() only keeps the values in memory, flush() writes them all in one transaction (or in the ambient one).
+    lock (an asyncio.Lock) is only needed when somebody writes through the same connection outside of manager.transaction().
+    '''
+    table = "Pagina"
+
+    def __init__(self, manager, below_tag=None, below_class="col-md-8", lock=None):
+        self.manager = manager
+        self.below_tag = below_tag # the part of the page that is hashed
+        self.below_class = below_class
+        self.lock = lock
+        self._pending = {} # url -> Known, waiting for flush()
+
+    @staticmethod
+    def set_entity(manager):
+        '''Sets up the Pagina entity, to be called along with the other setup operations (before create_tables())'''
+        manager.set_entity(ChangeTracker.table, url="TEXT", etag="TEXT", modified="TEXT", digest="TEXT")
+        manager.set_primary_key(ChangeTracker.table, "url")
+
+    async def setup(self):
+        '''Creates the Pagina table if the database doesn't have it yet (databases made before change detection existed)'''
+        if self.table not in self.manager.entities:
+            ChangeTracker.set_entity(self.manager)
+            await self.manager.add_table(self.manager.entities[self.table])
+
+    async def get(self, url):
+        '''What is known about url (a Known), None for urls never seen before'''
+        if url in self._pending:
+            return self._pending[url]
+        cursor = await self.manager.conn.execute(f"SELECT etag, modified, digest FROM {self.table} WHERE url = ?", (url,))
+        row = await cursor.fetchone()
+        return None if row is None else Known(*row)
+
+    @staticmethod
+    def headers(known):
+        '''Conditional request headers for a url, given what get() returned for it'''
+        headers = {}
+        if known is not None:
+            if known.etag:
+                headers["If-None-Match"] = known.etag
+            if known.modified:
+                headers["If-Modified-Since"] = known.modified
+        return headers
+
+    def digest(self, text):
+        '''Hash of the scraped part of the page (the whole page if it doesn't have one)'''
+        region = seed.find_region(text, below_tag=self.below_tag, below_class=self.below_class)
+        if region is not None:
+            text = text[region[0]:region[1]]
+        return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+    def unchanged(self, known, fetched, digest=None):
+        '''Whether fetched (a fetcher.Fetched) is the same page as known: a 304, or a page whose scraped part hashes the same'''
+        if known is None:
+            return False
+        if fetched.status == 304:
+            return True
+        if digest is None:
+            digest = self.digest(fetched.text)
+        return digest == known.digest
+
+    def remember(self, url, fetched, digest=None):
+        '''Keeps the validators and the hash of fetched for url, after what was scraped from it is safely written'''
+        old = self._pending.get(url)
+        if fetched.status == 304: # the server may leave the validators out of a 304, the page stays as it was
+            if old is None:
+                return
+            digest = old.digest
+        elif digest is None:
+            digest = self.digest(fetched.text)
+        self._pending[url] = Known(fetched.etag, fetched.last_modified, digest)
+
+    async def flush(self):
+        '''Writes what remember() kept'''
+        if not self._pending:
+            return
+        rows = [(url, *known) for url, known in self._pending.items()]
+        if self.lock is not None:
+            await self.lock.acquire()
+        try:
+            async with self.manager.transaction():
+                await self.manager.conn.executemany(f"INSERT OR REPLACE INTO {self.table} (url, etag, modified, digest) VALUES (?, ?, ?, ?)", rows)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+        self._pending = {}
@@ -1,37 +1,57 @@
 '''
 Helper classes that should be used to correctly form the statement of a SELECT query.
 
-They MUST redefine the __str__(self): method in order to provide the correct statement
+They MUST define query(self), returning the clause with ? placeholders and the values that go in them, as (sql, params).
+__str__(self) gives the clause with the values written in, for SQL put together by hand.
 Obs.: the string can also be passed into the query directly,
 and it should be enough for simple situations
 
 Also, these objects must be passed in the correct order. ## TODO: check the order
 '''
 
+def literal(value):
+    '''value written as an SQL literal, strings quoted (and their quotes doubled)'''
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
 class Where:
     '''WHERE clause from SQL represented as an object'''
     def __init__(self, compose=False, separator=" AND ", **kargs):
         self.sep = separator
         self.condstr = ""
+        self.params = []
         if compose:
-            cond_list = [wobj.condstr for wobj in kargs.values()]
+            cond_list = []
+            for wobj in kargs.values():
+                cond_list.append(wobj.condstr)
+                self.params += wobj.params
             self.condstr = separator.join(cond_list)
         else:
             pairs = []
             for key, value in kargs.items():
-                if isinstance(value, str):
-                    pairs.append(f"{key}=\'{value}\'")
-                else:
-                    pairs.append(f"{key}={value}")
+                pairs.append(f"{key} IS ?" if value is None else f"{key}=?")
+                self.params.append(value)
             self.condstr = separator.join(pairs)
 
+    def query(self):
+        return f"WHERE {self.condstr}", self.params
+
     def __str__(self):
-        return f"WHERE {self.condstr}"
+        values = iter(self.params)
+        return "WHERE " + "".join(literal(next(values)) if piece == "?" else piece for piece in self.condstr)
 
 class Limit:
     '''LIMIT clause from SQL represented as an object'''
     def __init__(self, amount):
         self.amount = amount
 
+    def query(self):
+        return "LIMIT ?", [self.amount]
+
     def __str__(self):
         return f"LIMIT {self.amount}"
@@ -2,7 +2,12 @@
 Main formulite class, used to interact with the database
 '''
 from .entity import Entity
+from .batchinsert import BatchInserter
+import asyncio
+import contextvars
 import os
+from collections import namedtuple
+from contextlib import aclosing, asynccontextmanager
 from .formuliteutils import utils as f_utils
 
 class DatabaseManager:
@@ -15,11 +20,99 @@ class DatabaseManager:
         self._typeflag = None
         self.file_path = filepath
         self.entities = {}
+        self._ambient = contextvars.ContextVar(f"formulite_transaction_{id(self)}", default=None) # (transaction, nesting) of the task
+        self._open = None # the transaction in progress on the connection, if any
+        self._lock = asyncio.Lock() # one task's transaction at a time on the connection
+        self._statements = {} # (tablename, operation, shape) -> SQL, see statement()
+        self._classes = {} # tablename -> (entity, revision, class), see entity_class()
+        self._views = {} # (tablename, column names) -> named tuple class, see row_view()
 
     async def close(self):
         '''should be called at the end of execution'''
         await self.conn.close()
 
+    ### TRANSACTIONS ###
+    # Every write happens in a transaction. Outside of transaction() each method opens its own and commits right away,
+    # inside it they join the ambient one, which commits (or rolls back) once at the end
+
+    def _depth(self):
+        # nesting of the current task in the transaction in progress, 0 outside of it (a task started inside a transaction
+        # carries its mark along, it only counts while that transaction lasts)
+        ambient = self._ambient.get()
+        return ambient[1] if ambient is not None and ambient[0] is self._open else 0
+
+    def in_transaction(self):
+        '''True when the current task is inside transaction()'''
+        return self._depth() > 0
+
+    @asynccontextmanager
+    async def transaction(self, immediate=False):
+        '''
+        async with manager.transaction():
+            ... # inserts, updates, anything: a single commit at the end, a rollback of all of it if something raises
+        A transaction() inside another is a savepoint: an exception rolls back what was done inside it only (and goes on up).
+        The ambient transaction belongs to the task that opened it (and to the tasks it starts), other tasks wait for it
+        to end before writing. immediate takes the database write lock right at the start (BEGIN IMMEDIATE), for work
+        that reads then writes and must not interleave with other processes. The entity files are not transactional.
+        '''
+        depth = self._depth()
+        if depth:
+            name = f"formulite_{depth}"
+            await self.conn.execute(f"SAVEPOINT {name}")
+            token = self._ambient.set((self._open, depth + 1))
+            try:
+                yield self
+            except BaseException:
+                await self.conn.execute(f"ROLLBACK TO {name}")
+                await self.conn.execute(f"RELEASE {name}")
+                raise
+            else:
+                await self.conn.execute(f"RELEASE {name}")
+            finally:
+                self._ambient.reset(token)
+            return
+        async with self._lock:
+            await self.conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self._open = object()
+            token = self._ambient.set((self._open, 1))
+            try:
+                yield self
+            except BaseException:
+                await self.conn.rollback()
+                raise
+            else:
+                await self.conn.commit()
+            finally:
+                self._ambient.reset(token)
+                self._open = None
+
+    @asynccontextmanager
+    async def _joined(self):
+        '''The ambient transaction if there is one, a transaction of its own otherwise (for the single statement writes)'''
+        if self._depth():
+            yield self
+        else:
+            async with self.transaction():
+                yield self
+
+    ### STATEMENTS ###
+    # The SQL generated by the manager only has ? placeholders for the values, so every statement of the same shape
+    # is the same string: it is put together once per entity, operation and shape (the columns it goes by) and kept,
+    # and SQLite parses and plans it once too (its own statement cache goes by the string)
+
+    def statement(self, tablename, operation, shape=(), build=None):
+        '''The SQL for operation on tablename with the given shape, build() makes it the first time it is asked for'''
+        key = (tablename, operation, shape)
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = self._statements[key] = build()
+        return sql
+
+    def forget_statements(self, tablename):
+        '''Drops the statements kept for tablename, after its columns changed'''
+        for key in [key for key in self._statements if key[0] == tablename]:
+            del self._statements[key]
+
     ### SETUP OPERATIONS ###
     # these operations should initialize the ORM
     # They must be performed BEFORE any tables are created
@@ -67,17 +160,17 @@ class DatabaseManager:
         sends in the queries for creating all the tables predicted in the setup operations
         this operation should only be called once. To add new tables after the database is created, see add_table()
         '''
-        for entity in self.entities.values():
-            entity.writedown(self.file_path)
-            #print(entity.create_table_query(None, True))
-            await self.conn.execute(entity.create_table_query())
-        await self.conn.commit()
+        async with self._joined():
+            for entity in self.entities.values():
+                entity.writedown(self.file_path)
+                #print(entity.create_table_query(None, True))
+                await self.conn.execute(entity.create_table_query())
 
     async def add_table(self, entity):
         '''Adds a single table to the database, entity must be generated / set separately'''
         entity.writedown(self.file_path)
-        await self.conn.execute(entity.create_table_query())
-        await self.conn.commit()
+        async with self._joined():
+            await self.conn.execute(entity.create_table_query())
 
     ### LOAD ###
     # The manager should be able to work with existing databases, after their creation.
@@ -93,45 +186,50 @@ class DatabaseManager:
             for table, in tablenames:
                 e_class = f_utils.load_module(table.lower(), self.file_path + Entity.get_filename(table), table)
                 self.entities[table] = Entity(table, e_class._attribute_types)
+                # the keys too, add_column() can't write the class file again without them
+                self.entities[table].primary_key = list(e_class._primary_key)
+                self.entities[table].foreign_key = dict(getattr(e_class, "_foreign_key", {}))
+                self._classes[table] = (self.entities[table], self.entities[table].revision, e_class)
 
     ### BUILD ###
     # The object constructor will not be available by default, this would require a complex dynamic import
     # so build functions are provided to work as a factory for instances / table rows, which can later be included to the DB
 
+    def entity_class(self, tablename):
+        '''
+        The class generated for the table, imported from its file the first time it is asked for.
+        It is imported again once the file is rewritten (add_column / add_attribute) or the entity is set again
+        '''
+        entity = self.entities.get(tablename)
+        revision = entity.revision if entity is not None else None
+        cached = self._classes.get(tablename)
+        if cached is not None and cached[0] is entity and cached[1] == revision:
+            return cached[2]
+        e_class = f_utils.load_module(tablename.lower(), self.file_path + Entity.get_filename(tablename), tablename)
+        self._classes[tablename] = (entity, revision, e_class)
+        return e_class
+
+    def forget_class(self, tablename):
+        '''Drops the class kept for the table, the next build() imports the file again'''
+        self._classes.pop(tablename, None)
+
     def build(self, tablename, **kargs):
         '''Calls the appropriate constructor for the corresponding table.'''
-        e_class = f_utils.load_module(tablename.lower(), self.file_path + Entity.get_filename(tablename), tablename)
-        return e_class(**kargs)
+        return self.entity_class(tablename)(**kargs)
+
+    def build_many(self, tablename, rows):
+        '''Same as build(), for a list of dicts'''
+        e_class = self.entity_class(tablename)
+        return [e_class(**row) for row in rows]
 
     ### INSERT ###
 
     async def insert(self, Obj):
-        '''Insert instance into database.'''
+        '''Insert instance into database. An object whose primary key is already in the database is skipped'''
         c_name = Obj.__class__.__name__
-
-        # make sure the object has not been previously inserted
-        pk_dict = {}
-        for pk in Obj.__class__._primary_key:
-            pk_dict[pk] = getattr(Obj, pk)
-        if await self.exists(c_name, **pk_dict):
-            return
-
-        vals = []
-        for key in self.entities[c_name].args_dict.keys():
-            vals.append( (getattr(Obj, key)) )
-        vals_concat = ""
-        for value in vals:
-            if isinstance(value, str):
-                vals_concat += f"\"{value}\""
-            else:
-                vals_concat += str(value)
-            if value != vals[-1]:
-                vals_concat += ", "
-
-        keyjoin = ", ".join( self.entities[c_name].args_dict.keys() )
-        sql = f"INSERT INTO {c_name} ({keyjoin}) VALUES ({vals_concat})"
-        await self.conn.execute(sql)
-        await self.conn.commit()
+        vals = tuple(getattr(Obj, key) for key in self.entities[c_name].args_dict.keys())
+        async with self._joined():
+            await self.conn.execute(self.insert_query(c_name), vals)
 
     async def build_and_insert(self, tablename, **kargs):
         '''Insert instance into database right after instantiation, then returns it'''
@@ -139,26 +237,64 @@ class DatabaseManager:
         await self.insert(obj)
         return obj
 
+    def insert_query(self, tablename):
+        '''INSERT statement for a whole row of the table, with ? placeholders. Rows whose primary key is taken are skipped'''
+        keys = self.entities[tablename].args_dict.keys()
+        return self.statement(tablename, "insert", build=lambda: f"INSERT OR IGNORE INTO {tablename} ({', '.join(keys)}) VALUES ({', '.join('?' * len(keys))})")
+
+    def row_values(self, tablename, row):
+        '''Values of a row (dict) in the order of the table columns'''
+        return tuple(row[key] for key in self.entities[tablename].args_dict.keys())
+
+    async def insert_rows(self, tables):
+        '''
+        Inserts {tablename: [values, ...]} (values as given by row_values()), a single executemany per table,
+        in the order the tables are given, all in a single transaction (rolled back if any of it fails)
+        '''
+        async with self.transaction():
+            for tablename, values in tables.items():
+                if values:
+                    await self.conn.executemany(self.insert_query(tablename), values)
+
+    async def insert_many(self, objs):
+        '''
+        Insert several instances into the database at once, grouped by table (in the order the tables first show up).
+        Same as calling insert() for each (the objects whose primary key is already in the database are skipped),
+        but with an executemany per table, in a single transaction
+        '''
+        tables = {}
+        for obj in objs:
+            c_name = obj.__class__.__name__
+            tables.setdefault(c_name, []).append(tuple(getattr(obj, key) for key in self.entities[c_name].args_dict.keys()))
+        await self.insert_rows(tables)
+
+    async def build_and_insert_many(self, tablename, rows):
+        '''build_and_insert() for a list of dicts, inserted as insert_many() does, then returns the objects'''
+        objs = self.build_many(tablename, rows)
+        await self.insert_rows({tablename: [self.row_values(tablename, row) for row in rows]})
+        return objs
+
+    def batch_inserter(self, flush_size=500, flush_interval=1.0, lock=None):
+        '''A BatchInserter over this manager, see batchinsert.py'''
+        return BatchInserter(self, flush_size, flush_interval, lock)
+
     ### UPDATE ###
 
     async def update(self, Obj):
         '''Update a database instance (single row)'''
         c_name = Obj.__class__.__name__
+        primary_key = Obj.__class__._primary_key
+        attributes = [attribute for attribute in Obj.__class__._attribute_types.keys() if attribute not in primary_key]
 
-        pk_list = []
-        for pk in Obj.__class__._primary_key:
-            pk_list.append(f"{pk}={getattr(Obj, pk)}")
-        cond_string = " AND ".join(pk_list)        
+        def build():
+            set_string = ", ".join(f"{attribute}=?" for attribute in attributes)
+            cond_string = " AND ".join(f"{pk}=?" for pk in primary_key)
+            return f"UPDATE {c_name} SET {set_string} WHERE {cond_string}"
 
-        up_list = []
-        for attribute in Obj.__class__._attribute_types.keys():
-            if attribute not in Obj.__class__._primary_key:
-                up_list.append(f"{attribute}={getattr(Obj, attribute)}")
-        set_string = ", ".join(up_list)
-
-        sql = f"UPDATE {c_name} SET {set_string} WHERE {cond_string}"
-        await self.conn.execute(sql)
-        await self.conn.commit()
+        sql = self.statement(c_name, "update", build=build)
+        params = [getattr(Obj, attribute) for attribute in attributes] + [getattr(Obj, pk) for pk in primary_key]
+        async with self._joined():
+            await self.conn.execute(sql, params)
 
     ### SELECT ###
 
@@ -167,16 +303,52 @@ class DatabaseManager:
         check if an object already exists in the database
         only use this if you dont need the returned object further in your application
         '''
-        obj_count = await self.count(tablename, f_utils.where(**kargs))
-        return obj_count > 0
+        shape = tuple((key, value is None) for key, value in kargs.items())
+        sql = self.statement(tablename, "exists", shape, lambda: f"SELECT 1 FROM {tablename} {f_utils.where(**kargs).query()[0]} LIMIT 1")
+        rows = await self.conn.execute_fetchall(sql, list(kargs.values()))
+        return len(rows) > 0
 
-    async def select(self, tables_obj, cols_obj="*", *args):
-        '''Use select_from()'''
+    def select_query(self, tables_obj, cols_obj="*", *args):
+        '''The SELECT statement and its params, as select() runs it'''
         # I should perform some kind of type checking here, and throw an error if needed
+        # clauses (see clauses.py) go in with placeholders, plain strings as they are
         sql = f"SELECT {str(cols_obj)} FROM {str(tables_obj)}"
+        params = []
         for arg in args:
-            sql += f" {str(arg)}" # whitespace is relevant here
-        return await self.conn.execute_fetchall(sql)
+            if hasattr(arg, "query"):
+                clause, values = arg.query()
+                sql += f" {clause}" # whitespace is relevant here
+                params += values
+            else:
+                sql += f" {str(arg)}"
+        return sql, params
+
+    async def select(self, tables_obj, cols_obj="*", *args):
+        '''Use select_from()'''
+        return await self.conn.execute_fetchall(*self.select_query(tables_obj, cols_obj, *args))
+
+    async def _batches(self, tables_obj, cols_obj, args, batch_size):
+        # (column names, rows) for every fetchmany() of the query, the cursor is closed however the loop ends
+        cursor = await self.conn.execute(*self.select_query(tables_obj, cols_obj, *args))
+        try:
+            names = tuple(column[0] for column in cursor.description)
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield names, rows
+        finally:
+            await cursor.close()
+
+    async def iter_select(self, tables_obj, cols_obj="*", *args, batch_size=500):
+        '''
+        Same as select(), but an async generator: the rows (tuples) come from the cursor batch_size at a time,
+        so only one batch is in memory however big the result is
+        '''
+        async with aclosing(self._batches(tables_obj, cols_obj, args, batch_size)) as batches:
+            async for _, rows in batches:
+                for row in rows:
+                    yield row
 
     async def select_from(self, tables_obj, cols_obj="*", *args):
         '''
@@ -186,12 +358,50 @@ class DatabaseManager:
         tablename = str(tables_obj)
         rows = await self.select(tables_obj, cols_obj, *args)
 
-        result = []
-        for row in rows:
-            arg_dict = dict( zip(self.entities[tablename].args_dict.keys(), row) )
-            result.append(self.build(tablename, **arg_dict))
+        e_class = self.entity_class(tablename)
+        keys = list(self.entities[tablename].args_dict.keys())
+        return [e_class(**dict(zip(keys, row))) for row in rows]
 
-        return result
+    async def iter_select_from(self, tables_obj, cols_obj="*", *args, batch_size=500, kind="object"):
+        '''
+        Streaming select_from(), for results too big to hold in a list:
+
+        async for anuncio in manager.iter_select_from("Anuncio", "*", f_utils.where(l_nick="..."), kind="view"):
+            ...
+
+        kind is what comes out for each row:
+          "object": the entity object, as select_from() gives (cols_obj must be "*")
+          "view":   a named tuple of the selected columns, read the same way (anuncio.prod_price) but much lighter
+          "tuple":  the row as sqlite gives it
+        Rows are fetched batch_size at a time, and built only as they are asked for.
+        Leaving the loop early keeps the cursor open until the generator is collected, wrap it in contextlib.aclosing() to close it right away.
+        '''
+        if kind not in ("object", "view", "tuple"):
+            raise ValueError(f"kind must be 'object', 'view' or 'tuple', not {kind!r}")
+        tablename = str(tables_obj)
+        if kind == "object":
+            e_class = self.entity_class(tablename)
+            keys = list(self.entities[tablename].args_dict.keys())
+        async with aclosing(self._batches(tables_obj, cols_obj, args, batch_size)) as batches:
+            async for names, rows in batches:
+                if kind == "tuple":
+                    for row in rows:
+                        yield row
+                elif kind == "object":
+                    for row in rows:
+                        yield e_class(**dict(zip(keys, row)))
+                else:
+                    view = self.row_view(tablename, names)
+                    for row in rows:
+                        yield view._make(row)
+
+    def row_view(self, tablename, names):
+        '''Named tuple class for rows of the table with the given columns, kept per manager'''
+        view = self._views.get((tablename, names))
+        if view is None:
+            typename = f"{tablename}Row" if tablename.isidentifier() else "Row" # joins have no single name
+            view = self._views[(tablename, names)] = namedtuple(typename, names, rename=True) # count(*) and the like become _0
+        return view
 
     async def select_all_from(self, tables_obj, *args):
         '''Helper'''
@@ -207,8 +417,10 @@ class DatabaseManager:
     async def drop_table(self, tablename):
         '''Delete a table from the database'''
         sql = f"DROP TABLE {tablename}"
-        await self.conn.execute(sql)
-        await self.conn.commit()
+        async with self._joined():
+            await self.conn.execute(sql)
+        self.forget_statements(tablename)
+        self.forget_class(tablename)
 
     async def drop_tables(self, *tables):
         '''Helper to delete multiple tables'''
@@ -228,8 +440,9 @@ class DatabaseManager:
         '''Adds a new column to a table.'''
         self.entities[tablename].add_attribute(col_name, col_type, self.file_path)
         sql = f"ALTER TABLE {tablename} ADD {col_name} {col_type}"
-        await self.conn.execute(sql)
-        await self.conn.commit()
+        async with self._joined():
+            await self.conn.execute(sql)
+        self.forget_statements(tablename)
 
     async def add_columns(self, tablename, **columns):
         '''Adds multiple columns to a table, in a more pythonic syntax'''
@@ -243,6 +456,7 @@ class DatabaseManager:
 
         # only now drop the column in the database
         sql = f"ALTER TABLE {tablename} DROP COLUMN {column}"
-        await self.conn.execute(sql)
-        await self.conn.commit()
+        async with self._joined():
+            await self.conn.execute(sql)
+        self.forget_statements(tablename)
         
\ No newline at end of file
@@ -0,0 +1,245 @@
+'''
+Sparse id discovery.
+Most product ids lead to no product at all, IdMap remembers which ids were probed and which of them were live,
+two bits per id in a file next to the database, so later passes don't download the dead ones again.
+Discovery decides which ids of a range are worth probing: the stride between probes grows while the probes keep
+coming back dead, and goes back to 1 around a live hit, probing the ids skipped next to it.
+The ids the stride skipped are remembered in the map too, sweep() hands them out later to be probed.
+'''
+import os
+import struct
+
+class IdMap:
+    '''
+    Probed / live bits for the ids from base on, growing as needed:
+
+    ids = IdMap.load(manager.file_path + "ids.bin", base=161000)
+    ids.mark(161234, live=False)
+    ids.dead(161234) # True
+    ids.save()
+
+    The live bit of an id not probed yet means it was skipped (see skip()), so it still has to be probed some time.
+    '''
+    magic = b"IDMAP1"
+    _header = struct.Struct("<6sqq") # magic, base, ids covered
+
+    def __init__(self, base=0, path=None):
+        self.base = base
+        self.path = path
+        self._probed = bytearray()
+        self._live = bytearray()
+
+    @staticmethod
+    def load(path, base=0):
+        '''The map saved at path, an empty one (to be saved there) if there is no file yet'''
+        ids = IdMap(base, path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, ids.base, count = IdMap._header.unpack_from(data)
+            if magic != IdMap.magic:
+                raise ValueError(f"{path} is not an id map")
+            size = (count + 7) // 8
+            start = IdMap._header.size
+            ids._probed = bytearray(data[start:start + size])
+            ids._live = bytearray(data[start + size:start + 2 * size])
+        return ids
+
+    def save(self, path=None):
+        '''Writes the map (to a temporary file first, a crash never leaves half a map behind)'''
+        path = path or self.path
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(self._header.pack(self.magic, self.base, len(self._probed) * 8))
+            f.write(self._probed)
+            f.write(self._live)
+        os.replace(temporary, path)
+
+    def _bit(self, pid):
+        '''(byte, mask) of pid, None for ids below base'''
+        offset = pid - self.base
+        if offset < 0:
+            return None
+        return offset >> 3, 1 << (offset & 7)
+
+    def _room(self, pid):
+        '''(byte, mask) of pid, growing the map to hold it'''
+        bit = self._bit(pid)
+        if bit is None:
+            raise ValueError(f"id {pid} is below the map base {self.base}")
+        byte, mask = bit
+        if byte >= len(self._probed):
+            grow = max(byte + 1 - len(self._probed), len(self._probed)) # doubles, so marking a range is linear
+            self._probed.extend(bytes(grow))
+            self._live.extend(bytes(grow))
+        return byte, mask
+
+    def mark(self, pid, live):
+        byte, mask = self._room(pid)
+        self._probed[byte] |= mask
+        if live:
+            self._live[byte] |= mask
+        else:
+            self._live[byte] &= ~mask
+
+    def skip(self, pid):
+        '''Remembers that pid was passed over without a probe (nothing changes for an id probed already)'''
+        byte, mask = self._room(pid)
+        if not self._probed[byte] & mask:
+            self._live[byte] |= mask
+
+    def probed(self, pid):
+        bit = self._bit(pid)
+        return bit is not None and bit[0] < len(self._probed) and bool(self._probed[bit[0]] & bit[1])
+
+    def live(self, pid):
+        bit = self._bit(pid)
+        return bit is not None and bit[0] < len(self._live) and bool(self._live[bit[0]] & self._probed[bit[0]] & bit[1])
+
+    def skipped(self, pid):
+        '''Passed over by the stride, and not probed since'''
+        bit = self._bit(pid)
+        return bit is not None and bit[0] < len(self._live) and bool(self._live[bit[0]] & ~self._probed[bit[0]] & bit[1])
+
+    def skipped_ids(self, limit=None):
+        '''The skipped ids, lowest first, up to limit of them'''
+        found = []
+        for byte, (probed, live) in enumerate(zip(self._probed, self._live)):
+            waiting = live & ~probed
+            while waiting:
+                if limit is not None and len(found) >= limit:
+                    return found
+                low = waiting & -waiting
+                found.append(self.base + byte * 8 + low.bit_length() - 1)
+                waiting ^= low
+        return found
+
+    def dead(self, pid):
+        '''Probed and found with no product'''
+        return self.probed(pid) and not self.live(pid)
+
+    def counts(self, start, end):
+        '''(probed, live) among the ids in [start, end)'''
+        probed = live = 0
+        for pid in range(max(start, self.base), end):
+            byte, mask = self._bit(pid)
+            if byte >= len(self._probed):
+                break
+            if self._probed[byte] & mask:
+                probed += 1
+                live += bool(self._live[byte] & mask)
+        return probed, live
+
+    def end(self):
+        '''One past the last id the map has room for'''
+        return self.base + len(self._probed) * 8
+
+    def report(self, start=None, end=None, bucket=1000):
+        '''One line per bucket of ids: how many were probed, and the live / dead density among them'''
+        start = self.base if start is None else start
+        end = self.end() if end is None else end
+        lines = []
+        for low in range(start - (start - self.base) % bucket, end, bucket):
+            probed, live = self.counts(low, low + bucket)
+            if not probed:
+                continue
+            lines.append(f"{low}-{low + bucket - 1}: {probed} probed ({probed / bucket:.0%}), "
+                         f"{live} live ({live / probed:.0%}), {probed - live} dead ({(probed - live) / probed:.0%})")
+        return lines
+
+class Discovery:
+    '''
+    Picks the ids to probe as the ids of a range go by, from what the probes found so far:
+
+    discovery = Discovery(IdMap.load(path, base=161000))
+    for pid in block:
+        if discovery.plan(pid):
+            ... # probe it
+    ... # as the results come in
+    discovery.record(pid, live) # live None when the probe told nothing (a failure, an unchanged page)
+    pid = discovery.dense() # ids next to live hits, probe these before going on with the range
+
+    Ids already known dead are never probed. After dead_run dead probes in a row the stride doubles (up to max_stride),
+    and a live hit brings it back to 1 and queues the ids it skipped around the hit.
+    A run of live ids shorter than max_stride can fall between two probes: the bigger it is, the fewer requests,
+    and the more of the small runs are left for later. The ids the stride skipped are marked in the map (IdMap.skip()),
+    sweep() gives them back to be probed (scrap_some(ids=...) with this discovery, see application.scrap_new()).
+    '''
+    def __init__(self, ids, dead_run=4, max_stride=8):
+        self.ids = ids
+        self.dead_run = dead_run
+        self.max_stride = max_stride
+        self.stride = 1
+        self._gap = 0 # ids still to skip before the next probe
+        self._dead_in_row = 0
+        self._pending = {} # probes without a result yet -> the stride they were planned with
+        self._dense = [] # ids around live hits, waiting for a probe
+        # counters
+        self.planned = 0
+        self.skipped_dead = 0 # known dead, not probed again
+        self.skipped = 0 # left out by the stride
+        self.swept = 0 # skipped ids handed out again by sweep()
+        self.densified = 0
+        self.live = 0
+        self.dead = 0
+
+    def plan(self, pid):
+        '''Whether pid, the next id of the range, should be probed'''
+        if pid in self._pending or self.ids.probed(pid): # being probed already (near a hit), or done before
+            self.skipped_dead += self.ids.dead(pid)
+            return False
+        if self._gap > 0:
+            self._gap -= 1
+            self.skipped += 1
+            self.ids.skip(pid)
+            return False
+        self._gap = self.stride - 1
+        self._pending[pid] = self.stride
+        self.planned += 1
+        return True
+
+    def dense(self):
+        '''Next id near a live hit to probe, None if there is none'''
+        while self._dense:
+            pid = self._dense.pop()
+            if pid not in self._pending and not self.ids.probed(pid):
+                self._pending[pid] = 2 # a hit here queues its neighbours too, following the live ids as far as they go
+                self.planned += 1
+                return pid
+        return None
+
+    def sweep(self, limit=None):
+        '''Ids the stride skipped (in this run or before), lowest first, up to limit of them'''
+        ids = [pid for pid in self.ids.skipped_ids(None if limit is None else limit + len(self._pending)) if pid not in self._pending][:limit]
+        self.swept += len(ids)
+        return ids
+
+    def waiting(self):
+        '''Whether probes are still out, their results may queue more dense() ids'''
+        return bool(self._pending)
+
+    def record(self, pid, live):
+        stride = self._pending.pop(pid, 1)
+        if live is None:
+            return
+        self.ids.mark(pid, live)
+        if live:
+            self.live += 1
+            self._dead_in_row = 0
+            self.stride = 1
+            self._gap = 0
+            near = [other for other in range(pid - stride + 1, pid + stride)
+                    if other != pid and other >= self.ids.base and other not in self._pending and not self.ids.probed(other)]
+            near.sort(key=lambda other: -abs(other - pid)) # dense() pops from the end, closest to the hit first
+            self.densified += len(near)
+            self._dense.extend(near)
+        else:
+            self.dead += 1
+            self._dead_in_row += 1
+            if self._dead_in_row >= self.dead_run:
+                self.stride = min(self.max_stride, self.stride * 2)
+                self._dead_in_row = 0
+
+    def summary(self):
+        return (f"{self.planned} probed ({self.live} live, {self.dead} dead), {self.skipped_dead} known dead skipped, "
+                f"{self.skipped} skipped by the stride (now {self.stride}), {self.swept} swept, {self.densified} queued around live hits")
@@ -20,6 +20,7 @@ class Entity:
         self.args_dict = args_dict
         self.primary_key = []
         self.foreign_key = {}
+        self.revision = 0 # bumped every time the class file is written, so loaded classes can tell they're stale
     
     # WRITE to file operation is split into several small methods (abstraction)
     # use the writedown() method in the end.
@@ -76,6 +77,7 @@ class Entity:
             if self.foreign_key:
                 self._write_FK(obj_file)
             self._write_constructor(obj_file)
+        self.revision += 1
 
     def joined_primary_key(self, pk=None):
         '''helper to join the primary key in case of composite key'''
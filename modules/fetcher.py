@@ -0,0 +1,120 @@
+'''
+Async page fetching for the scraper.
+A single aiohttp session keeps its connections alive between requests (so each host is only connected to once per pooled connection),
+and the connector limits how many requests are in flight at the same time.
+With limiters, the requests to each host also go through an AdaptiveLimiter (modules/throttle.py), and the ones answered
+with a 429, a 5xx or a timeout are tried again after its backoff.
+With an archive (a PageArchive, see modules/archive.py) every page downloaded is also stored in it.
+'''
+import asyncio
+from collections import namedtuple
+import time
+from urllib.parse import urlsplit
+import aiohttp
+from .throttle import AdaptiveLimiter
+
+# What fetch() returns: text is None when the server answered 304 Not Modified
+Fetched = namedtuple("Fetched", ["status", "text", "etag", "last_modified"])
+
+class Fetcher:
+    '''
+    Pooled HTTP client, to be used as an async context manager:
+
+    async with Fetcher(concurrency=16) as fetcher:
+        page = await fetcher.get("https://www.boadica.com.br/produtos/p161000")
+
+    Any number of get() calls can be awaited at once, the ones over the concurrency limit wait for a free connection.
+
+    limiters turns on the adaptive limiting: a dict of host -> AdaptiveLimiter, the hosts missing from it get a new limiter
+    (up to concurrency requests in flight) on their first request. Keep the dict to start the next Fetcher from the limits
+    learned by this one. A request is tried up to retries more times, after that the last error response is returned,
+    or the last error raised (one of Fetcher.errors).
+    '''
+    errors = (aiohttp.ClientError, asyncio.TimeoutError) # what fetch() and get() raise when the server can't be reached
+
+    def __init__(self, concurrency=16, timeout=30, limiters=None, retries=3, archive=None, metrics=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.limiters = limiters
+        self.retries = retries
+        self.archive = archive # pages that came with a body (except errors, 429s and 5xx) are appended to it
+        self.metrics = metrics # a Metrics (see modules/metrics.py) that counts the pages and bytes too
+        self.requests = 0 # finished requests
+        self.bytes = 0 # downloaded body bytes
+        self.not_modified = 0 # 304 answers
+        self.retried = 0 # requests tried again
+        self._session = None
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, url):
+        '''Returns the page text (like requests.get(url).text, whatever the status code is)'''
+        return (await self.fetch(url)).text
+
+    async def fetch(self, url, headers=None):
+        '''
+        Like get(), but returns a Fetched with the status and the validators (ETag / Last-Modified) the page came with
+        Send the validators back in headers (If-None-Match / If-Modified-Since) and an unchanged page comes back as a bodyless 304
+        '''
+        if self.limiters is None:
+            return (await self._fetch(url, headers))[0]
+        host = urlsplit(url).netloc
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = self.limiters[host] = AdaptiveLimiter(initial=min(4, self.concurrency), maximum=self.concurrency)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+            await limiter.acquire()
+            start = time.monotonic()
+            try:
+                fetched, retry_after = await self._fetch(url, headers)
+            except self.errors as failure:
+                limiter.release(time.monotonic() - start, "timeout" if isinstance(failure, asyncio.TimeoutError) else "connection")
+                if attempt == self.retries:
+                    raise
+                continue
+            except BaseException: # cancelled, that says nothing about the host
+                limiter.cancel()
+                raise
+            error = "429" if fetched.status == 429 else "5xx" if fetched.status >= 500 else None
+            limiter.release(time.monotonic() - start, error, retry_after)
+            if error is None:
+                return fetched
+        return fetched
+
+    async def _fetch(self, url, headers):
+        '''One request: (Fetched, the Retry-After seconds or None)'''
+        async with self._session.get(url, headers=headers) as response:
+            body = await response.read()
+            if response.status == 304:
+                text = None
+                self.not_modified += 1
+            else:
+                text = body.decode(response.get_encoding(), errors="replace")
+                if self.archive is not None and response.status != 429 and response.status < 500:
+                    self.archive.append(url, text, response.status)
+            fetched = Fetched(response.status, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            retry_after = response.headers.get("Retry-After")
+        self.requests += 1
+        self.bytes += len(body)
+        if self.metrics is not None:
+            self.metrics.count("pages")
+            self.metrics.count("bytes", len(body))
+        return fetched, float(retry_after) if retry_after and retry_after.isdigit() else None
+
@@ -0,0 +1,188 @@
+'''
+Work leasing for the crawl cursor kept in the Meta table.
+Ids are handed out in blocks, each one recorded in the Bloco table with its owner, lease expiry and checkpoint,
+so several scraper processes can share one database without scraping the same ids,
+and a block left behind by a crashed run is picked up again from its last checkpoint.
+An id that keeps failing holds its block back (the checkpoint can't move past it): the ids done after it are saved along
+with the checkpoint, so whoever takes the block over doesn't scrap them again, and after max_attempts failed runs the id
+is given up on, finished and recorded in the block's given_up column.
+'''
+import os
+import socket
+import time
+import uuid
+
+def _ids(text):
+    '''The ids in a space separated list (how they are kept in the Bloco columns)'''
+    return (int(pid) for pid in (text or "").split())
+
+class Lease:
+    '''Block of ids [start, end) leased to this process, next is the first id not checkpointed yet'''
+    def __init__(self, start, end, next_id, finished=None, failures=None, given_up=None):
+        self.start = start
+        self.end = end
+        self.next = next_id
+        self.finished = set(_ids(finished)) # ids done after next, waiting for the ones before them
+        self.failures = {int(pid): int(count) for pid, count in (item.split(":") for item in (failures or "").split())} # id -> failed runs
+        self.given_up = list(_ids(given_up)) # ids finished after failing max_attempts times
+        self.saved = next_id # next as it is in the database
+        self.changed = False # finished, failures or given_up differ from the database
+
+    def ids(self):
+        return (pid for pid in range(self.next, self.end) if pid not in self.finished)
+
+    def done(self):
+        return self.next >= self.end
+
+class RangeLeaser:
+    '''
+    Hands out blocks of ids from Meta.range_end (metakey 1), call setup() once before using it:
+
+    leaser = RangeLeaser(manager, block_size=50)
+    await leaser.setup()
+    lease = await leaser.acquire()
+    for pid in lease.ids():
+        ...
+        leaser.finish(lease, pid)
+    await leaser.flush()
+
+    Leases expire lease_time seconds after they were taken or last flushed, then any process may take them over.
+    An id that couldn't be scraped goes to fail(lease, pid) instead of finish(), see the top of the file.
+    The database work is done with plain SQL inside BEGIN IMMEDIATE transactions (manager.transaction(immediate=True)), which is
+    what makes handing out a block atomic between processes. Inside an ambient transaction it joins it, and is committed with it.
+    lock (an asyncio.Lock) is only needed when somebody writes through the same connection outside of manager.transaction().
+    '''
+    table = "Bloco"
+
+    columns = {"finished": "TEXT", "failures": "TEXT", "given_up": "TEXT"} # added after the table first shipped
+
+    def __init__(self, manager, block_size=50, lease_time=600, owner=None, lock=None, clock=time.time, max_attempts=5):
+        self.manager = manager
+        self.block_size = block_size
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts # failed runs before an id is given up on
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = lock
+        self.clock = clock
+        self.leases = [] # every lease taken, in order
+        self.reclaimed = 0 # leases taken over from other (dead) owners
+        self.given_up = 0 # ids given up on by this leaser
+
+    @staticmethod
+    def set_entity(manager):
+        '''Sets up the Bloco entity, to be called along with the other setup operations (before create_tables())'''
+        manager.set_entity(RangeLeaser.table, block_start="INT", block_end="INT", next_id="INT", owner="TEXT", expires="REAL", done="BOOL",
+                           **RangeLeaser.columns)
+        manager.set_primary_key(RangeLeaser.table, "block_start")
+
+    async def setup(self):
+        '''Creates the Bloco table if the database doesn't have it yet (databases made before leasing existed), or the columns it lacks'''
+        if self.table not in self.manager.entities:
+            RangeLeaser.set_entity(self.manager)
+            await self.manager.add_table(self.manager.entities[self.table])
+            return
+        known = self.manager.entities[self.table].args_dict
+        missing = {name: kind for name, kind in self.columns.items() if name not in known}
+        if missing:
+            await self.manager.add_columns(self.table, **missing)
+
+    async def _transaction(self, function):
+        '''Runs function (an async function of the connection) inside manager.transaction(immediate=True), or the ambient one'''
+        if self.lock is not None:
+            await self.lock.acquire()
+        try:
+            async with self.manager.transaction(immediate=True):
+                return await function(self.manager.conn)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    async def acquire(self, size=None):
+        '''
+        Leases a block: an expired unfinished one if there is any (it resumes from its checkpoint),
+        otherwise a new block of size ids (block_size by default) taken from Meta.range_end
+        '''
+        size = size or self.block_size
+        now = self.clock()
+
+        async def take(conn):
+            cursor = await conn.execute(f"SELECT block_start, block_end, next_id, finished, failures, given_up FROM {self.table} WHERE done = 0 AND expires < ? ORDER BY block_start LIMIT 1", (now,))
+            row = await cursor.fetchone()
+            if row is not None:
+                await conn.execute(f"UPDATE {self.table} SET owner = ?, expires = ? WHERE block_start = ?", (self.owner, now + self.lease_time, row[0]))
+                self.reclaimed += 1
+                return Lease(*row)
+            cursor = await conn.execute("SELECT range_end FROM Meta WHERE metakey = 1")
+            start, = await cursor.fetchone()
+            await conn.execute("UPDATE Meta SET range_end = ? WHERE metakey = 1", (start + size,))
+            await conn.execute(f"INSERT INTO {self.table} (block_start, block_end, next_id, owner, expires, done) VALUES (?, ?, ?, ?, ?, 0)",
+                               (start, start + size, start, self.owner, now + self.lease_time))
+            return Lease(start, start + size, start)
+
+        lease = await self._transaction(take)
+        self.leases.append(lease)
+        return lease
+
+    def finish(self, lease, pid):
+        '''Marks pid as done (in memory, see flush()), the checkpoint moves past every id done without gaps'''
+        lease.finished.add(pid)
+        lease.failures.pop(pid, None)
+        while lease.next in lease.finished:
+            lease.finished.discard(lease.next)
+            lease.next += 1
+        lease.changed = True
+
+    def fail(self, lease, pid):
+        '''
+        Counts a failed run for pid, which stays unfinished (the block goes back with it) until it failed max_attempts times,
+        then it is finished and recorded in given_up. Returns whether it was given up on.
+        '''
+        attempts = lease.failures.get(pid, 0) + 1
+        lease.failures[pid] = attempts
+        lease.changed = True
+        if attempts < self.max_attempts:
+            return False
+        self.finish(lease, pid)
+        lease.given_up.append(pid)
+        self.given_up += 1
+        return True
+
+    async def flush(self):
+        '''
+        Saves the checkpoints that moved and renews every lease still held, the ones stuck behind an id that
+        isn't done yet too (otherwise they'd expire under us and somebody else would scrap the block again)
+        '''
+        if not self.leases:
+            return
+        expires = self.clock() + self.lease_time
+
+        async def save(conn):
+            for lease in self.leases:
+                if lease.next != lease.saved or lease.changed:
+                    await conn.execute(f"UPDATE {self.table} SET next_id = ?, expires = ?, done = ?, finished = ?, failures = ?, given_up = ? "
+                                       f"WHERE block_start = ? AND owner = ?",
+                                       (lease.next, expires, int(lease.done()), " ".join(map(str, sorted(lease.finished))),
+                                        " ".join(f"{pid}:{count}" for pid, count in sorted(lease.failures.items())),
+                                        " ".join(map(str, lease.given_up)), lease.start, self.owner))
+                else:
+                    await conn.execute(f"UPDATE {self.table} SET expires = ? WHERE block_start = ? AND owner = ?",
+                                       (expires, lease.start, self.owner))
+
+        await self._transaction(save)
+        for lease in self.leases:
+            lease.saved = lease.next
+            lease.changed = False
+        self.leases = [lease for lease in self.leases if not lease.done()]
+
+    async def release(self):
+        '''Saves the checkpoints and gives the unfinished leases back, so the next run (of anybody) continues them right away'''
+        await self.flush()
+        if not self.leases:
+            return
+
+        async def give_back(conn):
+            for lease in self.leases:
+                await conn.execute(f"UPDATE {self.table} SET expires = 0 WHERE block_start = ? AND owner = ?", (lease.start, self.owner))
+
+        await self._transaction(give_back)
+        self.leases = []
@@ -0,0 +1,167 @@
+'''
+Instrumentation of a scraping run: how long each stage takes (as histograms), what came out of each page (counters),
+and the state of the moving parts (gauges, read when asked for). A run can be followed through a progress line,
+and saved as a JSON summary or as a Prometheus text file (for the node exporter's textfile collector, say).
+'''
+import asyncio
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+class Histogram:
+    '''Counts of observations (seconds) by bucket, the quantiles are interpolated inside the buckets'''
+    buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1) # the last one is past the last bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.mean(), "max": self.max,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+class Metrics:
+    '''
+    Everything measured in one run:
+
+    metrics = Metrics()
+    with metrics.time("fetch"):
+        page = await fetcher.get(url)
+    metrics.count("new")
+    metrics.watch("cache", lambda: {"hits": cache.hits})
+    print(metrics.line())
+    metrics.write_json("run.json")
+    metrics.write_prometheus("run.prom")
+
+    time() measures the wall time of its block, awaits included.
+    The functions given to watch() are called for every snapshot, their values show up as gauges.
+    '''
+    def __init__(self, prefix="bdbd", clock=time.perf_counter):
+        self.prefix = prefix
+        self._clock = clock
+        self.started = clock()
+        self.stages = {} # stage -> Histogram
+        self.counters = Counter()
+        self._watched = {} # name -> function returning a dict of numbers
+
+    @contextmanager
+    def time(self, stage):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.observe(stage, self._clock() - start)
+
+    def observe(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def watch(self, name, function):
+        self._watched[name] = function
+
+    def elapsed(self):
+        return self._clock() - self.started
+
+    def gauges(self):
+        '''{name: {key: value}} from the watched functions, right now'''
+        return {name: function() for name, function in self._watched.items()}
+
+    def rate(self, name):
+        '''Counter name per second since the start'''
+        elapsed = self.elapsed()
+        return self.counters[name] / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        return {"elapsed": self.elapsed(), "counters": dict(self.counters),
+                "rates": {name: self.rate(name) for name in ("pages", "bytes")},
+                "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+                "gauges": self.gauges()}
+
+    def line(self):
+        '''One line about the run so far, for a progress display'''
+        elapsed = self.elapsed()
+        kinds = " ".join(f"{name} {count}" for name, count in sorted(self.counters.items()) if name not in ("pages", "bytes", "rows"))
+        stages = " ".join(f"{stage} {histogram.quantile(0.5) * 1000:.0f}ms" for stage, histogram in self.stages.items())
+        return (f"{elapsed:6.1f}s {self.counters['pages']} pages {self.rate('pages'):.1f}/s {self.counters['bytes'] / 2 ** 20:.1f} MiB | "
+                f"{kinds} | p50 {stages}")
+
+    async def progress(self, every=1.0, stream=None):
+        '''Rewrites line() on stream (stderr by default) every few seconds, until cancelled'''
+        stream = stream or sys.stderr
+        try:
+            while True:
+                await asyncio.sleep(every)
+                stream.write("\r" + self.line() + "\033[K")
+                stream.flush()
+        finally:
+            stream.write("\r" + self.line() + "\033[K\n")
+            stream.flush()
+
+    def _write(self, path, text):
+        temporary = path + ".tmp" # written whole or not at all, readers never see half a file
+        with open(temporary, "w") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def write_json(self, path):
+        self._write(path, json.dumps(self.snapshot(), indent=2, sort_keys=True))
+
+    def prometheus(self):
+        '''The metrics in the Prometheus text format'''
+        name = self.prefix
+        lines = [f"# HELP {name}_stage_seconds Time spent in each stage of the run",
+                 f"# TYPE {name}_stage_seconds histogram"]
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{name}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines += [f"# HELP {name}_events_total Pages, bytes and page outcomes of the run",
+                  f"# TYPE {name}_events_total counter"]
+        for event, count in sorted(self.counters.items()):
+            lines.append(f'{name}_events_total{{event="{event}"}} {count}')
+        lines += [f"# HELP {name}_state Gauges of the run's moving parts", f"# TYPE {name}_state gauge"]
+        for source, values in sorted(self.gauges().items()):
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}_state{{source="{source}",name="{key}"}} {value}')
+        lines.append(f"{name}_elapsed_seconds {self.elapsed()}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        self._write(path, self.prometheus())
@@ -9,11 +9,111 @@ from mySoup import seed
 tree_list = seed.build(filename)
 
 # Then, you might want to retrieve objects/variables by accessing specific nodes in the tree (using provided find methods)
+# or with CSS selectors:
+price = tree_list[0].select_one(".tab-content > .row .preco-loja")
+
+# Several values can be pulled out in a single pass with a Schema, see the Schema class
+produto = Schema(nome=Field(".nome", post=[post.strip()]), precos=Group(".tab-content .row", preco=Field(".preco-loja")))
+data = produto.extract(tree_list[0])
+
+# Pages that arrive in pieces (a download in progress, a huge file) can go through a StreamParser instead:
+parser = StreamParser(below_class="col-md-8")
+trees = parser.feed(first_chunk) + parser.feed(second_chunk) + parser.close()
 
 """
+from array import array
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+import codecs
+import re
+
+#set of which html tags do not have subtags (will not have a closing </tag>) -> add some way to check for typos
+nosub_tags = {"area", "base", "br", "br/", "br /", "col", "command", "embed", "hr", "iframe", "img", "input", "keygen", "link", "menuitem", "meta", "param", "source", "track", "wbr"}
+
+#set of tags that keep the text gathered so far (a line break is added instead of starting over)
+text_keepers = {"br", "br/", "br /", "span", "/span"}
+
+# A well behaved tag body: the tag name followed by key="value" pairs, each one preceded by spaces
+# Anything else goes through _parse_tag_slow(), which reproduces the char by char rules exactly
+_plain_tag = re.compile(r'[^ =]+((?: +[^ ="]+="(?:[^" ][^"]*)?")*)(?: +/)? *\Z')
+_plain_attr = re.compile(r' +([^ ="]+)="((?:[^" ][^"]*)?)"')
+
+def _parse_tag(body):
+    """
+    Splits the text between < and > into the tag name and a dict with its params
+    Uses regexes and slices for the common case
+    """
+    match = _plain_tag.match(body)
+    if match is None:
+        return _parse_tag_slow(body)
+    attrs_start, attrs_end = match.span(1)
+    tag_params = {}
+    if attrs_end > attrs_start:
+        for key, value in _plain_attr.findall(body, attrs_start, attrs_end):
+            if "=" in value:
+                value = value.replace("=", "")
+            tag_params[key] = value
+    return body[:attrs_start], tag_params
+
+def _parse_tag_slow(body):
+    """
+    Char by char version of _parse_tag(), used for odd tags (valueless params, unquoted values and so on)
+    The rules here are the ones the parser always had, so both versions agree on every tag
+    """
+    tag_name = ""
+    tag_params = {}
+    # These 4 are here to help the method store strings correctly
+    tag_key = ""
+    get_value = False
+    tag_value = ""
+    tag_count = 0
+
+    last = len(body) - 1
+    for i, char in enumerate(body):
+
+        if char == "=":
+            get_value = True
+
+        if tag_count == 0:
+            tag_name += char
+        else:
+            if get_value:
+                if char not in ["=","\""]:
+                    tag_value += char
+            elif char != " ":
+                tag_key += char
+
+        following = body[i + 1] if i < last else ">"
+        if following in [" ", ">"]:
+            tag_count += 1
+            if get_value:
+                if char == "\"":
+                    tag_params[tag_key] = tag_value
+                    tag_key = ""
+                    tag_value = ""
+                    get_value = False
+                else:
+                    tag_count -= 1
+
+    return tag_name, tag_params
+
+_any_tag = re.compile(r'<[^>]*>')
+
+def span_text(source, start, end):
+    """
+    Rebuilds the text the parser gathers between start and end: line breaks are dropped,
+    and each tag in between (only text keepers can be there) turns into a line break
+    """
+    region = source[start:end]
+    if "<" not in region:
+        return region.replace("\n", "")
+    return "\n".join(chunk.replace("\n", "") for chunk in _any_tag.split(region))
 
-#list of which html tags do not have subtags (will not have a closing </tag>) -> add some way to check for typos
-nosub_tags = ["area", "base", "br", "br/", "br /", "col", "command", "embed", "hr", "iframe", "img", "input", "keygen", "link", "menuitem", "meta", "param", "source", "track", "wbr"]
+@lru_cache(maxsize=1024)
+def class_tokens(clss):
+    """Splits a class string into its tokens, the same few class strings come up again and again so results are cached"""
+    return tuple(clss.split())
 
 class Anything:
     """
@@ -42,207 +142,78 @@ class seed:
         return Anything()
 
     @staticmethod
-    def _build_from_string(string, below_tag=None, below_class=None, ignore=[]):
+    def _build_from_string(string, below_tag=None, below_class=None, ignore=[], max_trees=None, scoped=False, tree_class=None, lazy_text=False):
         """
         Generates a list of trees directly from a string.
         Useful when the webpage content is stored in a variable returned by Requests.
         """
-        trees = []
-
-        current_tree = Tree(ignored_nodes=ignore)
-        i = 0
-
-        some_text = ""
-
-        while i < len(string): # char => string[i], file.read => i += 1
-
-            if not current_tree.is_open():
-                trees.append(current_tree)
-                current_tree = Tree(ignored_nodes=ignore)
-
-            if string[i] == "<":
-
-                tag_name = ""
-                tag_params = {}
-                # These 4 are here to help the method store strings correctly
-                tag_key = ""
-                get_value = False
-                tag_value = ""
-                tag_count = 0
-
-                i += 1
-                while string[i] != ">":
-
-                    if string[i] == "=":
-                        get_value = True
-
-                    if tag_count == 0:
-                        tag_name += string[i]
-                    else:
-                        if get_value:
-                            if string[i] not in ["=","\""]:
-                                tag_value += string[i]
-                        elif string[i] != " ":
-                            tag_key += string[i]
-
-                    if (string[i] == "/") and (tag_name[0] == "/") and current_tree.is_open() and tag_count == 0:
-                        current_tree.add_text(some_text)
-
-                    previous = string[i]
-                    i += 1
-
-                    if string[i] in [" ", ">"]:
-                        tag_count += 1
-                        if get_value:
-                            if previous == "\"":
-                                tag_params[tag_key] = tag_value
-                                tag_key = ""
-                                tag_value = ""
-                                get_value = False
-                            else:
-                                tag_count -= 1
-
-                if current_tree.root is not None: # If the tree already has a root, keep going deeper
-                    current_tree.add_htmltag(tag_name, tag_params)
-                elif below_class:
-                    if "class" in tag_params.keys():
-                        if tag_params["class"] == below_class:
-                            current_tree.add_htmltag(tag_name, tag_params)
-                elif below_tag:
-                    if tag_name == below_tag:
-                        current_tree.add_htmltag(tag_name, tag_params)
-                else: # If no special parameter was specified, this will add the root
-                    current_tree.add_htmltag(tag_name, tag_params)
-
-                if(tag_name not in ["br", "br/", "br /", "span", "/span"]):
-                    some_text = ""
-                else:
-                    some_text += "\n"
-
-            elif string[i] != "\n":
-                some_text += string[i]
-
-            i += 1
-
-        if current_tree.is_open():
-            if current_tree.root:
-                print("Bracket closings have some weird stuff going on")
-                #current_tree.root.show()
-                #current_tree.current_node.show()
-
-        if current_tree.root: # This condition is to prevent adding an empty tree when the file ends with extra spaces/end of line
-            trees.append(current_tree)
-
+        parser = StreamParser(below_tag=below_tag, below_class=below_class, ignore=ignore, max_trees=max_trees, scoped=scoped, tree_class=tree_class, lazy_text=lazy_text)
+        trees = parser.feed(string)
+        trees.extend(parser.close())
         return trees
 
     @staticmethod
-    def _build_from_file(filename, below_tag=None, below_class=None, ignore=[]):
+    def _build_from_file(filename, below_tag=None, below_class=None, ignore=[], max_trees=None, scoped=False, tree_class=None, lazy_text=False, chunk_size=65536):
         """
         Generates a list of trees directly from a file.
         The file must be in the calling directory.
+        The file is read in chunks of chunk_size chars, so big saved pages never sit in memory as a whole (unless lazy_text is set).
         """
+        parser = StreamParser(below_tag=below_tag, below_class=below_class, ignore=ignore, max_trees=max_trees, scoped=scoped, tree_class=tree_class, lazy_text=lazy_text)
         trees = []
         with open(filename, "r") as file:
-
-            current_tree = Tree(ignored_nodes=ignore)
-            char = file.read(1)
-
-            some_text = ""
-
-            while char != "": #Apparently it gets an empty string upon reaching EOF
-
-                if not current_tree.is_open():
-                    trees.append(current_tree)
-                    current_tree = Tree(ignored_nodes=ignore)
-
-                if char == "<":
-
-                    tag_name = ""
-                    tag_params = {}
-                    # These 4 are here to help the method store strings correctly
-                    tag_key = ""
-                    get_value = False
-                    tag_value = ""
-                    tag_count = 0
-
-                    char = file.read(1)
-                    while char != ">":
-
-                        if char == "=":
-                            get_value = True
-
-                        if tag_count == 0:
-                            tag_name += char
-                        else:
-                            if get_value:
-                                if char not in ["=","\""]:
-                                    tag_value += char
-                            elif char != " ":
-                                tag_key += char
-
-                        if (char == "/") and (tag_name[0] == "/") and current_tree.is_open() and tag_count == 0:
-                            current_tree.add_text(some_text)
-
-                        previous = char
-                        char = file.read(1)
-
-                        if char in [" ", ">"]:
-                            tag_count += 1
-                            if get_value:
-                                if previous == "\"":
-                                    tag_params[tag_key] = tag_value
-                                    tag_key = ""
-                                    tag_value = ""
-                                    get_value = False
-                                else:
-                                    tag_count -= 1
-
-                    if current_tree.root is not None: # If the tree already has a root, keep going deeper
-                        current_tree.add_htmltag(tag_name, tag_params)
-                    elif below_class:
-                        if "class" in tag_params.keys():
-                            if tag_params["class"] == below_class:
-                                current_tree.add_htmltag(tag_name, tag_params)
-                    elif below_tag:
-                        if tag_name == below_tag:
-                            current_tree.add_htmltag(tag_name, tag_params)
-                    else: # If no special parameter was specified, this will add the root
-                        current_tree.add_htmltag(tag_name, tag_params)
-
-                    if(tag_name not in ["br", "br/"]):
-                        some_text = ""
-                    else:
-                        some_text += "\n"
-
-                elif char != "\n":
-                    some_text += char
-
-                char = file.read(1)
-
-            if current_tree.is_open():
-                if current_tree.root:
-                    print("Bracket closings have some weird stuff going on")
-                    #current_tree.root.show()
-                    #current_tree.current_node.show()
-
-            if current_tree.root: # This condition is to prevent adding an empty tree when the file ends with extra spaces/end of line
-                trees.append(current_tree)
+            chunk = file.read(chunk_size)
+            while chunk != "" and not parser.done(): #Apparently it gets an empty string upon reaching EOF
+                trees.extend(parser.feed(chunk))
+                chunk = file.read(chunk_size)
+        trees.extend(parser.close())
         return trees
 
     @staticmethod
-    def build(string=None, file=None, below_tag=None, below_class=None, ignore=[]):
+    def build(string=None, file=None, below_tag=None, below_class=None, ignore=[], max_trees=None, scoped=False, tree_class=None, lazy_text=False):
         """
         Method to create and return a list of trees, as specified by the user. Has multiple implementations.
         if a string is passed in below_tag, Trees will only be built from below a tag matching the given tagname.
         if a string is passed in below_class, Trees will only be built from below a tag matching that has the given class property.
         if a [string] is passed into ignore, nodes with tagnames that match any element in the list will not be built.
+        if a number is passed in max_trees, parsing stops as soon as that many trees are built.
+        if scoped is set to true (along with below_tag or below_class), the page is searched for the matching tag directly,
+        and everything outside the trees is skipped instead of tokenized. Each tree tells how many chars were skipped before it in tree.skipped
+        if a class is passed in tree_class, it is used instead of Tree to hold the results (see mySoupArena.ArenaTree for a compact one).
+        if lazy_text is set to true, nodes only remember where their text is in the page, and node.get("text") builds it on first use.
+        Worth it when just a few texts are read, but the trees keep the whole page alive.
         """
         if(file is not None):
-            return seed._build_from_file(file, below_tag=below_tag, below_class=below_class, ignore=ignore)
+            return seed._build_from_file(file, below_tag=below_tag, below_class=below_class, ignore=ignore, max_trees=max_trees, scoped=scoped, tree_class=tree_class, lazy_text=lazy_text)
         if(string is not None):
-            return seed._build_from_string(string, below_tag=below_tag, below_class=below_class, ignore=ignore)
+            return seed._build_from_string(string, below_tag=below_tag, below_class=below_class, ignore=ignore, max_trees=max_trees, scoped=scoped, tree_class=tree_class, lazy_text=lazy_text)
         return ""
 
+    @staticmethod
+    def find_region(string, below_tag=None, below_class=None):
+        """
+        Returns (start, end) of the html of the first tag matching below_tag / below_class, from its < to the end of its closing tag,
+        or None if there is no such tag (or it never closes).
+        No tree is built: the closing tag is the one that brings the count of open tags with the same name back to zero,
+        so it's cheap, and meant for things like telling whether that part of a page changed.
+        """
+        start = StreamParser(below_tag=below_tag, below_class=below_class, scoped=True)._find_target(string, 0)
+        if start == -1:
+            return None
+        tag_end = string.find(">", start)
+        if tag_end == -1:
+            return None
+        tag_name = _parse_tag(string[start + 1:tag_end])[0]
+        if tag_name in nosub_tags:
+            return start, tag_end + 1
+        depth = 0
+        for found in re.finditer(r"<(/?)" + re.escape(tag_name) + r"[\s/>]", string[start:]):
+            depth += -1 if found.group(1) else 1
+            if depth == 0:
+                close = string.find(">", start + found.start())
+                return (start, close + 1) if close != -1 else None
+        return None
+
     @staticmethod
     def view(tree, deep=False):
         """
@@ -258,12 +229,693 @@ class seed:
         ident = "    " * lvl
         print(f"{ident}{node.name}, level {lvl}")
         if deep:
+            node.get("text")
             print_dict(node.params, ident=ident)
 
         if node.subordinates:
             for sub in node.subordinates:
                 seed._view(sub, lvl + 1, deep=deep)
 
+class StreamParser:
+    """
+    Incremental tree builder, the engine behind seed.build()
+    Pages can be fed in pieces of any size (str or bytes) as they arrive from a file or a response body:
+
+    parser = StreamParser(below_class="col-md-8")
+    for chunk in response.iter_content(8192):
+        for tree in parser.feed(chunk):
+            ...
+    leftovers = parser.close()
+
+    feed() returns the trees whose root closed inside that chunk, so nothing but the currently open subtree
+    (plus an unfinished tag or text run) is kept around.
+
+    With scoped=True, while no tree is open the parser jumps straight to the next tag matching below_class/below_tag
+    (found with str.find on its class="..." or <tag text) instead of tokenizing every tag on the way.
+    The jumped over chars are counted in self.skipped. A scoped span root does not inherit the text found before it,
+    which the regular mode does.
+
+    With lazy_text=True, closed nodes get a (start, end) span into the page instead of their text (see Tree.add_text_span),
+    so no text is copied while parsing. The spans need the page in one piece, so in this mode feed() only collects
+    the chunks and everything is parsed by close(). Tree classes without add_text_span still get plain text.
+    """
+    # Limit for the parsed tag cache, so a long stream of distinct tags can't make it grow forever
+    cache_size = 4096
+
+    def __init__(self, below_tag=None, below_class=None, ignore=[], encoding="utf-8", max_trees=None, scoped=False, tree_class=None, lazy_text=False):
+        self.tree_class = tree_class or Tree
+        self.below_tag = below_tag
+        self.below_class = below_class
+        self.ignore = ignore
+        self.encoding = encoding
+        self.max_trees = max_trees
+        self.lazy_text = lazy_text
+        self.built = 0
+        self.skipped = 0
+        self._target = None
+        if scoped:
+            if below_class:
+                self._target = f"class=\"{below_class}\""
+            elif below_tag:
+                self._target = f"<{below_tag}"
+        self._decoder = None
+        self._buffer = ""
+        self._pending = [] # chunks waiting for close() in lazy_text mode
+        self._some_text = ""
+        self._parsed_tags = {}
+        self._current_tree = self.tree_class(ignored_nodes=ignore)
+
+    def feed(self, chunk):
+        """Parses the given chunk, returns a list with the trees that were completed by it"""
+        if isinstance(chunk, (bytes, bytearray)):
+            if self._decoder is None:
+                self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+            chunk = self._decoder.decode(chunk)
+        if self.done():
+            self.skipped += len(chunk)
+            return []
+        if self.lazy_text:
+            self._pending.append(chunk)
+            return []
+        if self._buffer:
+            chunk = self._buffer + chunk
+        return self._scan(chunk)
+
+    def done(self):
+        """Returns true once max_trees trees were built, anything fed after that is ignored"""
+        return self.max_trees is not None and self.built >= self.max_trees
+
+    def close(self):
+        """Signals the end of the page, returns the tree still being built if there is one"""
+        trees = []
+        if self._decoder is not None:
+            trees = self.feed(self._decoder.decode(b"", True))
+        if self._pending:
+            page = "".join(self._pending) # a single chunk is not copied
+            self._pending = []
+            trees.extend(self._scan(page))
+        self._buffer = "" # A tag that never got its > is dropped
+
+        current_tree = self._current_tree
+        if current_tree.is_open():
+            if current_tree.root:
+                print("Bracket closings have some weird stuff going on")
+                #current_tree.root.show()
+                #current_tree.current_node.show()
+
+        if current_tree.root: # This condition is to prevent adding an empty tree when the file ends with extra spaces/end of line
+            trees.append(current_tree)
+        self._current_tree = self.tree_class(ignored_nodes=self.ignore)
+        return trees
+
+    def _scan(self, string):
+        """
+        Main loop: tags and text runs are located with str.find and sliced out in one go
+        Whatever comes after the last complete tag is kept in the buffer until the next feed()
+        """
+        trees = []
+        below_tag = self.below_tag
+        below_class = self.below_class
+        target = self._target
+        current_tree = self._current_tree
+        some_text = self._some_text
+        lazy = self.lazy_text
+        spans = lazy and hasattr(self.tree_class, "add_text_span")
+        text_from = 0 # lazy_text: where the current text run starts
+        parsed_tags = self._parsed_tags # Pages repeat the same few tags over and over, so each distinct tag is only parsed once
+        if len(parsed_tags) > self.cache_size:
+            parsed_tags.clear()
+
+        find = string.find
+        pos = 0
+
+        while True:
+            if target and current_tree.root is None:
+                tag_start = self._find_target(string, pos)
+                if tag_start == -1: # Only an unfinished tag may still turn out to be the target
+                    last_end = string.rfind(">", pos)
+                    tag_start = find("<", pos if last_end == -1 else last_end + 1)
+                    if tag_start == -1:
+                        tag_start = len(string)
+                    self.skipped += tag_start - pos
+                    pos = tag_start
+                    some_text = ""
+                    break
+                self.skipped += tag_start - pos
+                current_tree.skipped += tag_start - pos
+                pos = tag_start
+                some_text = ""
+                text_from = pos
+
+            tag_start = find("<", pos)
+            if tag_start == -1:
+                if not lazy:
+                    some_text += string[pos:].replace("\n", "")
+                pos = len(string)
+                break
+            if tag_start > pos and not lazy:
+                some_text += string[pos:tag_start].replace("\n", "")
+
+            tag_end = find(">", tag_start + 1)
+            if tag_end == -1: # The tag continues in the next chunk
+                pos = tag_start
+                break
+            body = string[tag_start + 1:tag_end]
+            pos = tag_end + 1
+            parsed = parsed_tags.get(body)
+            if parsed is None:
+                tag_name, tag_params = _parse_tag(body)
+                parsed = parsed_tags[body] = (tag_name, tag_params, tag_name[:1] == "/", tag_name in text_keepers)
+            tag_name, tag_params, closing, keeps_text = parsed
+
+            if closing:
+                if spans:
+                    current_tree.add_text_span(string, text_from, tag_start)
+                elif lazy:
+                    current_tree.add_text(span_text(string, text_from, tag_start))
+                else:
+                    current_tree.add_text(some_text)
+
+            if current_tree.root is not None: # If the tree already has a root, keep going deeper
+                current_tree.add_htmltag(tag_name, tag_params)
+            elif below_class:
+                if "class" in tag_params.keys():
+                    if tag_params["class"] == below_class:
+                        current_tree.add_htmltag(tag_name, tag_params)
+            elif below_tag:
+                if tag_name == below_tag:
+                    current_tree.add_htmltag(tag_name, tag_params)
+            else: # If no special parameter was specified, this will add the root
+                current_tree.add_htmltag(tag_name, tag_params)
+
+            if lazy:
+                if not keeps_text:
+                    text_from = pos
+            elif keeps_text:
+                some_text += "\n"
+            else:
+                some_text = ""
+
+            if not current_tree.is_open():
+                trees.append(current_tree)
+                current_tree = self.tree_class(ignored_nodes=self.ignore)
+                self.built += 1
+                if self.done():
+                    self.skipped += len(string) - pos
+                    pos = len(string)
+                    break
+
+        self._buffer = string[pos:]
+        self._current_tree = current_tree
+        self._some_text = some_text
+        return trees
+
+    def _find_target(self, string, pos):
+        """
+        Returns the position of the next tag that can be a scoped root, or -1
+        pos must not be inside a tag: then the first < after the last > (counting from pos) is always a real tag start
+        """
+        target = self._target
+        found = string.find(target, pos)
+        while found != -1:
+            last_end = string.rfind(">", pos, found)
+            tag_start = string.find("<", pos if last_end == -1 else last_end + 1, found + 1)
+            if tag_start != -1 and (target[0] != "<" or tag_start == found):
+                tag_end = string.find(">", found)
+                if tag_end == -1: # Can't tell yet, let the main loop wait for the rest of the tag
+                    return tag_start
+                tag_name, tag_params = _parse_tag(string[tag_start + 1:tag_end])
+                if self.below_class and tag_params.get("class") == self.below_class:
+                    return tag_start
+                if not self.below_class and tag_name == self.below_tag:
+                    return tag_start
+                pos = tag_end + 1 # A real tag, just not the one we want
+            found = string.find(target, max(found + 1, pos))
+        return -1
+
+# Tokens of the supported CSS subset: tag, *, .class, #id, [attr], [attr=value] (also ~= ^= $= *=), descendant and child combinators, commas
+_selector_token = re.compile(r"""
+    \s*(?P<comma>,)\s*
+  | \s*(?P<child>>)\s*
+  | (?P<space>\s+)
+  | (?P<tag>\*|[A-Za-z][\w-]*)
+  | \.(?P<cls>[\w-]+)
+  | \#(?P<id>[\w-]+)
+  | \[\s*(?P<attr>[^\s~^$*=\]]+)\s*(?:(?P<op>[~^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^\]\s]+))\s*)?\]
+""", re.VERBOSE)
+
+class Compound:
+    """One step of a selector, like div.row.painel[data-x=1] (every part must match the same node)"""
+    __slots__ = ("universal", "tag", "ident", "classes", "attrs")
+
+    def __init__(self):
+        self.universal = False # a lone *
+        self.tag = None
+        self.ident = None
+        self.classes = ()
+        self.attrs = [] # (name, operator or None, value)
+
+    def is_empty(self):
+        return not self.universal and self.tag is None and self.ident is None and not self.classes and not self.attrs
+
+    def matches(self, node):
+        """Returns true if the node fits every part of this step"""
+        if self.tag is not None and node.name != self.tag:
+            return False
+        if self.ident is not None and node.get("id") != self.ident:
+            return False
+        if self.classes:
+            clss = node.get("class")
+            if clss is None or not set(self.classes).issubset(class_tokens(clss)):
+                return False
+        for name, operator, value in self.attrs:
+            found = node.get(name)
+            if found is None:
+                return False
+            if operator is None:
+                continue
+            if operator == "=":
+                if found != value:
+                    return False
+            elif operator == "~=":
+                if value not in found.split():
+                    return False
+            elif operator == "^=":
+                if not found.startswith(value):
+                    return False
+            elif operator == "$=":
+                if not found.endswith(value):
+                    return False
+            elif value not in found: # *=
+                return False
+        return True
+
+    def index_key(self):
+        """The (key, value) pair Tree.lookup() should use to find candidates for this step, or None"""
+        if self.ident is not None:
+            return "id", self.ident
+        if self.classes:
+            return "class", " ".join(self.classes)
+        if self.tag is not None:
+            return "tagname", self.tag
+        return None
+
+class Selector:
+    """
+    A compiled CSS selector (see compile_selector())
+    Each comma separated alternative is kept as a list of Compound steps plus the combinators between them,
+    and is matched from the last step backwards, going up through node.boss
+    """
+    def __init__(self, text):
+        self.text = text
+        self.alternatives = [] # [(steps, combinators)], combinators[i] links steps[i - 1] and steps[i]
+        steps = []
+        combinators = [None]
+        current = Compound()
+        pos = 0
+        text = text.strip()
+        if not text:
+            raise ValueError("Empty selector")
+        while pos < len(text):
+            token = _selector_token.match(text, pos)
+            if token is None:
+                raise ValueError(f"Invalid selector {self.text!r} at position {pos}")
+            pos = token.end()
+            kind = token.lastgroup
+            if kind in ("comma", "child", "space"):
+                if current.is_empty():
+                    raise ValueError(f"Invalid selector {self.text!r}, a combinator is missing its left side")
+                steps.append(current)
+                current = Compound()
+                if kind == "comma":
+                    self.alternatives.append((steps, combinators))
+                    steps = []
+                    combinators = [None]
+                else:
+                    combinators.append(">" if kind == "child" else " ")
+            elif kind == "tag":
+                if token.group("tag") == "*":
+                    current.universal = True
+                else:
+                    current.tag = token.group("tag")
+            elif kind == "cls":
+                current.classes = current.classes + (token.group("cls"),)
+            elif kind == "id":
+                current.ident = token.group("id")
+            else:
+                value = token.group("dq")
+                if value is None:
+                    value = token.group("sq")
+                if value is None:
+                    value = token.group("bare")
+                current.attrs.append((token.group("attr"), token.group("op"), value))
+        if current.is_empty():
+            raise ValueError(f"Invalid selector {self.text!r}, it can't end with a combinator")
+        steps.append(current)
+        self.alternatives.append((steps, combinators))
+
+        # Part of the plan is settled here, once: which index gives the candidates,
+        # and whether the index alone already answers the query (a lone .class, #id or tag)
+        self.index_key = None
+        self.index_only = False
+        if len(self.alternatives) == 1:
+            last = steps[-1]
+            self.index_key = last.index_key()
+            parts = (last.tag is not None) + (last.ident is not None) + (len(last.classes) > 0)
+            self.index_only = len(steps) == 1 and parts == 1 and not last.attrs
+
+    def _matches_from(self, node, steps, combinators, i):
+        """node already fits steps[i], checks the steps before it through the node ancestors"""
+        if i == 0:
+            return True
+        previous = steps[i - 1]
+        boss = node.boss
+        if combinators[i] == ">":
+            return boss is not None and previous.matches(boss) and self._matches_from(boss, steps, combinators, i - 1)
+        while boss is not None:
+            if previous.matches(boss) and self._matches_from(boss, steps, combinators, i - 1):
+                return True
+            boss = boss.boss
+        return False
+
+    def matches(self, node):
+        """Returns true if the given node is matched by this selector"""
+        for steps, combinators in self.alternatives:
+            last = len(steps) - 1
+            if steps[last].matches(node) and self._matches_from(node, steps, combinators, last):
+                return True
+        return False
+
+    def _candidates(self, scope):
+        """
+        Nodes (scope included) that may match, in document order, in a single pass
+        Trees with indexes hand over only the nodes that fit the last step of the selector
+        Returns (nodes, exact), exact is true when every candidate is already known to match
+        """
+        tree = getattr(scope, "tree", None)
+        if not isinstance(tree, Tree):
+            return scope.iter_find(tagname=Anything()), False # other backends (ArenaTree), every node of the subtree
+        end = scope.end if scope.end is not None else len(tree.nodes)
+        if self.index_key is not None:
+            nodes = tree.nodes
+            positions = tree.lookup(self.index_key[0], self.index_key[1], scope.pos, end)
+            return [nodes[pos] for pos in positions], self.index_only
+        return tree.nodes[scope.pos:end], False
+
+    def iter_select(self, scope, limit=None):
+        """Generator with the nodes below (and including) scope that match this selector, in document order"""
+        found = 0
+        candidates, exact = self._candidates(scope)
+        for node in candidates:
+            if exact or self.matches(node):
+                yield node
+                found += 1
+                if found == limit:
+                    return
+
+    def select_one(self, scope):
+        """First node below (and including) scope that matches this selector, None if there is none"""
+        candidates, exact = self._candidates(scope)
+        for node in candidates:
+            if exact or self.matches(node):
+                return node
+        return None
+
+@lru_cache(maxsize=256)
+def compile_selector(text):
+    """
+    Compiles a CSS selector into a Selector, compiled selectors are cached by their text
+    Supported: tag, *, .class, #id, [attr], [attr=value], [attr~=value], [attr^=value], [attr$=value], [attr*=value],
+    descendant (a b) and child (a > b) combinators, and comma separated alternatives
+    """
+    return Selector(text)
+
+class post:
+    """
+    Post-processors for schema fields, each method returns a function that takes the raw value
+    A function returning None turns the field into a miss
+    """
+    @staticmethod
+    def strip(chars=None):
+        return lambda value: value.strip(chars)
+
+    @staticmethod
+    def replace(old, new=""):
+        return lambda value: value.replace(old, new)
+
+    @staticmethod
+    def regex(pattern, group=0):
+        """The given group of the first match of pattern, None if nothing matches"""
+        compiled = re.compile(pattern)
+        def search(value):
+            found = compiled.search(value)
+            return None if found is None else found.group(group)
+        return search
+
+    @staticmethod
+    def number(decimal=",", thousands="."):
+        """Reads the first number in the value (R$ 1.299,90 -> 1299.9), None if there is none"""
+        compiled = re.compile(r"-?\d[\d" + re.escape(thousands) + r"]*(?:" + re.escape(decimal) + r"\d+)?")
+        def parse(value):
+            found = compiled.search(value)
+            if found is None:
+                return None
+            return float(found.group().replace(thousands, "").replace(decimal, "."))
+        return parse
+
+class Field:
+    """
+    One value of a Schema: the nth node matching selector (0 is the first one), and then its attr ("text" by default)
+    Without a selector the value comes from the node the field is looked in (a group record, or the scope itself)
+    With exists=True the value is just whether some node matched (True / False)
+    post is a list of functions applied to the value in order (see the post class), default is used on a miss
+    """
+    def __init__(self, selector=None, attr="text", post=(), nth=0, exists=False, default=None):
+        self.selector = None if selector is None else compile_selector(selector)
+        self.attr = attr
+        self.post = list(post)
+        self.nth = nth
+        self.exists = exists
+        self.default = default
+
+    def value(self, node):
+        """Value taken from the matched node, None for a miss"""
+        if self.exists:
+            return True
+        value = node.get(self.attr)
+        for function in self.post:
+            if value is None:
+                break
+            value = function(value)
+        return value
+
+class Schema:
+    """
+    Named Fields and Groups, compiled once into a plan that fills all of them in a single pass over the nodes:
+
+    produto = Schema(
+        prod_name=Field(".nome", post=[post.strip()]),
+        lojas=Group(".tab-content .row", l_nick=Field("a", attr="href", post=[post.regex(r"[^/]*$")])),
+    )
+    data = produto.extract(tree) # {"prod_name": ..., "lojas": [{"l_nick": ...}, ...]}
+
+    On a Tree, each member makes one index lookup for the whole scope and every record takes its hits from there (see _fill()).
+    Other trees get a single walk over the nodes, each one checked only against the members that could match it (see _walk()).
+    Either way, selectors match the same nodes select() would.
+    Matches and misses of every member (group.field inside groups) add up in self.stats across extract() calls,
+    so a field that stops matching after a site change shows up in report().
+    extract(scope, stats) counts them in stats instead, for extractions made somewhere else (a parser process):
+    send that dict back and merge() it into the schema that reports.
+    """
+    def __init__(self, **members):
+        self.members = list(members.items())
+        self.stats = {}
+        self._by_tag = {}
+        self._by_class = {}
+        self._by_id = {}
+        self._anywhere = [] # members whose selector has no index key
+        self._plan = [] # (name, member, is a group, a dispatched node is known to match)
+        for slot, (name, member) in enumerate(self.members):
+            if not isinstance(member, (Field, Group)):
+                raise TypeError(f"Schema member {name} must be a Field or a Group")
+            selector = member.selector
+            exact = selector is not None and selector.index_only and (selector.index_key[0] != "class" or len(class_tokens(selector.index_key[1])) == 1)
+            self._plan.append((name, member, isinstance(member, Group), exact))
+            if selector is None:
+                continue
+            if member.selector.index_key is None:
+                self._anywhere.append(slot)
+                continue
+            key, value = member.selector.index_key
+            if key == "tagname":
+                self._by_tag.setdefault(value, []).append(slot)
+            elif key == "id":
+                self._by_id.setdefault(value, []).append(slot)
+            else: # every class of the last step must be there, so the first one is enough to pick candidates
+                self._by_class.setdefault(class_tokens(value)[0], []).append(slot)
+
+    def _slots(self, name, tokens, ident):
+        """Slots of the members that may match a node with the given tag name, class tokens and id"""
+        slots = self._anywhere + self._by_tag.get(name, [])
+        if self._by_class:
+            for token in tokens:
+                if token in self._by_class:
+                    slots += self._by_class[token]
+        if ident is not None and self._by_id:
+            slots += self._by_id.get(ident, [])
+        return slots
+
+    def _indexable(self):
+        """True if every selector (groups included) can get its candidates from the Tree indexes"""
+        for name, member, group, exact in self._plan:
+            if member.selector is None:
+                continue
+            if member.selector.index_key is None or (group and not member._indexable()):
+                return False
+        return True
+
+    def _settle(self, member, value, counts):
+        """Counts a hit or a miss, returns the value to store"""
+        if value is None:
+            counts["missed"] += 1
+            return False if member.exists else member.default
+        counts["matched"] += 1
+        return value
+
+    def _fill(self, tree, starts, ends, prefix, stats):
+        """
+        Indexed plan: one record per subtree [starts[i], ends[i]), every member does a single index lookup
+        over all the records, and each record takes its share of the (sorted) positions with bisect
+        """
+        nodes = tree.nodes
+        records = [{} for start in starts]
+        low, high = min(starts), max(ends)
+        for name, member, group, exact in self._plan:
+            counts = stats.setdefault(prefix + name, {"matched": 0, "missed": 0})
+            if member.selector is None:
+                for record, start in zip(records, starts):
+                    record[name] = self._settle(member, member.value(nodes[start]), counts)
+                continue
+            positions = tree.lookup(member.selector.index_key[0], member.selector.index_key[1], low, high)
+            if not exact:
+                positions = [pos for pos in positions if member.selector.matches(nodes[pos])]
+            for record, start, end in zip(records, starts, ends):
+                first = bisect_left(positions, start)
+                if group:
+                    inside = positions[first:bisect_left(positions, end, first)]
+                    counts["matched" if inside else "missed"] += 1
+                    ends_inside = [len(nodes) if nodes[pos].end is None else nodes[pos].end for pos in inside]
+                    record[name] = member._fill(tree, inside, ends_inside, prefix + name + ".", stats) if inside else []
+                else:
+                    found = first + member.nth
+                    value = None
+                    if found < len(positions) and positions[found] < end:
+                        value = member.value(nodes[positions[found]])
+                    record[name] = self._settle(member, value, counts)
+        return records
+
+    def _open(self, node, end, prefix, records):
+        """Starts a record for the given node, returns its entry for the stack of open records"""
+        values = {}
+        for name, member, group, exact in self._plan:
+            if group:
+                values[name] = []
+            elif member.selector is None:
+                values[name] = member.value(node)
+            else:
+                values[name] = None
+        records.append((self, values, prefix))
+        return self, [0] * len(self.members), values, end, prefix
+
+    def _walk(self, scope, stats):
+        """
+        Plan for trees without indexes (or selectors the indexes can't answer): a single pass over every node below scope,
+        each node is only checked against the members that could match it
+        """
+        records = [] # (schema, values, prefix) of every record, to settle misses and stats at the end
+        stack = [self._open(scope, float("inf"), "", records)]
+        for pos, node, end in _subtree(scope):
+            while pos >= stack[-1][3]:
+                stack.pop()
+            clss = node.get("class")
+            tokens = set(class_tokens(clss)) if clss else ()
+            ident = node.get("id")
+            i = 0
+            while i < len(stack): # records opened by this node are checked against it too
+                schema, hits, values, _, prefix = stack[i]
+                i += 1
+                plan = schema._plan
+                for slot in schema._slots(node.name, tokens, ident):
+                    name, member, group, exact = plan[slot]
+                    if group:
+                        if exact or member.selector.matches(node):
+                            record = member._open(node, end, prefix + name + ".", records)
+                            values[name].append(record[2])
+                            stack.append(record)
+                    elif hits[slot] <= member.nth and (exact or member.selector.matches(node)):
+                        if hits[slot] == member.nth:
+                            values[name] = member.value(node)
+                        hits[slot] += 1
+
+        for schema, values, prefix in records:
+            for name, member, group, exact in schema._plan:
+                counts = stats.setdefault(prefix + name, {"matched": 0, "missed": 0})
+                if group:
+                    counts["matched" if values[name] else "missed"] += 1
+                else:
+                    values[name] = self._settle(member, values[name], counts)
+        return records[0][1]
+
+    def extract(self, scope, stats=None):
+        """
+        Fills every member from the nodes below scope (a tree or a node), returns a plain dict, None for an empty tree
+        Matches and misses are counted in stats (a dict) if given, in self.stats otherwise
+        """
+        if stats is None:
+            stats = self.stats
+        if not hasattr(scope, "tree"): # a whole tree
+            scope = scope.root
+        if scope is None:
+            return None
+        if isinstance(scope, Node) and isinstance(scope.tree, Tree) and self._indexable():
+            end = len(scope.tree.nodes) if scope.end is None else scope.end
+            return self._fill(scope.tree, [scope.pos], [end], "", stats)[0]
+        return self._walk(scope, stats)
+
+    def merge(self, stats):
+        """Adds the counts of stats (as extract() fills them) to self.stats"""
+        for name, counts in stats.items():
+            mine = self.stats.setdefault(name, {"matched": 0, "missed": 0})
+            mine["matched"] += counts["matched"]
+            mine["missed"] += counts["missed"]
+
+    def report(self):
+        """One line per member with how often it matched, the ones that miss the most come first"""
+        lines = []
+        for name, counts in sorted(self.stats.items(), key=lambda item: (-item[1]["missed"], item[0])):
+            total = counts["matched"] + counts["missed"]
+            lines.append(f"{name}: {counts['matched']} matched, {counts['missed']} missed ({100 * counts['matched'] / total:.0f}%)")
+        return "\n".join(lines)
+
+class Group(Schema):
+    """Repeated part of a Schema, gives a list with one record (a dict of its members) per node matching selector"""
+    def __init__(self, selector, **members):
+        self.selector = compile_selector(selector)
+        Schema.__init__(self, **members)
+
+def _subtree(scope):
+    """(position, node, end) for scope and every node below it in document order, end is the position right after the node subtree"""
+    tree = scope.tree
+    if isinstance(scope, Node):
+        nodes = tree.nodes
+        last = len(nodes)
+        for node in nodes[scope.pos:last if scope.end is None else scope.end]:
+            yield node.pos, node, last if node.end is None else node.end
+    else: # an ArenaNode view
+        view = type(scope)
+        for index in range(scope.index, tree.end_of(scope.index)):
+            yield index, view(tree, index), tree.end_of(index)
+
 def print_dict(dictionary, ident=""):
     """Special print function for dictionaries"""
     for key, value in dictionary.items():
@@ -273,11 +925,22 @@ class Tree:
     """
     This class is a node factory:
     Node objects should always be retrieved through this class
+
+    While the tree is built, every node gets its position in document order (node.pos),
+    and the position right after its last subnode (node.end), so a subtree is the range [pos, end).
+    Positions are also indexed by tag name, class token and id, which is what the find methods use.
     """
     def __init__(self, ignored_nodes=[]):
         self.current_node = None
         self.root = None
         self.ignored_nodes = ignored_nodes
+        self.skipped = 0 # chars jumped over by a scoped build before reaching the root
+        self.source = None # the page, when nodes hold text spans instead of texts
+        self.text_spans = array("l") # start, end of the text of each node (by position) in source, -1 if none
+        self.nodes = [] # every node, in document order
+        self.tag_index = {} # tagname -> [positions]
+        self.class_index = {} # class token -> [positions]
+        self.id_index = {} # id -> [positions]
 
     def new_node(self, tagname, **params):
         """
@@ -292,9 +955,25 @@ class Tree:
             leaf = Node(tagname, self.current_node, **params)
             self.current_node.addsub(leaf)
             self.current_node = leaf
+        self._register(leaf)
+
+    def _register(self, leaf):
+        """Gives the node its position and adds it to the indexes"""
+        pos = len(self.nodes)
+        leaf.tree = self
+        leaf.pos = pos
+        self.nodes.append(leaf)
+        self.tag_index.setdefault(leaf.name, []).append(pos)
+        params = leaf.params
+        if "class" in params:
+            for token in set(class_tokens(params["class"])):
+                self.class_index.setdefault(token, []).append(pos)
+        if "id" in params:
+            self.id_index.setdefault(params["id"], []).append(pos)
 
     def close_node(self):
         """Return to the previous boss node"""
+        self.current_node.end = len(self.nodes)
         self.current_node = self.current_node.boss
 
     def is_open(self):
@@ -327,6 +1006,61 @@ class Tree:
             #if text != "":
             self.current_node.params["text"] = text
 
+    def add_text_span(self, source, start, end):
+        """Lazy version of add_text(): only where the text is in source gets stored, see text_of()"""
+        if self.current_node:
+            self.source = source
+            spans = self.text_spans
+            missing = 2 * len(self.nodes) - len(spans)
+            if missing > 0:
+                spans.extend([-1] * missing)
+            pos = 2 * self.current_node.pos
+            spans[pos] = start
+            spans[pos + 1] = end
+
+    def text_of(self, pos):
+        """Builds the text of the node at pos from its span, None if it has no span"""
+        pos *= 2
+        if pos >= len(self.text_spans) or self.text_spans[pos] == -1:
+            return None
+        return span_text(self.source, self.text_spans[pos], self.text_spans[pos + 1])
+
+    def lookup(self, key, value, start, end):
+        """
+        Returns the positions in [start, end) of the nodes whose key matches value, straight from the indexes
+        key may be tagname, class (every token of value must be in the node class) or id
+        Returns None if the search can't be answered by the indexes (other keys, values that are not strings)
+        """
+        if not isinstance(value, str):
+            return None
+        if key == "tagname":
+            positions = self.tag_index.get(value)
+        elif key == "id":
+            positions = self.id_index.get(value)
+        elif key == "class":
+            tokens = class_tokens(value)
+            if not tokens:
+                return None
+            positions = self.class_index.get(tokens[0])
+            for token in tokens[1:]: # start from the rarest token
+                others = self.class_index.get(token)
+                if others is None:
+                    return []
+                if positions is not None and len(others) < len(positions):
+                    positions = others
+        else:
+            return None
+        if not positions:
+            return []
+
+        first = bisect_left(positions, start)
+        hits = positions[first:bisect_left(positions, end, first)]
+        if key == "class" and len(tokens) > 1:
+            nodes = self.nodes
+            tokens = set(tokens)
+            hits = [pos for pos in hits if tokens.issubset(class_tokens(nodes[pos].params["class"]))]
+        return hits
+
     def find_class(self, clss):
         """Helper for calling the tree.find() method when the attribute is coincidentally named 'class' """
         search_q = {"class":clss}
@@ -341,6 +1075,18 @@ class Tree:
         """Helper for calling the node.find() method in the whole tree"""
         return self.root.find(**search_args)
 
+    def iter_find(self, limit=None, order="pre", **search_args):
+        """Helper for calling the node.iter_find() method in the whole tree"""
+        return self.root.iter_find(limit=limit, order=order, **search_args)
+
+    def select(self, selector):
+        """Helper for calling the node.select() method in the whole tree"""
+        return self.root.select(selector)
+
+    def select_one(self, selector):
+        """Helper for calling the node.select_one() method in the whole tree"""
+        return self.root.select_one(selector)
+
     def find_all(self, **search_args):
         """Helper for calling the node.find_all() method in the whole tree"""
         return self.root.find_all(**search_args)
@@ -352,6 +1098,9 @@ class Node:
         self.boss = boss
         self.subordinates = None
         self.params = params
+        self.tree = None # set by the Tree that builds this node, along with pos and end
+        self.pos = 0
+        self.end = None
 
     def addsub(self, sub):
         """Method to register a subnode"""
@@ -371,6 +1120,11 @@ class Node:
         try:
             return self.params[key]
         except:
+            if key == "text" and self.tree is not None and self.tree.source is not None: # lazy_text: built on first use, then kept like a regular param
+                text = self.tree.text_of(self.pos)
+                if text is not None:
+                    self.params["text"] = text
+                return text
             return None
 
     def has_subs(self):
@@ -387,52 +1141,120 @@ class Node:
         search_q = {"class":clss}
         return self.find_all(**search_q)
 
-    def find(self, **search_args):
+    def matches(self, search_args):
         """
-        Returns the first node that matches the search parameter specified.
-        Will dig down in subnodes recursively
-        Will return None if no result is found
+        Returns true if the tagname or any of the params in search_args matches this node
+        class is compared token by token: "fa-motorcycle" matches class="fa fa-motorcycle"
         """
         if self.name == search_args.get("tagname"):
-            return self
+            return True
         for key, value in search_args.items():
-            try:
-                if self.params[key] == value:
-                    return self
-            except:
-                pass
-        if self.subordinates:
-            for sub in self.subordinates:
-                result = sub.find(**search_args)
-                if result is not None:
-                    return result
+            if key not in self.params:
+                if key != "text" or self.get("text") is None:
+                    continue
+            if key == "class" and isinstance(value, str) and class_tokens(value):
+                if set(class_tokens(value)).issubset(class_tokens(self.params[key])):
+                    return True
+            elif self.params[key] == value:
+                return True
+        return False
+
+    def _index_hits(self, search_args):
+        """
+        Positions of the nodes in this subtree matching search_args, taken from the tree indexes
+        Returns None when the indexes can't answer (node built outside a Tree, keys that are not indexed)
+        """
+        tree = self.tree
+        if tree is None:
+            return None
+        end = self.end if self.end is not None else len(tree.nodes)
+        if len(search_args) == 1:
+            for key, value in search_args.items():
+                return tree.lookup(key, value, self.pos, end)
+        found = []
+        for key, value in search_args.items():
+            hits = tree.lookup(key, value, self.pos, end)
+            if hits is None:
+                return None
+            found.append(hits)
+        if len(found) == 1:
+            return found[0]
+        return sorted(set().union(*found))
+
+    def iter_find(self, limit=None, order="pre", **search_args):
+        """
+        Generator that yields the nodes matching the search parameters one at a time (this node included)
+        No recursion is involved, so deeply nested pages are fine, and stopping early costs nothing
+        order -> "pre" for document order (the default) or "bfs" to go level by level
+        limit -> stop after that many nodes
+        Matches come from the tree indexes when possible (see Tree.lookup), otherwise subnodes are walked with an explicit stack/queue
+        """
+        if limit is not None and limit <= 0:
+            return
+        found = 0
+        if order == "pre":
+            hits = self._index_hits(search_args)
+            if hits is not None:
+                nodes = self.tree.nodes
+                for pos in hits[:limit]:
+                    yield nodes[pos]
+                return
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                if node.matches(search_args):
+                    yield node
+                    found += 1
+                    if found == limit:
+                        return
+                if node.subordinates:
+                    stack.extend(reversed(node.subordinates))
+        elif order == "bfs":
+            queue = deque([self])
+            while queue:
+                node = queue.popleft()
+                if node.matches(search_args):
+                    yield node
+                    found += 1
+                    if found == limit:
+                        return
+                if node.subordinates:
+                    queue.extend(node.subordinates)
+        else:
+            raise ValueError(f"Unknown order {order}, use 'pre' or 'bfs'")
+
+    def find(self, **search_args):
+        """
+        Returns the first node (in document order) that matches the search parameter specified.
+        Will return None if no result is found
+        """
+        for node in self.iter_find(limit=1, **search_args):
+            return node
         return None
 
     def find_all(self, **search_args):
         """
-        Returns a list with all nodes that match the search parameter specified.
-        Will dig down in subnodes recursively
+        Returns a list with all nodes that match the search parameter specified, in document order.
         Will return an empty list if no result is found
         """
-        result = []
-        if self.name == search_args.get("tagname"):
-            result.append(self)
-        for key, value in search_args.items():
-            try:
-                if self.params[key] == value:
-                    result.append(self)
-            except:
-                pass
-        if self.subordinates:
-            for sub in self.subordinates:
-                sub_result = sub.find_all(**search_args)
-                result.extend(sub_result)
-        return result
+        return list(self.iter_find(**search_args))
+
+    def select(self, selector):
+        """
+        Returns a list with the nodes below (and including) this one that match the given CSS selector, in document order
+        Example: node.select("div.row > .preco-loja"), see compile_selector() for the supported syntax
+        """
+        return list(compile_selector(selector).iter_select(self))
+
+    def select_one(self, selector):
+        """Returns the first node matching the given CSS selector, None if there is none"""
+        return compile_selector(selector).select_one(self)
 
     def show(self, deep=True):
         """Method to print a single node and its contents"""
         print(self.name)
         if deep:
+            self.get("text")
             print_dict(self.params, ident=" ")
 
         if self.subordinates:
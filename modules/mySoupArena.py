@@ -0,0 +1,391 @@
+"""
+Compact tree backend for mySoup
+
+Instead of one Python object (plus two dicts) per html node, an ArenaTree keeps every node of the tree in a few flat
+arrays of ints: tag ids, parent indexes, first-child / next-sibling links and attribute offsets.
+Tag names, attribute keys/values and texts are stored once per tree in a string table, and the arrays only hold their ids.
+
+Example usage:
+
+from modules.mySoup import seed
+from modules.mySoupArena import ArenaTree
+
+tree_list = seed.build(string=page, below_class="col-md-8", tree_class=ArenaTree)
+name = tree_list[0].find_class("nome").get("text")
+print(tree_list[0].memory_usage())
+
+Nodes are handed out as ArenaNode views (two slots: the tree and the node index), created on demand,
+so the usual find / find_all / find_class / get calls work the same as in a regular Tree.
+"""
+from array import array
+from collections import deque
+import sys
+from .mySoup import compile_selector, nosub_tags, print_dict
+
+NO_NODE = -1
+
+class ArenaTree:
+    """
+    Drop-in replacement for mySoup.Tree, pass it to seed.build() as tree_class
+    Node i lives at position i of every array, nodes are numbered in document order,
+    so the subtree of node i is the range [i, ends[i])
+    """
+    def __init__(self, ignored_nodes=[]):
+        self.root = None
+        self.ignored_nodes = ignored_nodes
+        self.skipped = 0 # chars jumped over by a scoped build before reaching the root
+
+        self.strings = [] # string table, everything else refers to it by id
+        self._string_ids = {}
+
+        self.tags = array("i")
+        self.parents = array("i")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.ends = array("i")
+        self.texts = array("i")
+        self.attr_offsets = array("i", [0]) # attributes of node i are attrs[attr_offsets[i]:attr_offsets[i + 1]]
+        self.attrs = array("i") # key id, value id, key id, value id...
+
+        self._last_children = array("i") # only needed while building
+        self._current = NO_NODE
+
+    ### BUILDING ###
+    # Same interface as mySoup.Tree, this is what the parser talks to
+
+    def _intern(self, string):
+        """Returns the id of the given string in this tree's string table"""
+        sid = self._string_ids.get(string)
+        if sid is None:
+            sid = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return sid
+
+    def new_node(self, tagname, **params):
+        """
+        Method to create a new node in this tree
+        The newly created node becomes the current node automatically
+        """
+        index = len(self.tags)
+        boss = self._current
+        self.tags.append(self._intern(tagname))
+        self.parents.append(boss)
+        self.first_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self._last_children.append(NO_NODE)
+        self.ends.append(NO_NODE)
+        self.texts.append(NO_NODE)
+        for key, value in params.items():
+            self.attrs.append(self._intern(key))
+            self.attrs.append(self._intern(value))
+        self.attr_offsets.append(len(self.attrs))
+
+        if boss == NO_NODE:
+            self.root = ArenaNode(self, index)
+        else:
+            if self._last_children[boss] == NO_NODE:
+                self.first_children[boss] = index
+            else:
+                self.next_siblings[self._last_children[boss]] = index
+            self._last_children[boss] = index
+        self._current = index
+
+    def close_node(self):
+        """Return to the previous boss node"""
+        self.ends[self._current] = len(self.tags)
+        self._current = self.parents[self._current]
+        if self._current == NO_NODE:
+            self._last_children = array("i") # the tree is complete
+
+    def is_open(self):
+        """
+        Returns false if a tree has been completely built, true otherwise
+        In other words, returns true if the tree is still being built
+        """
+        return not ((self._current == NO_NODE) and (self.root is not None))
+
+    def add_htmltag(self, tag_name, tag_params):
+        """
+        Internal method to parse html node insertion into the tree
+        """
+        if tag_name in self.ignored_nodes:
+            pass
+        elif tag_name in nosub_tags:
+            self.new_node(tag_name, **tag_params)
+            self.close_node()
+        elif tag_name[0] == "/":
+            self.close_node()
+        else:
+            self.new_node(tag_name, **tag_params)
+
+    def add_text(self, text):
+        """Helper that adds a text parameter to the current node"""
+        if self._current != NO_NODE:
+            self.texts[self._current] = self._intern(text)
+
+    @property
+    def current_node(self):
+        if self._current == NO_NODE:
+            return None
+        return ArenaNode(self, self._current)
+
+    ### QUERIES ###
+
+    def end_of(self, index):
+        """Index right after the last node in the subtree of the given node"""
+        end = self.ends[index]
+        return len(self.tags) if end == NO_NODE else end
+
+    def name_of(self, index):
+        return self.strings[self.tags[index]]
+
+    def param_of(self, index, key):
+        """Value of the given attribute (or text) of a node, None if the node does not have it"""
+        if key == "text":
+            text = self.texts[index]
+            return None if text == NO_NODE else self.strings[text]
+        key_id = self._string_ids.get(key)
+        if key_id is None:
+            return None
+        attrs = self.attrs
+        for i in range(self.attr_offsets[index], self.attr_offsets[index + 1], 2):
+            if attrs[i] == key_id:
+                return self.strings[attrs[i + 1]]
+        return None
+
+    def params_of(self, index):
+        """Builds a regular params dict for a node, the same one a mySoup.Node would have"""
+        strings = self.strings
+        attrs = self.attrs
+        params = {}
+        for i in range(self.attr_offsets[index], self.attr_offsets[index + 1], 2):
+            params[strings[attrs[i]]] = strings[attrs[i + 1]]
+        if self.texts[index] != NO_NODE:
+            params["text"] = strings[self.texts[index]]
+        return params
+
+    def children_of(self, index):
+        child = self.first_children[index]
+        while child != NO_NODE:
+            yield child
+            child = self.next_siblings[child]
+
+    def _bfs(self, index):
+        """Yields the indexes of the subtree of the given node, level by level"""
+        queue = deque([index])
+        while queue:
+            index = queue.popleft()
+            yield index
+            queue.extend(self.children_of(index))
+
+    def _search(self, index, search_args, order="pre"):
+        """
+        Yields the indexes of the nodes below (and including) the given one that match the search parameters
+        order is "pre" (document order) or "bfs" (level by level)
+        Like Node.matches(), a node matches if its tagname or any of the given params matches
+        """
+        ids = self._string_ids
+        name_id = None
+        other_name = None # a tagname that is not a string (like seed.anything()) is compared the slow way
+        if "tagname" in search_args:
+            if isinstance(search_args["tagname"], str):
+                name_id = ids.get(search_args["tagname"], NO_NODE)
+            else:
+                other_name = search_args["tagname"]
+        checks = [] # (key id, value id or None, value, class tokens or None), keys this tree never saw can't match anything
+        for key, value in search_args.items():
+            if key == "tagname":
+                continue
+            value_id = ids.get(value, NO_NODE) if isinstance(value, str) else None
+            if key == "text":
+                checks.append((key, value_id, value, None))
+            elif key in ids:
+                tokens = None
+                if key == "class" and isinstance(value, str) and value.split():
+                    tokens = set(value.split()) # class is compared token by token, like Node.matches()
+                checks.append((ids[key], value_id, value, tokens))
+        token_hits = {} # value id -> bool, class strings repeat a lot so each one is only split once
+
+        tags = self.tags
+        attrs = self.attrs
+        offsets = self.attr_offsets
+        texts = self.texts
+        strings = self.strings
+        if order == "pre":
+            candidates = range(index, self.end_of(index))
+        elif order == "bfs":
+            candidates = self._bfs(index)
+        else:
+            raise ValueError(f"Unknown order {order}, use 'pre' or 'bfs'")
+        for i in candidates:
+            if tags[i] == name_id or (other_name is not None and other_name == strings[tags[i]]):
+                yield i
+                continue
+            for key_id, value_id, value, tokens in checks:
+                if key_id == "text":
+                    found = texts[i]
+                    if found != NO_NODE and (found == value_id if value_id is not None else value == strings[found]):
+                        break
+                    continue
+                hit = False
+                for j in range(offsets[i], offsets[i + 1], 2):
+                    if attrs[j] == key_id:
+                        found = attrs[j + 1]
+                        if tokens is not None:
+                            hit = token_hits.get(found)
+                            if hit is None:
+                                hit = token_hits[found] = tokens.issubset(strings[found].split())
+                        elif value_id is not None:
+                            hit = found == value_id
+                        else:
+                            hit = value == strings[found]
+                        break
+                if hit:
+                    break
+            else:
+                continue
+            yield i
+
+    def memory_usage(self):
+        """
+        Returns a dict with the approximate number of bytes used by this tree
+        arrays -> the node arrays, strings -> the string table, lookup -> the dict used to intern strings
+        """
+        arrays = sum(sys.getsizeof(a) for a in (self.tags, self.parents, self.first_children, self.next_siblings,
+                                                   self.ends, self.texts, self.attr_offsets, self.attrs, self._last_children))
+        strings = sys.getsizeof(self.strings) + sum(sys.getsizeof(s) for s in self.strings)
+        lookup = sys.getsizeof(self._string_ids)
+        return {"nodes": len(self.tags), "arrays": arrays, "strings": strings, "lookup": lookup, "total": arrays + strings + lookup}
+
+    def find_class(self, clss):
+        """Helper for calling the tree.find() method when the attribute is coincidentally named 'class' """
+        search_q = {"class":clss}
+        return self.find(**search_q)
+
+    def find_all_class(self, clss):
+        """Helper for calling the tree.find_all() method when the attribute is coincidentally named 'class' """
+        search_q = {"class":clss}
+        return self.find_all(**search_q)
+
+    def find(self, **search_args):
+        """Helper for calling the node.find() method in the whole tree"""
+        return self.root.find(**search_args)
+
+    def find_all(self, **search_args):
+        """Helper for calling the node.find_all() method in the whole tree"""
+        return self.root.find_all(**search_args)
+
+    def iter_find(self, limit=None, order="pre", **search_args):
+        """Helper for calling the node.iter_find() method in the whole tree"""
+        return self.root.iter_find(limit=limit, order=order, **search_args)
+
+    def select(self, selector):
+        """Helper for calling the node.select() method in the whole tree"""
+        return self.root.select(selector)
+
+    def select_one(self, selector):
+        """Helper for calling the node.select_one() method in the whole tree"""
+        return self.root.select_one(selector)
+
+class ArenaNode:
+    """A lightweight view of a single node inside an ArenaTree, offers the same methods as mySoup.Node"""
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ArenaNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    @property
+    def name(self):
+        return self.tree.name_of(self.index)
+
+    @property
+    def boss(self):
+        parent = self.tree.parents[self.index]
+        return None if parent == NO_NODE else ArenaNode(self.tree, parent)
+
+    @property
+    def subordinates(self):
+        """List of subnode views, None if there are no subnodes (just like Node.subordinates)"""
+        subs = [ArenaNode(self.tree, child) for child in self.tree.children_of(self.index)]
+        return subs or None
+
+    @property
+    def params(self):
+        """A fresh dict with the node params, changing it does not change the tree"""
+        return self.tree.params_of(self.index)
+
+    def is_root(self):
+        """Bool to verify if this node is the root node"""
+        return self.tree.parents[self.index] == NO_NODE
+
+    def get(self, key):
+        """
+        Helper to get data from a node
+        Remember that most/all keys are stored as strings, so the key parameter is probably a string
+        """
+        return self.tree.param_of(self.index, key)
+
+    def find_class(self, clss):
+        """Helper for calling the node.find() method when the attribute is coincidentally named 'class' """
+        search_q = {"class":clss}
+        return self.find(**search_q)
+
+    def find_all_class(self, clss):
+        """Helper for calling the node.find_all() method when the attribute is coincidentally named 'class' """
+        search_q = {"class":clss}
+        return self.find_all(**search_q)
+
+    def iter_find(self, limit=None, order="pre", **search_args):
+        """
+        Generator that yields the nodes matching the search parameters one at a time (this node included)
+        order -> "pre" for document order (the default) or "bfs" to go level by level
+        limit -> stop after that many nodes
+        """
+        if limit is not None and limit <= 0:
+            return
+        found = 0
+        for index in self.tree._search(self.index, search_args, order):
+            yield ArenaNode(self.tree, index)
+            found += 1
+            if found == limit:
+                return
+
+    def find(self, **search_args):
+        """
+        Returns the first node that matches the search parameter specified.
+        Will return None if no result is found
+        """
+        for node in self.iter_find(limit=1, **search_args):
+            return node
+        return None
+
+    def find_all(self, **search_args):
+        """
+        Returns a list with all nodes that match the search parameter specified.
+        Will return an empty list if no result is found
+        """
+        return list(self.iter_find(**search_args))
+
+    def select(self, selector):
+        """Returns a list with the nodes below (and including) this one that match the given CSS selector"""
+        return list(compile_selector(selector).iter_select(self))
+
+    def select_one(self, selector):
+        """Returns the first node matching the given CSS selector, None if there is none"""
+        return compile_selector(selector).select_one(self)
+
+    def show(self, deep=True):
+        """Method to print a single node and its contents"""
+        print(self.name)
+        if deep:
+            print_dict(self.params, ident=" ")
+
+        for child in self.tree.children_of(self.index):
+            print(f"    {self.tree.name_of(child)}")
@@ -0,0 +1,180 @@
+'''
+Refresh scheduling for the products already found.
+Each product has a revisit interval that follows how often its page changes (its volatility): halved (down to
+min_interval) whenever a visit finds it changed, grown by half (up to max_interval) whenever it didn't. A product is due
+once its interval has passed since its last visit. When more are due than can be scraped, the ones stalest for their
+interval come first: age / interval is about the number of changes the database missed on them.
+That alone starves the products that rarely change: their intervals grow past what the volatile ones leave of the budget,
+and a change that comes in between goes unseen for days. So oldest_share of every round goes to the products seen longest
+ago, due or not.
+'''
+import heapq
+import time
+
+class RefreshScheduler:
+    '''
+    Due products, kept in the Refresco table, call setup() and load() once before using it:
+
+    scheduler = RefreshScheduler(manager)
+    await scheduler.setup()
+    await scheduler.load()
+    pids = scheduler.due(100) # up to 100 products due now, the stalest first
+    ... # scrap them, calling scheduler.record(pid, outcome) for each
+    await scheduler.flush()
+
+    Products in the Produto table that the scheduler never saw (scraped before it existed) are due right away.
+    lock (an asyncio.Lock) is only needed when somebody writes through the same connection outside of manager.transaction().
+    '''
+    table = "Refresco"
+
+    def __init__(self, manager, min_interval=60 * 60, max_interval=7 * 24 * 60 * 60, faster=0.5, slower=1.5, retry=15 * 60,
+                 oldest_share=0.5, lock=None, clock=time.time):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("the intervals must be positive, min_interval no larger than max_interval")
+        self.manager = manager
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial = (min_interval * max_interval) ** 0.5 # interval of a product seen once, nothing is known about it yet
+        self.faster = faster # the interval is multiplied by faster after a change, by slower after none
+        self.slower = slower
+        self.retry = retry # seconds before a product whose page failed is tried again
+        self.oldest_share = oldest_share # of the limit of due(), kept for the products seen longest ago
+        self.lock = lock
+        self.clock = clock
+        self.products = {} # pid -> [last_seen, interval, visits, due]
+        self._heap = [] # (due, pid), entries whose due changed since are skipped when they come up
+        self._dirty = set()
+        self._out = set() # handed out by due(), no outcome yet
+
+    @staticmethod
+    def set_entity(manager):
+        '''Sets up the Refresco entity, to be called along with the other setup operations (before create_tables())'''
+        manager.set_entity(RefreshScheduler.table, prod_id="INT", last_seen="REAL", revisit="REAL", visits="INT")
+        manager.set_primary_key(RefreshScheduler.table, "prod_id")
+
+    async def setup(self):
+        '''Creates the Refresco table if the database doesn't have it yet (databases made before the scheduler existed)'''
+        if self.table not in self.manager.entities:
+            RefreshScheduler.set_entity(self.manager)
+            await self.manager.add_table(self.manager.entities[self.table])
+
+    async def load(self):
+        '''Reads the schedule from the database, whatever was in memory is dropped (flush() it first)'''
+        self.products = {}
+        self._heap = []
+        self._out = set()
+        cursor = await self.manager.conn.execute(f"SELECT prod_id, last_seen, revisit, visits FROM {self.table}")
+        for pid, last_seen, interval, visits in await cursor.fetchall():
+            self._set(pid, last_seen, interval, visits)
+        cursor = await self.manager.conn.execute(f"SELECT prod_id FROM Produto WHERE prod_id NOT IN (SELECT prod_id FROM {self.table})")
+        for pid, in await cursor.fetchall():
+            self._set(pid, 0.0, self.initial, 0)
+
+    def _set(self, pid, last_seen, interval, visits, due=None):
+        due = last_seen + interval if due is None else due
+        self.products[pid] = [last_seen, interval, visits, due]
+        heapq.heappush(self._heap, (due, pid))
+
+    def due(self, limit, now=None, ahead=0):
+        '''
+        Up to limit products due by now (or within ahead seconds of it, they'd be late by the next round otherwise),
+        the stalest for their interval first, and oldest_share of limit for the products seen longest ago (at least
+        min_interval ago), due or not. They are not handed out again until record() is called for them
+        '''
+        now = self.clock() if now is None else now
+        reserve = int(limit * self.oldest_share)
+        candidates = []
+        handed = []
+        popped = set()
+        while self._heap and self._heap[0][0] <= now + ahead:
+            due, pid = heapq.heappop(self._heap)
+            product = self.products.get(pid)
+            if product is None or product[3] != due or pid in popped: # dropped, rescheduled since, or in twice (see release())
+                continue
+            popped.add(pid)
+            if pid in self._out:
+                handed.append((due, pid))
+                continue
+            candidates.append(((now - product[0]) / product[1], due, pid))
+        candidates.sort(reverse=True)
+        for _, due, pid in candidates[limit - reserve:]:
+            heapq.heappush(self._heap, (due, pid))
+        for entry in handed:
+            heapq.heappush(self._heap, entry)
+        pids = [pid for _, _, pid in candidates[:limit - reserve]]
+        if reserve:
+            chosen = set(pids)
+            oldest = heapq.nsmallest(reserve, ((product[0], pid) for pid, product in self.products.items()
+                                               if now - product[0] >= self.min_interval and pid not in chosen and pid not in self._out))
+            pids += [pid for _, pid in oldest] # their heap entries stay, the due() after their record() skips them
+        self._out.update(pids)
+        return pids
+
+    def release(self):
+        '''Puts back the products handed out by due() that got no outcome (the run was stopped before them)'''
+        for pid in self._out:
+            product = self.products.get(pid)
+            if product is not None:
+                heapq.heappush(self._heap, (product[3], pid))
+        self._out = set()
+
+    def count_due(self, now=None):
+        now = self.clock() if now is None else now
+        return sum(1 for product in self.products.values() if product[3] <= now)
+
+    def record(self, pid, outcome):
+        '''
+        What came of scraping pid: "new" and "changed" count as a change, "unchanged" as none, "empty" drops the product
+        (it's gone from the site), "failed" and "parse_error" bring it back after retry seconds
+        '''
+        self._out.discard(pid)
+        now = self.clock()
+        product = self.products.get(pid)
+        if outcome == "empty":
+            if product is not None:
+                del self.products[pid]
+                self._dirty.add(pid)
+            return
+        if product is None:
+            if outcome not in ("new", "changed"):
+                return
+            product = [now, self.initial, 0, 0.0]
+        last_seen, interval, visits, due = product
+        if outcome in ("failed", "parse_error"):
+            self._set(pid, last_seen, interval, visits, due=now + self.retry)
+            return
+        if visits: # the first visit says nothing about how often the page changes
+            if outcome in ("new", "changed"):
+                interval = max(self.min_interval, interval * self.faster)
+            else:
+                interval = min(self.max_interval, interval * self.slower)
+        self._set(pid, now, interval, visits + 1)
+        self._dirty.add(pid)
+
+    async def flush(self):
+        '''Writes the products that changed since the last flush'''
+        if not self._dirty:
+            return
+        keep = [(pid, *self.products[pid][:3]) for pid in self._dirty if pid in self.products]
+        drop = [(pid,) for pid in self._dirty if pid not in self.products]
+        if self.lock is not None:
+            await self.lock.acquire()
+        try:
+            async with self.manager.transaction():
+                await self.manager.conn.executemany(f"INSERT OR REPLACE INTO {self.table} (prod_id, last_seen, revisit, visits) VALUES (?, ?, ?, ?)", keep)
+                await self.manager.conn.executemany(f"DELETE FROM {self.table} WHERE prod_id = ?", drop)
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+        self._dirty = set()
+
+    def summary(self, now=None):
+        now = self.clock() if now is None else now
+        if not self.products:
+            return "no products scheduled"
+        ages = [now - product[0] for product in self.products.values() if product[2]]
+        intervals = sorted(product[1] for product in self.products.values())
+        age = f"{sum(ages) / len(ages) / 3600:.1f}h mean age" if ages else "none visited yet"
+        volatile = sum(1 for interval in intervals if interval <= self.min_interval)
+        return (f"{len(self.products)} products, {self.count_due(now)} due, {age}, "
+                f"revisited every {intervals[len(intervals) // 2] / 3600:.1f}h (median), {volatile} as often as allowed")
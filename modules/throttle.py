@@ -0,0 +1,149 @@
+'''
+Adaptive request limiting, one limiter per host.
+The limit on requests in flight follows AIMD (like TCP congestion control): it grows by about one for every limit
+healthy responses, and is cut by a factor on a 429, a 5xx, a timeout, or (with a target latency) a slow response.
+Until the first cut it grows by one for every healthy response instead (slow start), to find the host's pace quickly.
+Errors also pause new requests for an exponential backoff (or the Retry-After the server asked for).
+'''
+import asyncio
+import time
+from collections import Counter, deque
+
+class AdaptiveLimiter:
+    '''
+    Limit on the requests in flight to one host:
+
+    limiter = AdaptiveLimiter(initial=4, maximum=64)
+    await limiter.acquire()
+    start = time.monotonic()
+    ... # the request
+    limiter.release(time.monotonic() - start, error=None) # or error="429" / "5xx" / "timeout" / "connection"
+
+    The limit goes from minimum to maximum, cut to limit * decrease at most once every round trip (the latency of the
+    response that triggered it), so a burst of errors from the requests already in flight counts as one.
+    limit, in_flight and rate() are the state to look at while it runs, summary() puts them in a line.
+    '''
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0, decrease=0.5, target_latency=None,
+                 backoff=0.5, max_backoff=30.0, window=10.0, clock=time.monotonic):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase # added to the limit over one limit's worth of healthy responses
+        self.decrease = decrease
+        self.target_latency = target_latency # seconds, None only reacts to errors
+        self.backoff = backoff # first pause after an error, doubled for each error in a row
+        self.max_backoff = max_backoff
+        self.window = window # seconds rate() looks back
+        self._clock = clock
+        self.in_flight = 0
+        self._waiters = deque() # futures of the acquire() calls waiting for a free slot
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._errors_in_row = 0
+        self._slow_start = True
+        self._done = deque() # times of the responses in the last window
+        # counters
+        self.completed = 0
+        self.errors = Counter() # by kind: "429", "5xx", "timeout", "connection", "slow"
+        self.decreases = 0
+        self.paused = 0.0 # seconds of backoff asked for
+        self.peak = self.limit
+
+    async def acquire(self):
+        '''Waits for a free slot (and for any backoff to pass), then takes it'''
+        while True:
+            if self._free() > 0 and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled(): # woken up for a slot it won't take, pass it on
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if self._free() > 0:
+                self.in_flight += 1
+                self._wake() # the limit may have room for more than one
+                return
+
+    def release(self, latency, error=None, retry_after=None):
+        '''
+        Gives the slot back with how the request went: its latency in seconds, and error None for a healthy response,
+        or a short name for what went wrong ("429", "5xx", "timeout", "connection"). retry_after is the server's Retry-After, in seconds
+        '''
+        self.in_flight -= 1
+        now = self._clock()
+        self.completed += 1
+        self._done.append(now)
+        while self._done and self._done[0] < now - self.window:
+            self._done.popleft()
+
+        if error is None and self.target_latency is not None and latency > self.target_latency:
+            self.errors["slow"] += 1
+            self._cut(now, latency)
+        elif error is None:
+            self._errors_in_row = 0
+            self.limit = min(self.maximum, self.limit + (1 if self._slow_start else self.increase / self.limit))
+            self.peak = max(self.peak, self.limit)
+        else:
+            self.errors[error] += 1
+            self._cut(now, latency)
+            self._errors_in_row += 1
+            pause = min(self.max_backoff, self.backoff * 2 ** (self._errors_in_row - 1))
+            if retry_after is not None:
+                pause = max(pause, min(retry_after, self.max_backoff))
+            if now + pause > self._paused_until:
+                self.paused += pause
+                self._paused_until = now + pause
+                asyncio.get_running_loop().call_later(pause, self._wake) # nobody may be in flight to wake the waiters then
+        self._wake()
+
+    def cancel(self):
+        '''Gives the slot back without a response to learn from (the request was cancelled)'''
+        self.in_flight -= 1
+        self._wake()
+
+    def _cut(self, now, latency):
+        if now - self._last_decrease < latency: # still the same round trip as the last cut
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.decreases += 1
+
+    def _free(self):
+        '''Slots free right now, none during a backoff'''
+        if self._paused_until > self._clock():
+            return 0
+        return int(self.limit) - self.in_flight
+
+    def _wake(self):
+        '''Wakes as many waiters as there are free slots'''
+        free = self._free()
+        for waiter in self._waiters:
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def rate(self):
+        '''Responses per second over the last window'''
+        now = self._clock()
+        while self._done and self._done[0] < now - self.window:
+            self._done.popleft()
+        return len(self._done) / self.window
+
+    def backing_off(self):
+        '''Seconds left of the current backoff'''
+        return max(0.0, self._paused_until - self._clock())
+
+    def summary(self):
+        errors = ", ".join(f"{count} {kind}" for kind, count in sorted(self.errors.items())) or "no errors"
+        return (f"limit {self.limit:.1f} (peak {self.peak:.1f}), {self.in_flight} in flight, {self.rate():.1f} req/s, "
+                f"{self.completed} done, {errors}, {self.decreases} cuts, {self.paused:.1f}s backoff")